@@ -1,5 +1,6 @@
 import os
 import json
+import time
 import requests
 import redis
 from fastapi import FastAPI, HTTPException, Query
@@ -51,6 +52,20 @@ OPENSEARCH_URL = os.environ.get('OPENSEARCH_URL', 'http://localhost:9200')
 REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
 REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
 
+# Stock keys changed here are marked dirty; the fulfillment worker writes them behind
+# to the Postgres inventory table (must match fulfillment-worker/stock_write_behind.py)
+STOCK_DIRTY_KEY = "stock:dirty"
+
+# KEYS: stock key, dirty set. ARGV: new stock, now.
+# Sets the stock, marks the key dirty (keeping the time of its first unflushed change)
+# and returns the old stock - one round trip
+UPDATE_STOCK_SCRIPT = """
+local old = redis.call('GET', KEYS[1])
+redis.call('SET', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[2], 'NX', ARGV[2], KEYS[1])
+return old
+"""
+
 # Initialize Redis Connection
 # In production, add error handling if Redis is down
 try:
@@ -59,6 +74,8 @@ except Exception as e:
     print(f"Warning: Redis connection failed: {e}")
     r = None
 
+update_stock_script = r.register_script(UPDATE_STOCK_SCRIPT) if r else None
+
 @app.get("/")
 def health_check():
     return {"status": "healthy", "service": "availability-service"}
@@ -209,7 +226,7 @@ def get_warehouse_products(warehouse_id: str):
 
 @app.put("/inventory/{warehouse_id}/{product_id}")
 def update_stock(warehouse_id: str, product_id: str, data: StockUpdateRequest):
-    """Update stock for a specific product in a warehouse - persists to Redis"""
+    """Update stock for a specific product in a warehouse - persists to Redis (and, behind it, Postgres)"""
     if not r:
         raise HTTPException(status_code=503, detail="Redis unavailable")
     
@@ -217,13 +234,10 @@ def update_stock(warehouse_id: str, product_id: str, data: StockUpdateRequest):
         key = f"{warehouse_id}:{product_id}"
         new_stock = data.stock
         
-        # Get old stock for logging
-        old_stock = r.get(key)
+        # Update Redis and mark the key for the write-behind; old stock for logging
+        old_stock = update_stock_script(keys=[key, STOCK_DIRTY_KEY], args=[new_stock, time.time()])
         old_stock = int(old_stock) if old_stock else 0
         
-        # Update Redis
-        r.set(key, new_stock)
-        
         print(f"📦 Stock updated: {key} | {old_stock} → {new_stock}")
         
         return {
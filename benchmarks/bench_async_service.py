@@ -0,0 +1,104 @@
+"""
+Order Service Concurrency Benchmark - sustained requests/second at high fan-in
+Opens N concurrent keep-alive clients against ONE running order-service
+(one uvicorn worker) and has each one loop for a fixed duration:
+
+  POST /orders            (Postgres insert + outbox row)
+  GET  /orders/{customer} (history page)
+
+Run it once against the build you want to compare with and once against the
+current one (same DB, same machine), e.g. at 1000 clients:
+
+  python benchmarks/bench_async_service.py --clients 1000 --duration 30
+  python benchmarks/bench_async_service.py --url http://localhost:8001 --clients 100 500 1000
+
+Leave admission control off (RATE_LIMIT_CUSTOMER_RATE / RATE_LIMIT_WAREHOUSE_RATE
+at their default 0) so it does not cap the load. Orders are written with
+customer_id 'bench_async_<n>' under warehouse 'wh_bench_async'.
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from collections import Counter
+
+import aiohttp
+
+BENCH_WAREHOUSE = "wh_bench_async"
+
+
+async def warm_up(session, url: str):
+    try:
+        async with session.get(url + "/") as resp:
+            await resp.read()
+    except Exception:
+        pass
+
+
+async def client(session, url: str, client_id: str, deadline: float, latencies: list, statuses: Counter):
+    customer_id = f"bench_async_{client_id}"
+    order = {"customer_id": customer_id, "items": [{"item_id": "apple", "warehouse_id": BENCH_WAREHOUSE, "quantity": 1}]}
+    while time.perf_counter() < deadline:
+        for method, path, body in (("POST", "/orders", order), ("GET", f"/orders/{customer_id}", None)):
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url + path, json=body) as resp:
+                    await resp.read()
+                    statuses[resp.status] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(url: str, clients: int, duration: float, timeout: float):
+    latencies = []
+    statuses = Counter()
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        # Open the connections first so connect storms don't count as throughput
+        await asyncio.gather(*(warm_up(session, url) for _ in range(min(clients, 200))))
+        run_id = uuid.uuid4().hex[:6]
+        deadline = time.perf_counter() + duration
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client(session, url, f"{run_id}_{i}", deadline, latencies, statuses)
+            for i in range(clients)
+        ))
+        elapsed = time.perf_counter() - start
+
+        try:
+            async with session.get(url + "/metrics") as resp:
+                pool = (await resp.json()).get("db_pool", {})
+        except Exception:
+            pool = {}
+    return elapsed, sorted(latencies), statuses, pool
+
+
+def report(clients: int, elapsed: float, latencies: list, statuses: Counter, pool: dict):
+    n = len(latencies)
+    ok = statuses.get(200, 0)
+    p50 = latencies[int(n * 0.50)] if n else 0
+    p99 = latencies[min(n - 1, int(n * 0.99))] if n else 0
+    errors = {str(k): v for k, v in statuses.items() if k != 200}
+    print(f"  {clients:>5} clients  {ok / elapsed:>8.0f} ok req/s   p50={p50:>8.1f}ms   p99={p99:>8.1f}ms   "
+          f"errors={errors or 0}   pool wait max={pool.get('wait_max_ms', '-')}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1000])
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per run")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout (s)")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print(f"🧪 ORDER SERVICE CONCURRENCY: {args.url}, {args.duration:g}s per run")
+    print("=" * 80)
+    for clients in args.clients:
+        report(clients, *asyncio.run(run(args.url, clients, args.duration, args.timeout)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Group Commit Benchmark - order-service OrderBatchWriter
+Compares one INSERT + COMMIT per order against batched group commits at
+several window sizes, using the same connection pool the service uses.
+
+USAGE (local docker-compose stack running and seeded):
+  python benchmarks/bench_group_commit.py
+  python benchmarks/bench_group_commit.py --clients 64 --orders 5000 --windows 0 1 2 5 10
+
+Rows (orders + order_outbox) are written with customer_id 'bench_group_commit'
+and deleted afterwards - stop order-service first so its outbox relay does not
+publish them.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "order-service"))
+
+from batch_writer import OrderBatchWriter  # noqa: E402
+from db_pool import ConnectionPool  # noqa: E402
+from outbox import INSERT_OUTBOX_SQL, outbox_row  # noqa: E402
+
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "localhost"),
+    "port": int(os.environ.get("DB_PORT", "5432")),
+    "database": os.environ.get("DB_NAME", "rapid_delivery"),
+    "user": os.environ.get("DB_USER", "postgres"),
+    "password": os.environ.get("DB_PASS", "postgres"),
+}
+
+BENCH_CUSTOMER = "bench_group_commit"
+ITEMS_JSON = json.dumps([{"item_id": "apple", "warehouse_id": "wh_lnmiit", "quantity": 1}])
+
+
+def make_order():
+    """An orders row plus its outbox row, as place_order writes them"""
+    order_id = str(uuid.uuid4())
+    message = {"order_id": order_id, "customer_id": BENCH_CUSTOMER, "warehouse_id": "wh_lnmiit",
+               "items": json.loads(ITEMS_JSON)}
+    return (order_id, BENCH_CUSTOMER, "wh_lnmiit", "PENDING", ITEMS_JSON, datetime.utcnow()), outbox_row(message)
+
+
+async def insert_single(pool, row, outbox):
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                "INSERT INTO orders (order_id, customer_id, warehouse_id, status, items, created_at) "
+                "VALUES ($1, $2, $3, $4, $5, $6)",
+                *row
+            )
+            await conn.execute(INSERT_OUTBOX_SQL, *outbox)
+
+
+async def run(write, clients: int, orders: int):
+    """Run `orders` writes spread over `clients` tasks; return (seconds, sorted latencies in ms)."""
+    latencies = []
+    per_client = orders // clients
+
+    async def client():
+        for _ in range(per_client):
+            start = time.perf_counter()
+            await write(*make_order())
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def report(label: str, elapsed: float, latencies: list, extra: str = ""):
+    n = len(latencies)
+    p50 = latencies[int(n * 0.50)]
+    p99 = latencies[min(n - 1, int(n * 0.99))]
+    print(f"  {label:<18} {n / elapsed:>9.0f} orders/s   p50={p50:>7.2f}ms   p99={p99:>7.2f}ms   {extra}")
+
+
+async def cleanup(pool):
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            await conn.execute("DELETE FROM order_outbox WHERE payload->>'customer_id' = $1", BENCH_CUSTOMER)
+            await conn.execute("DELETE FROM orders WHERE customer_id = $1", BENCH_CUSTOMER)
+
+
+async def bench(args):
+    pool = ConnectionPool(2, args.pool_size, wait_timeout=30, **DB_CONFIG)
+    await pool.open()
+
+    print("=" * 80)
+    print(f"🧪 GROUP COMMIT: {args.clients} clients, {args.orders} orders/run, pool {args.pool_size}")
+    print("=" * 80)
+
+    try:
+        elapsed, latencies = await run(lambda row, outbox: insert_single(pool, row, outbox), args.clients, args.orders)
+        report("single-row commit", elapsed, latencies)
+
+        for window in args.windows:
+            writer = OrderBatchWriter(pool, window_ms=window, max_batch=args.max_batch)
+            writer.start()
+            try:
+                elapsed, latencies = await run(writer.write, args.clients, args.orders)
+            finally:
+                await writer.stop()
+            stats = writer.stats()
+            report(f"window={window:g}ms", elapsed, latencies,
+                   f"avg batch={stats['avg_batch_size']} commits={stats['batches']}")
+    finally:
+        await cleanup(pool)
+        await pool.closeall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent writer tasks")
+    parser.add_argument("--orders", type=int, default=3200, help="Orders per run")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 1, 2, 5, 10], help="Batch windows (ms)")
+    parser.add_argument("--max-batch", type=int, default=100)
+    parser.add_argument("--pool-size", type=int, default=10)
+    args = parser.parse_args()
+
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Order Listing Benchmark - Python-rendered vs Postgres-rendered JSON
+Times one 100-order warehouse page both ways, measuring wall latency and the
+CPU the service process spends per request:
+
+  python   rows fetched, JSONB items decoded, dicts rebuilt, then serialized
+           through FastAPI's jsonable_encoder + json.dumps (the old path)
+  postgres json_agg builds the array in the query; the text is passed through
+
+USAGE (local docker-compose stack running and seeded):
+  python benchmarks/bench_order_listing.py
+  python benchmarks/bench_order_listing.py --orders 100 --items 5 --iterations 500
+
+Seeds orders for warehouse 'wh_bench_listing' and deletes them afterwards.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import asyncpg
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "order-service"))
+
+from pagination import encode_cursor, json_page_query, page_query, split_page  # noqa: E402
+
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "localhost"),
+    "port": int(os.environ.get("DB_PORT", "5432")),
+    "database": os.environ.get("DB_NAME", "rapid_delivery"),
+    "user": os.environ.get("DB_USER", "postgres"),
+    "password": os.environ.get("DB_PASS", "postgres"),
+}
+
+BENCH_WAREHOUSE = "wh_bench_listing"
+FIELDS = ["order_id", "customer_id", "warehouse_id", "status", "items", "created_at"]
+
+
+async def seed(conn, orders: int, items_per_order: int):
+    items = json.dumps([
+        {"item_id": f"item_{i}", "warehouse_id": BENCH_WAREHOUSE, "quantity": i + 1}
+        for i in range(items_per_order)
+    ])
+    now = datetime.utcnow()
+    await conn.executemany(
+        "INSERT INTO orders (order_id, customer_id, warehouse_id, status, items, created_at) "
+        "VALUES ($1, $2, $3, $4, $5, $6)",
+        [(str(uuid.uuid4()), f"bench_user_{i % 10}", BENCH_WAREHOUSE, "COMPLETED", items,
+          now - timedelta(seconds=i)) for i in range(orders)]
+    )
+
+
+async def cleanup(conn):
+    await conn.execute("DELETE FROM orders WHERE warehouse_id = $1", BENCH_WAREHOUSE)
+
+
+async def python_rendered(conn, limit: int) -> bytes:
+    sql, params = page_query(", ".join(FIELDS), "warehouse_id", BENCH_WAREHOUSE, limit=limit)
+    rows = await conn.fetch(sql, *params)
+    rows, next_cursor = split_page(rows, limit)
+
+    orders = []
+    for row in rows:
+        items_data = row[4] if isinstance(row[4], list) else json.loads(row[4])
+        orders.append({
+            "order_id": row[0],
+            "customer_id": row[1],
+            "warehouse_id": row[2],
+            "status": row[3],
+            "items": items_data,
+            "created_at": row[5].isoformat() if row[5] else None
+        })
+    result = {"orders": orders, "count": len(orders), "warehouse_id": BENCH_WAREHOUSE, "next_cursor": next_cursor}
+    return json.dumps(jsonable_encoder(result)).encode()
+
+
+async def postgres_rendered(conn, limit: int) -> bytes:
+    sql, params = json_page_query(FIELDS, "warehouse_id", BENCH_WAREHOUSE, limit=limit)
+    orders_json, count, last_created_at, last_order_id, has_more = await conn.fetchrow(sql, *params)
+    next_cursor = encode_cursor(last_created_at, last_order_id) if has_more else None
+    return (
+        f'{{"orders":{orders_json},"count":{count},'
+        f'"warehouse_id":{json.dumps(BENCH_WAREHOUSE)},"next_cursor":{json.dumps(next_cursor)}}}'
+    ).encode()
+
+
+async def measure(label: str, render, conn, limit: int, iterations: int):
+    await render(conn, limit)  # warm up plan cache / connection
+    latencies = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        body = await render(conn, limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    latencies.sort()
+    p50 = latencies[int(len(latencies) * 0.50)]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"  {label:<10} p50={p50:>7.2f}ms  p99={p99:>7.2f}ms  "
+          f"cpu/req={cpu / iterations * 1000:>6.3f}ms  {iterations / wall:>7.0f} req/s  "
+          f"body={len(body)} bytes")
+
+
+async def bench(args):
+    conn = await asyncpg.connect(**DB_CONFIG)
+    try:
+        await cleanup(conn)
+        await seed(conn, args.orders, args.items)
+
+        print("=" * 80)
+        print(f"🧪 ORDER LISTING: {args.orders}-order warehouse page, {args.items} items each, "
+              f"{args.iterations} iterations")
+        print("=" * 80)
+        await measure("python", python_rendered, conn, args.orders, args.iterations)
+        await measure("postgres", postgres_rendered, conn, args.orders, args.iterations)
+    finally:
+        await cleanup(conn)
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=100, help="Orders per page (and seeded)")
+    parser.add_argument("--items", type=int, default=3, help="Items per order")
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
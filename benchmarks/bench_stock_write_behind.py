@@ -0,0 +1,242 @@
+"""
+Stock Write-Behind Benchmark - Redis stock persisted to the inventory table
+Seeds --warehouses x --skus stock rows in PostgreSQL and Redis, then changes
+stock only through the real write paths - the worker's apply_stock (orders)
+and availability-service's update_stock (manager edits) - from --threads
+threads for --seconds, while fulfillment-worker/stock_write_behind.py flushes
+to PostgreSQL every --interval seconds:
+
+  load        changes per second, keys flushed (coalescing), durability lag
+              sampled the way /metrics reports it
+  consistent  once the flusher has stopped, Postgres matches Redis exactly
+              (checked with the reconciler's per-warehouse checksums)
+  crash       a flush dies after taking its keys (Postgres down): the next
+              flush writes them, nothing is lost
+  two         two flushers (two worker processes) at once: one flushes at a
+              time, still consistent
+  fast path   update_stock's Redis time before (GET + SET) and with the dirty mark
+
+  python benchmarks/bench_stock_write_behind.py
+  python benchmarks/bench_stock_write_behind.py --threads 8 --seconds 20 --interval 0.1
+
+Rows and keys live under the 'wh_bench_wb_' warehouses and are deleted
+afterwards. Needs the inventory table (seed.py).
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import execute_values
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_DIR = os.path.join(BENCH_DIR, "..", "fulfillment-worker")
+WORKER_PATH = os.path.join(WORKER_DIR, "main.py")
+AVAILABILITY_PATH = os.path.join(BENCH_DIR, "..", "availability-service", "main.py")
+PREFIX = "wh_bench_wb_"
+
+
+def load(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_worker(interval: float):
+    """Import fulfillment-worker/main.py without SQS (nothing connects until it is used)"""
+    os.environ.setdefault("ENV", "local")
+    os.environ.setdefault("DB_HOST", "localhost")
+    os.environ["STOCK_FLUSH_INTERVAL"] = str(interval)
+    sys.path.insert(0, WORKER_DIR)  # main.py imports its sibling modules
+    return load("fulfillment_worker", WORKER_PATH)
+
+
+def warehouse(i: int) -> str:
+    return f"{PREFIX}{i:03d}"
+
+
+def seed(worker, warehouses: int, skus: int) -> list:
+    rows = [(warehouse(w), f"sku_{s:04d}", 1_000_000) for w in range(warehouses) for s in range(skus)]
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, "INSERT INTO inventory (warehouse_id, item_id, stock) VALUES %s", rows,
+                           page_size=5000)
+        conn.commit()
+    pipe = worker.redis_client.pipeline(transaction=False)
+    for warehouse_id, item_id, stock in rows:
+        pipe.set(f"{warehouse_id}:{item_id}", stock)
+    pipe.execute()
+    return [(warehouse_id, item_id) for warehouse_id, item_id, _ in rows]
+
+
+def cleanup(worker):
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM inventory WHERE warehouse_id LIKE %s", (PREFIX + "%",))
+        conn.commit()
+    keys = list(worker.redis_client.scan_iter(match=f"{PREFIX}*", count=5000))
+    keys += list(worker.redis_client.scan_iter(match="stock:applied:bench-wb-*", count=5000))
+    for start in range(0, len(keys), 5000):
+        worker.redis_client.delete(*keys[start:start + 5000])
+    worker.redis_client.delete(worker.STOCK_DIRTY_KEY, "stock:dirty:flushing", "stock:dirty:lock")
+
+
+def consistent(worker) -> dict:
+    """The reconciler's checksums over the bench warehouses - nothing should differ"""
+    return worker.InventoryReconciler(worker.redis_client, worker.db_connection,
+                                      warehouse_pattern=PREFIX + "*").run(dry_run=True)
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def load_phase(worker, availability, keys: list, threads: int, seconds: float) -> dict:
+    """Orders and manager edits from `threads` threads for `seconds`, the flusher running"""
+    run_id = uuid.uuid4().hex[:8]
+    stop = threading.Event()
+    changes = [0] * threads
+
+    def change(thread: int):
+        rng = random.Random(thread)
+        n = 0
+        while not stop.is_set():
+            if n % 10 == 9:
+                warehouse_id, item_id = rng.choice(keys)
+                availability.update_stock(warehouse_id, item_id,
+                                          availability.StockUpdateRequest(stock=rng.randint(500_000, 1_000_000)))
+                changes[thread] += 1
+            else:
+                warehouse_id = rng.choice(keys)[0]
+                items = [{"item_id": item_id, "quantity": 1}
+                         for _, item_id in rng.sample([key for key in keys if key[0] == warehouse_id], 3)]
+                worker.apply_stock([(f"bench-wb-{run_id}-{thread}-{n}", warehouse_id, items)])
+                changes[thread] += len(items)
+            n += 1
+
+    flusher = worker.start_stock_flusher()
+    lags, unflushed = [], []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [executor.submit(change, thread) for thread in range(threads)]
+        while time.perf_counter() - started < seconds:
+            time.sleep(0.2)
+            lag = worker.stock_write_behind.lag()
+            lags.append(lag["durability_lag_seconds"])
+            unflushed.append(lag["unflushed_keys"])
+        stop.set()
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+    before = worker.stock_write_behind.keys_flushed
+    worker.stop_stock_flusher(flusher)
+    flushed = worker.stock_write_behind.keys_flushed
+    return {"changes": sum(changes), "seconds": elapsed, "lags": lags, "unflushed": unflushed,
+            "flushed": flushed, "final_flush": flushed - before}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--warehouses", type=int, default=20)
+    parser.add_argument("--skus", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=0.25, help="STOCK_FLUSH_INTERVAL")
+    args = parser.parse_args()
+
+    worker = load_worker(args.interval)
+    worker.logging.getLogger().setLevel(worker.logging.WARNING)
+    availability = load("availability_service", AVAILABILITY_PATH)
+    availability.print = lambda *a, **k: None  # its per-update log line
+    cleanup(worker)
+
+    print("=" * 100)
+    print(f"🧪 STOCK WRITE-BEHIND: {args.warehouses} x {args.skus} keys, {args.threads} threads, "
+          f"{args.seconds:g}s, flush every {args.interval:g}s")
+    print("=" * 100)
+    failures = 0
+    try:
+        keys = seed(worker, args.warehouses, args.skus)
+
+        result = load_phase(worker, availability, keys, args.threads, args.seconds)
+        print(f"  load        {result['changes'] / result['seconds']:>8.1f} stock changes/s   "
+              f"{result['changes']} changes -> {result['flushed']} rows written "
+              f"({result['changes'] / max(1, result['flushed']):.1f}x coalesced)")
+        print(f"              durability lag p50 {percentile(result['lags'], 0.5):.2f}s  "
+              f"p99 {percentile(result['lags'], 0.99):.2f}s  max {max(result['lags'], default=0):.2f}s   "
+              f"unflushed keys max {max(result['unflushed'], default=0)} of {len(keys)}")
+
+        check = consistent(worker)
+        lag = worker.stock_write_behind.lag()
+        ok = check["mismatched_warehouses"] == 0 and lag["unflushed_keys"] == 0
+        failures += not ok
+        print(f"  {'✅' if ok else '❌'} consistent  {check['mismatched_warehouses']}/{check['warehouses']} "
+              f"warehouses differ after the final flush ({result['final_flush']} key(s) in it)")
+
+        # Postgres down in the middle of a flush
+        write = worker.stock_write_behind._write
+
+        def postgres_down(keys, values):
+            raise worker.psycopg2.OperationalError("simulated: connection lost")
+
+        for warehouse_id, item_id in keys[:25]:
+            availability.update_stock(warehouse_id, item_id, availability.StockUpdateRequest(stock=7))
+        worker.stock_write_behind._write = postgres_down
+        try:
+            worker.stock_write_behind.flush()
+        except worker.psycopg2.OperationalError:
+            pass
+        worker.stock_write_behind._write = write
+        stranded = worker.redis_client.zcard("stock:dirty:flushing")
+        flushed = worker.stock_write_behind.flush()
+        check = consistent(worker)
+        ok = stranded == 25 and flushed == 25 and check["mismatched_warehouses"] == 0
+        failures += not ok
+        print(f"  {'✅' if ok else '❌'} crash       flush died holding {stranded} key(s); "
+              f"the next flush wrote {flushed}, {check['mismatched_warehouses']} warehouses differ")
+
+        # A second worker process's flusher alongside the first
+        other = worker.StockWriteBehind(worker.redis_client, worker.db_connection, interval=args.interval)
+        other_stop = threading.Event()
+        other_thread = threading.Thread(target=other.run, args=(other_stop,), daemon=True)
+        other_thread.start()
+        result = load_phase(worker, availability, keys, args.threads, min(args.seconds, 5))
+        other_stop.set()
+        other_thread.join()
+        check = consistent(worker)
+        ok = check["mismatched_warehouses"] == 0
+        failures += not ok
+        print(f"  {'✅' if ok else '❌'} two         flushers wrote {worker.stock_write_behind.keys_flushed} + "
+              f"{other.keys_flushed} keys (lock: one at a time), {check['mismatched_warehouses']} warehouses differ")
+
+        # What marking the key costs update_stock: the old GET + SET against the script
+        warehouse_id, item_id = keys[0]
+        key = f"{warehouse_id}:{item_id}"
+        started = time.perf_counter()
+        for n in range(2000):
+            worker.redis_client.get(key)
+            worker.redis_client.set(key, n)
+        old_us = (time.perf_counter() - started) / 2000 * 1e6
+        started = time.perf_counter()
+        for n in range(2000):
+            availability.update_stock(warehouse_id, item_id, availability.StockUpdateRequest(stock=n))
+        new_us = (time.perf_counter() - started) / 2000 * 1e6
+        print(f"\nFast path: update_stock {old_us:.0f}µs before (GET + SET), {new_us:.0f}µs now "
+              f"(GET + SET + ZADD NX in one script call) - still Redis only")
+    finally:
+        cleanup(worker)
+
+    if failures:
+        sys.exit(f"{failures} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Fulfillment Worker Heartbeat / Drain Benchmark - no duplicates from slow batches or shutdowns
+Runs the worker's QueueConsumer (fulfillment-worker/main.py) on a queue backend
+(--backend memory or redis) with a simulated handler that records every order
+it handles:
+
+  slow-batch   two consumers share the queue, batches take --slow-seconds,
+               longer than the visibility timeout. Without heartbeats the
+               other consumer gets the same messages while the first is still
+               on them; with heartbeats nothing is handled twice.
+  drain        a consumer is stopped (as on SIGTERM) mid-way through the
+               backlog: it stops receiving, finishes its in-flight batches
+               and returns. A second consumer then drains the rest - every
+               order must be handled exactly once.
+  drain-late   batches outlive the drain deadline: the consumer gives up at
+               the deadline and hands the messages back, so the next consumer
+               gets them at once instead of after the visibility timeout.
+
+  python benchmarks/bench_worker_drain.py
+  python benchmarks/bench_worker_drain.py --backend redis --visibility-timeout 2
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+WORKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fulfillment-worker")
+WORKER_PATH = os.path.join(WORKER_DIR, "main.py")
+STREAM_KEY = "bench:orders:drain"
+
+
+def load_worker():
+    """Import fulfillment-worker/main.py without a queue (nothing connects until it is used)"""
+    os.environ.setdefault("ENV", "local")
+    os.environ.setdefault("QUEUE_BACKEND", "memory")
+    os.environ.setdefault("DB_HOST", "localhost")
+    sys.path.insert(0, WORKER_DIR)  # main.py imports its sibling modules
+    spec = importlib.util.spec_from_file_location("fulfillment_worker", WORKER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class RecordingHandler:
+    """Simulated process_orders: sleeps per batch and counts how often each order was handled"""
+
+    def __init__(self, batch_seconds: float):
+        self.batch_seconds = batch_seconds
+        self.handled = Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, orders: list) -> list:
+        time.sleep(self.batch_seconds)
+        with self.lock:
+            self.handled.update(order["order_id"] for order in orders)
+        return [True] * len(orders)
+
+    def duplicates(self) -> int:
+        return sum(1 for count in self.handled.values() if count > 1)
+
+
+class Bench:
+    def __init__(self, worker, backend: str, visibility_timeout: float):
+        self.worker = worker
+        self.backend = backend
+        self.visibility_timeout = visibility_timeout
+
+    def new_queue(self, messages: int):
+        if self.backend == "memory":
+            queue = self.worker.MemoryQueue(visibility_timeout=self.visibility_timeout, max_deliveries=100)
+        else:
+            self.worker.redis_client.delete(STREAM_KEY, f"{STREAM_KEY}:dlq")
+            queue = self.worker.RedisStreamQueue(self.worker.redis_client, key=STREAM_KEY,
+                                                 consumer=f"bench-{uuid.uuid4().hex[:8]}",
+                                                 visibility_timeout=self.visibility_timeout, max_deliveries=100)
+        queue.send([(i, json.dumps({"order_id": f"order-{i}", "warehouse_id": f"wh_{i % 8}"}))
+                    for i in range(messages)])
+        return queue
+
+    def consumer_queue(self, queue):
+        """A second consumer on the same queue (its own consumer name on a stream)"""
+        if self.backend == "memory":
+            return queue
+        return self.worker.RedisStreamQueue(self.worker.redis_client, key=STREAM_KEY,
+                                            consumer=f"bench-{uuid.uuid4().hex[:8]}",
+                                            visibility_timeout=self.visibility_timeout, max_deliveries=100)
+
+    def consumer(self, queue, handler, heartbeat: bool, concurrency: int = 4):
+        return self.worker.QueueConsumer(
+            queue, handler, concurrency=concurrency, max_messages=10, wait_seconds=0.2, receivers=2,
+            visibility_timeout=self.visibility_timeout,
+            heartbeat_interval=self.visibility_timeout / 3 if heartbeat else 0
+        )
+
+    def close(self):
+        if self.backend == "redis":
+            self.worker.redis_client.delete(STREAM_KEY, f"{STREAM_KEY}:dlq")
+
+
+def start(consumer, stop: threading.Event, drain_timeout: float = None) -> dict:
+    result = {}
+
+    def run():
+        result["drained"] = consumer.run(stop, drain_timeout=drain_timeout)
+        result["stopped_at"] = time.perf_counter()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    result["thread"] = thread
+    return result
+
+
+def wait_until(predicate, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while not predicate() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+
+
+def slow_batch(bench: Bench, messages: int, slow_seconds: float, heartbeat: bool) -> bool:
+    queue = bench.new_queue(messages)
+    handler = RecordingHandler(slow_seconds)
+    stops = [threading.Event(), threading.Event()]
+    runs = [start(bench.consumer(queue if i == 0 else bench.consumer_queue(queue), handler, heartbeat), stop)
+            for i, stop in enumerate(stops)]
+    start_time = time.perf_counter()
+    wait_until(lambda: len(handler.handled) >= messages, 120)
+    elapsed = time.perf_counter() - start_time
+    for stop in stops:
+        stop.set()
+    for run in runs:
+        run["thread"].join()
+
+    extra = sum(handler.handled.values()) - len(handler.handled)
+    ok = heartbeat == (handler.duplicates() == 0)
+    print(f"  {'✅' if ok else '❌'} slow-batch  heartbeats {'on ' if heartbeat else 'off'}  "
+          f"{len(handler.handled)}/{messages} orders in {elapsed:>5.2f}s   "
+          f"handled twice: {handler.duplicates()} ({extra} extra runs)")
+    return ok
+
+
+def drain(bench: Bench, messages: int, batch_seconds: float, stop_after: float, drain_timeout: float,
+          late: bool) -> bool:
+    queue = bench.new_queue(messages)
+    handler = RecordingHandler(batch_seconds)
+    stop = threading.Event()
+    first = bench.consumer(queue, handler, heartbeat=True)
+    run = start(first, stop, drain_timeout)
+    time.sleep(stop_after)
+    stopped = time.perf_counter()
+    stop.set()
+    run["thread"].join()
+    stop_seconds = run["stopped_at"] - stopped
+    done_by_first = len(handler.handled)
+
+    # The replacement worker drains the rest (at normal speed), recording into the same counter
+    replacement = RecordingHandler(0.01)
+    replacement.handled, replacement.lock = handler.handled, handler.lock
+    second_stop = threading.Event()
+    second = bench.consumer(bench.consumer_queue(queue), replacement, heartbeat=True)
+    second_run = start(second, second_stop)
+    picked_up = time.perf_counter()
+    wait_until(lambda: len(handler.handled) >= messages, 120)
+    rest_seconds = time.perf_counter() - picked_up
+    second_stop.set()
+    second_run["thread"].join()
+
+    stats = first.stats()
+    exactly_once = len(handler.handled) == messages and handler.duplicates() == 0
+    if late:
+        # Handed back at the deadline: picked up without waiting out the visibility timeout
+        ok = (not run["drained"] and stats["released"] > 0 and stop_seconds < drain_timeout + 1
+              and rest_seconds < bench.visibility_timeout)
+        name = "drain-late"
+    else:
+        ok = run["drained"] and exactly_once and stats["messages_in_flight"] == 0
+        name = "drain"
+    print(f"  {'✅' if ok else '❌'} {name:<11} stopped in {stop_seconds:>5.2f}s (drained: {run['drained']}), "
+          f"{done_by_first} done before exit, {stats['released']} handed back; "
+          f"next consumer finished the rest in {rest_seconds:>5.2f}s; "
+          f"{len(handler.handled)}/{messages} orders, handled twice: {handler.duplicates()}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["memory", "redis"], default="memory")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--visibility-timeout", type=float, default=1.0)
+    parser.add_argument("--slow-seconds", type=float, default=2.5, help="Batch time in slow-batch")
+    parser.add_argument("--batch-seconds", type=float, default=0.2, help="Batch time in drain")
+    parser.add_argument("--drain-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    worker = load_worker()
+    worker.logging.getLogger().setLevel(worker.logging.ERROR)
+    if args.backend == "redis" and worker.redis_client is None:
+        sys.exit("Redis is required for the redis backend (REDIS_HOST / REDIS_PORT)")
+    bench = Bench(worker, args.backend, args.visibility_timeout)
+
+    print("=" * 80)
+    print(f"🧪 WORKER HEARTBEAT / DRAIN: {args.backend} queue, visibility timeout {args.visibility_timeout:g}s")
+    print("=" * 80)
+    failures = 0
+    try:
+        # Few enough messages that both consumers are busy with slow batches at once
+        for heartbeat in (False, True):
+            failures += not slow_batch(bench, 40, args.slow_seconds, heartbeat)
+        failures += not drain(bench, args.messages, args.batch_seconds, stop_after=0.5,
+                              drain_timeout=args.drain_timeout, late=False)
+        # A visibility timeout well above the batch time, so a hand-back is clearly faster than a timeout
+        late_bench = Bench(worker, args.backend, visibility_timeout=10)
+        failures += not drain(late_bench, 40, batch_seconds=3, stop_after=0.5, drain_timeout=1.0, late=True)
+    finally:
+        bench.close()
+
+    if failures:
+        sys.exit(f"{failures} scenario(s) failed")
+
+
+if __name__ == "__main__":
+    main()
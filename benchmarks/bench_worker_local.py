@@ -0,0 +1,203 @@
+"""
+Fulfillment Worker Local-Mode Benchmark - SKIP LOCKED claiming + NOTIFY wake-ups
+Runs 1, 4 and 8 fulfillment-worker processes (QUEUE_BACKEND=table) against PostgreSQL
+(DB_* environment) and measures:
+
+  drain   with the workers running and idle, --orders PENDING orders are
+          placed in one transaction and timed until every one is COMPLETED.
+          COMPLETED notifications are counted per order: any order completed
+          more than once means two workers processed the same row.
+  wake    with the workers idle, --probes orders are placed one at a time the
+          way order-service does it (INSERT + pg_notify in one transaction) and
+          timed until each one is COMPLETED. The old loop slept 2s when idle.
+
+  python benchmarks/bench_worker_local.py
+  python benchmarks/bench_worker_local.py --orders 5000 --workers 1 4 8 --claim-batch 10 50
+  python benchmarks/bench_worker_local.py --lanes 0 8 --warehouses 16
+
+--lanes sets WORKER_LANES in the workers (0 = unpartitioned); with lanes each
+warehouse lane is drained by one transaction at a time across all processes.
+
+Redis is disabled in the worker processes (REDIS_HOST points nowhere) so only
+the claim path is measured. Orders are written with customer_id
+'bench_worker_local' and deleted afterwards. Stop any other local worker
+first - it would take orders from the benchmark.
+"""
+
+import argparse
+import json
+import os
+import select
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+import psycopg2
+
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fulfillment-worker", "main.py")
+CHANNEL = "order_status"
+BENCH_CUSTOMER = "bench_worker_local"
+WAREHOUSE = "wh_bench_worker"
+ITEMS = [{"item_id": "apple", "quantity": 1}]
+
+
+def connect():
+    return psycopg2.connect(
+        host=os.environ.get("DB_HOST", "localhost"),
+        port=os.environ.get("DB_PORT", "5432"),
+        database=os.environ.get("DB_NAME", "postgres"),
+        user=os.environ.get("DB_USER", "postgres"),
+        password=os.environ.get("DB_PASS", "password"),
+    )
+
+
+def payload(order_id: str, warehouse_id: str, status: str) -> str:
+    # Same shape as order-service's order_events.event_payload
+    return json.dumps({"order_id": order_id, "customer_id": BENCH_CUSTOMER, "warehouse_id": warehouse_id,
+                       "status": status}, separators=(",", ":"))
+
+
+def seed_orders(conn, count: int, warehouses: int = 1, notify: bool = False) -> list:
+    order_ids = [str(uuid.uuid4()) for _ in range(count)]
+    warehouse_ids = [f"{WAREHOUSE}_{i % warehouses}" for i in range(count)]
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO orders (order_id, customer_id, warehouse_id, status, items, created_at) "
+            "SELECT order_id, %s, warehouse_id, 'PENDING', %s::jsonb, %s "
+            "FROM unnest(%s::text[], %s::text[]) AS o(order_id, warehouse_id)",
+            (BENCH_CUSTOMER, json.dumps(ITEMS), datetime.utcnow(), order_ids, warehouse_ids)
+        )
+        if notify:
+            cur.execute("SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                        (CHANNEL, [payload(order_id, warehouse_id, "PENDING")
+                                   for order_id, warehouse_id in zip(order_ids, warehouse_ids)]))
+    conn.commit()
+    return order_ids
+
+
+def cleanup(conn):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM orders WHERE customer_id = %s", (BENCH_CUSTOMER,))
+    conn.commit()
+
+
+class CompletionListener:
+    """LISTENs on the order status channel and timestamps COMPLETED events per order"""
+
+    def __init__(self):
+        self.conn = connect()
+        self.conn.autocommit = True
+        with self.conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+        self.completed = Counter()
+        self.completed_at = {}
+
+    def poll(self, timeout: float):
+        if select.select([self.conn], [], [], timeout)[0]:
+            self.conn.poll()
+        now = time.perf_counter()
+        for notify in self.conn.notifies:
+            event = json.loads(notify.payload)
+            if event.get("customer_id") == BENCH_CUSTOMER and event.get("status") == "COMPLETED":
+                self.completed[event["order_id"]] += 1
+                self.completed_at.setdefault(event["order_id"], now)
+        self.conn.notifies.clear()
+
+    def wait_for(self, order_ids: list, timeout: float) -> bool:
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if all(order_id in self.completed_at for order_id in order_ids):
+                return True
+            self.poll(0.05)
+        return False
+
+    def close(self):
+        self.conn.close()
+
+
+def start_workers(count: int, claim_batch: int, poll_interval: float, lanes: int) -> list:
+    env = dict(os.environ, ENV="local", QUEUE_BACKEND="table", LOCAL_CLAIM_BATCH=str(claim_batch),
+               LOCAL_POLL_INTERVAL=str(poll_interval), REDIS_HOST="127.0.0.1", REDIS_PORT="1",
+               WORKER_CONCURRENCY="1", WORKER_LANES=str(lanes))
+    return [subprocess.Popen([sys.executable, WORKER_PATH], env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            for _ in range(count)]
+
+
+def stop_workers(workers: list):
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.wait(timeout=10)
+
+
+def run(conn, workers: int, claim_batch: int, lanes: int, warehouses: int, orders: int, probes: int,
+        poll_interval: float):
+    listener = CompletionListener()
+    procs = start_workers(workers, claim_batch, poll_interval, lanes)
+    label = f"x{workers:<3} batch {claim_batch:<4} lanes {lanes:<3}"
+    try:
+        # Let the workers start up and go idle, then place the whole backlog at once
+        time.sleep(2)
+        start = time.perf_counter()
+        order_ids = seed_orders(conn, orders, warehouses, notify=True)
+        if not listener.wait_for(order_ids, timeout=300):
+            print(f"  {label} ❌ timed out, "
+                  f"{len(listener.completed_at)}/{orders} completed")
+            return
+        elapsed = max(listener.completed_at.values()) - start
+        duplicates = sum(1 for order_id in order_ids if listener.completed[order_id] > 1)
+
+        # Idle wake-up: one order at a time, workers have nothing else to do
+        latencies = []
+        for _ in range(probes):
+            time.sleep(0.2)
+            placed = time.perf_counter()
+            probe = seed_orders(conn, 1, notify=True)
+            if listener.wait_for(probe, timeout=poll_interval + 5):
+                latencies.append((listener.completed_at[probe[0]] - placed) * 1000)
+
+        wake = (f"wake p50 {statistics.median(latencies):>6.1f}ms  max {max(latencies):>6.1f}ms"
+                if latencies else "wake n/a")
+        print(f"  {label} {orders / elapsed:>8.1f} orders/s   "
+              f"{elapsed:>6.2f}s   duplicates {duplicates}   {wake}")
+    finally:
+        stop_workers(procs)
+        listener.close()
+        cleanup(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000, help="PENDING orders to drain per run")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8], help="Worker processes per run")
+    parser.add_argument("--claim-batch", type=int, nargs="+", default=[10], help="LOCAL_CLAIM_BATCH values")
+    parser.add_argument("--lanes", type=int, nargs="+", default=[0], help="WORKER_LANES values (0 = unpartitioned)")
+    parser.add_argument("--warehouses", type=int, default=1, help="Warehouses the orders are spread over")
+    parser.add_argument("--probes", type=int, default=10, help="Single orders placed to measure idle wake-up")
+    parser.add_argument("--poll-interval", type=float, default=2, help="LOCAL_POLL_INTERVAL (fallback poll)")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print(f"🧪 WORKER LOCAL MODE: {args.orders} orders over {args.warehouses} warehouse(s), "
+          f"SKIP LOCKED claims, NOTIFY wake-ups")
+    print("=" * 80)
+
+    conn = connect()
+    cleanup(conn)
+    try:
+        for lanes in args.lanes:
+            for claim_batch in args.claim_batch:
+                for workers in args.workers:
+                    run(conn, workers, claim_batch, lanes, args.warehouses, args.orders, args.probes,
+                        args.poll_interval)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
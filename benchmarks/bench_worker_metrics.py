@@ -0,0 +1,198 @@
+"""
+Fulfillment Worker Metrics Benchmark - what an autoscaler would see
+Seeds --orders PENDING orders in PostgreSQL, queues them on the worker's
+memory queue and drains them with the real QueueConsumer + process_orders
+(plus --txn-ms of simulated work per batch, so the drain takes a while),
+while scraping the worker's metrics endpoint (WORKER_METRICS_PORT) every
+--interval seconds:
+
+  queue depth, oldest PENDING order, batch slots busy, enqueue -> complete latency
+
+Then checks that the backlog reads as drained (queue empty, no PENDING lag,
+one latency observation per order), that the slots read busy while draining
+and idle once the busy window has passed, and measures what a scrape and the
+busy tracking cost:
+
+  python benchmarks/bench_worker_metrics.py
+  python benchmarks/bench_worker_metrics.py --orders 2000 --concurrency 8 --txn-ms 50
+
+Writes orders with customer_id 'bench_worker_metrics' and deletes them afterwards.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import datetime
+
+WORKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fulfillment-worker")
+WORKER_PATH = os.path.join(WORKER_DIR, "main.py")
+BENCH_CUSTOMER = "bench_worker_metrics"
+ITEMS = [{"item_id": "apple", "quantity": 1}]
+
+
+def load_worker(port: int, busy_window: float):
+    """Import fulfillment-worker/main.py on the memory queue, metrics on `port`"""
+    os.environ.setdefault("ENV", "local")
+    os.environ.setdefault("QUEUE_BACKEND", "memory")
+    os.environ.setdefault("DB_HOST", "localhost")
+    os.environ["WORKER_METRICS_PORT"] = str(port)
+    os.environ["WORKER_METRICS_CACHE_SECONDS"] = "1"
+    os.environ["WORKER_BUSY_WINDOW"] = str(busy_window)
+    sys.path.insert(0, WORKER_DIR)  # main.py imports its sibling modules
+    spec = importlib.util.spec_from_file_location("fulfillment_worker", WORKER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def seed_orders(worker, count: int) -> list:
+    orders = [{"order_id": str(uuid.uuid4()), "customer_id": BENCH_CUSTOMER,
+               "warehouse_id": f"wh_bench_metrics_{i % 8}", "items": ITEMS} for i in range(count)]
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO orders (order_id, customer_id, warehouse_id, status, items, created_at) "
+                "SELECT order_id, %s, warehouse_id, 'PENDING', %s::jsonb, %s "
+                "FROM unnest(%s::text[], %s::text[]) AS o(order_id, warehouse_id)",
+                (BENCH_CUSTOMER, json.dumps(ITEMS), datetime.utcnow(),
+                 [order["order_id"] for order in orders], [order["warehouse_id"] for order in orders])
+            )
+        conn.commit()
+    return orders
+
+
+def cleanup(worker):
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM orders WHERE customer_id = %s", (BENCH_CUSTOMER,))
+        conn.commit()
+
+
+def scrape(port: int, path: str) -> str:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as response:
+        return response.read().decode()
+
+
+def row(elapsed: float, stats: dict) -> str:
+    queue = stats.get("queue", {})
+    latency = stats["order_latency_seconds"]
+    batch = stats["slots"]["batch"]
+    return (f"  {elapsed:>5.1f}s  queue {queue.get('visible', '-'):>5} + {queue.get('in_flight', '-'):>3} in flight  "
+            f"pending {stats.get('pending_orders', '-'):>5}  oldest {stats.get('oldest_pending_age_seconds', 0):>6.1f}s  "
+            f"busy {batch['busy_now']}/{batch['slots']} ({batch['busy_ratio']:.0%} of {batch['window_seconds']:g}s)  "
+            f"done {latency['count']:>5}  p50 {latency['p50'] or 0:g}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--txn-ms", type=float, default=100.0, help="Simulated work per batch, on top of the DB")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between scrapes")
+    parser.add_argument("--busy-window", type=float, default=5.0, help="WORKER_BUSY_WINDOW for the run")
+    parser.add_argument("--port", type=int, default=19100)
+    args = parser.parse_args()
+
+    worker = load_worker(args.port, args.busy_window)
+    worker.logging.getLogger().setLevel(worker.logging.WARNING)
+    cleanup(worker)
+    baseline, _ = worker.pending_orders()
+
+    def handler(orders: list) -> list:
+        time.sleep(args.txn_ms / 1000.0)
+        return worker.process_orders(orders)
+
+    queue = worker.MemoryQueue(visibility_timeout=30)
+    consumer = worker.QueueConsumer(queue, handler, concurrency=args.concurrency, max_messages=10,
+                                    wait_seconds=0.2, receivers=max(1, args.concurrency // 4),
+                                    visibility_timeout=30, busy_window=args.busy_window)
+    worker.start_metrics_server(queue=queue, pools={"batch": consumer.batch_usage, "lane": consumer.lane_usage},
+                                stats=consumer.stats)
+
+    print("=" * 100)
+    print(f"🧪 WORKER METRICS: {args.orders} orders, {args.concurrency} batch slots, "
+          f"+{args.txn_ms:g}ms per batch, busy window {args.busy_window:g}s")
+    print("=" * 100)
+    failures = 0
+    try:
+        orders = seed_orders(worker, args.orders)
+        queue.send([(i, json.dumps(order)) for i, order in enumerate(orders)])
+        time.sleep(1.1)  # past the cache, so the first scrape shows the whole backlog
+        start = time.perf_counter()
+        first = json.loads(scrape(args.port, "/stats"))
+        print(row(0, first))
+
+        stop = threading.Event()
+        thread = threading.Thread(target=consumer.run, args=(stop,), daemon=True)
+        thread.start()
+        peak_busy = 0.0
+        while True:
+            time.sleep(args.interval)
+            stats = json.loads(scrape(args.port, "/stats"))
+            peak_busy = max(peak_busy, stats["slots"]["batch"]["busy_ratio"])
+            print(row(time.perf_counter() - start, stats))
+            drained = stats["order_latency_seconds"]["count"] >= args.orders and not len(queue)
+            if drained or time.perf_counter() - start > 300:
+                break
+        drain_seconds = time.perf_counter() - start
+
+        # Idle for a whole busy window (and past the lag cache)
+        time.sleep(args.busy_window + 1.1)
+        idle = json.loads(scrape(args.port, "/stats"))
+        print(row(time.perf_counter() - start, idle) + "   <- idle")
+        stop.set()
+        consumer.wake()
+        thread.join()
+
+        text = scrape(args.port, "/metrics")
+        backlog_seen = first["queue"]["visible"] == args.orders and first["pending_orders"] - baseline == args.orders
+        drained_seen = (idle["queue"]["visible"] + idle["queue"]["in_flight"] == 0
+                        and idle["pending_orders"] == baseline
+                        and idle["order_latency_seconds"]["count"] == args.orders
+                        and f"worker_order_latency_seconds_count {args.orders}" in text)
+        checks = [
+            ("backlog visible before the drain", backlog_seen),
+            ("drained: queue empty, no PENDING lag, one latency per order", drained_seen),
+            (f"slots busy while draining (peak {peak_busy:.0%})", peak_busy >= 0.5),
+            (f"slots idle after the window ({idle['slots']['batch']['busy_ratio']:.0%})",
+             idle["slots"]["batch"]["busy_ratio"] < 0.05),
+        ]
+        print(f"\nDrained {args.orders} orders in {drain_seconds:.1f}s")
+        for name, ok in checks:
+            print(f"  {'✅' if ok else '❌'} {name}")
+            failures += not ok
+
+        # What the endpoint costs: cached scrapes, a lag refresh (queue + PENDING query), busy tracking
+        started = time.perf_counter()
+        for _ in range(100):
+            scrape(args.port, "/metrics")
+        cached_ms = (time.perf_counter() - started) * 10
+        started = time.perf_counter()
+        for _ in range(20):
+            worker.pending_orders()
+            queue.depth()
+        refresh_ms = (time.perf_counter() - started) * 50
+        usage = worker.SlotUsage(args.concurrency)
+        started = time.perf_counter()
+        for _ in range(100_000):
+            with usage.busy():
+                pass
+        busy_us = (time.perf_counter() - started) * 10
+        print(f"\nCost: /metrics {cached_ms:.2f}ms per scrape (cached lag), lag refresh {refresh_ms:.2f}ms "
+              f"(at most every WORKER_METRICS_CACHE_SECONDS), busy tracking {busy_us:.2f}µs per batch")
+        print(f"\n{text.splitlines()[0]}\n  ... {len(text.splitlines())} lines")
+    finally:
+        cleanup(worker)
+
+    if failures:
+        sys.exit(f"{failures} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
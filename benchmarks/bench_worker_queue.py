@@ -0,0 +1,204 @@
+"""
+Order Queue Backend Benchmark - the production publish / consume path offline
+Publishes --messages orders in outbox-sized batches and drains them with the
+worker's QueueConsumer (the same one that consumes SQS in production), on:
+
+  memory  in-process queue (fulfillment-worker/order_queue.py)
+  redis   a Redis Stream: order-service's publisher (XADD pipelined per batch),
+          the worker reading through a consumer group, acks = XACK + XDEL
+
+Order processing is simulated (--txn-ms per batch plus --order-ms per order),
+so only the queue path is measured. Then, per backend, a crashed consumer is
+simulated - a message received and never acked - and the message is checked
+to come back after the visibility timeout (Redis: XAUTOCLAIM of the pending
+entry) and to move to the dead letters after --max-deliveries deliveries:
+
+  python benchmarks/bench_worker_queue.py
+  python benchmarks/bench_worker_queue.py --messages 20000 --concurrency 1 8 --backends redis
+
+Redis comes from REDIS_HOST / REDIS_PORT; the stream 'bench:orders:queue'
+is deleted afterwards.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_DIR = os.path.join(BENCH_DIR, "..", "fulfillment-worker")
+ORDER_SERVICE_DIR = os.path.join(BENCH_DIR, "..", "order-service")
+STREAM_KEY = "bench:orders:queue"
+
+
+def load_module(name: str, path: str, directory: str):
+    sys.path.insert(0, directory)  # sibling imports
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(directory)
+    return module
+
+
+def load_worker():
+    """Import fulfillment-worker/main.py without a queue (nothing connects until it is used)"""
+    os.environ.setdefault("ENV", "local")
+    os.environ.setdefault("QUEUE_BACKEND", "memory")
+    os.environ.setdefault("DB_HOST", "localhost")
+    return load_module("fulfillment_worker", os.path.join(WORKER_DIR, "main.py"), WORKER_DIR)
+
+
+def order_bodies(count: int) -> list:
+    return [(i, json.dumps({"order_id": str(uuid.uuid4()), "customer_id": "bench_worker_queue",
+                            "warehouse_id": f"wh_bench_{i % 16}", "items": [{"item_id": "apple", "quantity": 1}]}))
+            for i in range(count)]
+
+
+class Backend:
+    """A backend's publisher (what order-service uses) and consumer queue (what the worker uses)"""
+
+    def __init__(self, name: str, worker, publisher_module, redis_client, visibility_timeout: float,
+                 max_deliveries: int):
+        self.name = name
+        self.redis = redis_client
+        if name == "memory":
+            self.queue = worker.MemoryQueue(visibility_timeout=visibility_timeout, max_deliveries=max_deliveries)
+            self.publisher = self.queue
+        else:
+            redis_client.delete(STREAM_KEY, f"{STREAM_KEY}:dlq")
+            self.queue = worker.RedisStreamQueue(redis_client, key=STREAM_KEY, consumer="bench-consumer",
+                                                 visibility_timeout=visibility_timeout,
+                                                 max_deliveries=max_deliveries)
+            self.publisher = publisher_module.RedisStreamQueue(redis_client, key=STREAM_KEY)
+
+    def dead_letters(self) -> int:
+        if self.name == "memory":
+            return len(self.queue.dead_letters)
+        return self.redis.xlen(self.queue.dead_letter_key)
+
+    def close(self):
+        if self.redis is not None:
+            self.redis.delete(STREAM_KEY, f"{STREAM_KEY}:dlq")
+
+
+class SimulatedHandler:
+    def __init__(self, txn_ms: float, order_ms: float, total: int):
+        self.txn = txn_ms / 1000.0
+        self.order = order_ms / 1000.0
+        self.total = total
+        self.handled = 0
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def __call__(self, orders: list) -> list:
+        time.sleep(self.txn + self.order * len(orders))
+        with self.lock:
+            self.handled += len(orders)
+            if self.handled >= self.total:
+                self.done.set()
+        return [True] * len(orders)
+
+
+def throughput(worker, backend: Backend, messages: int, publish_batch: int, concurrency: int,
+               txn_ms: float, order_ms: float):
+    entries = order_bodies(messages)
+    start = time.perf_counter()
+    for offset in range(0, messages, publish_batch):
+        sent = backend.publisher.send(entries[offset:offset + publish_batch])
+        assert len(sent) == len(entries[offset:offset + publish_batch]), "publish rejected entries"
+    published = time.perf_counter() - start
+
+    handler = SimulatedHandler(txn_ms, order_ms, messages)
+    consumer = worker.QueueConsumer(backend.queue, handler, concurrency=concurrency, max_messages=10,
+                                    wait_seconds=1, receivers=max(1, concurrency // 4))
+    stop = threading.Event()
+    thread = threading.Thread(target=consumer.run, args=(stop,))
+    start = time.perf_counter()
+    thread.start()
+    handler.done.wait(timeout=300)
+    # The last batch is handled before it is acked
+    while consumer.acked < handler.handled and time.perf_counter() - start < 300:
+        time.sleep(0.001)
+    consumed = time.perf_counter() - start
+    stop.set()
+    consumer.wake()
+    thread.join()
+
+    stats = consumer.stats()
+    print(f"  {backend.name:<7} x{concurrency:<3} publish {messages / published:>9.1f} msg/s   "
+          f"consume {stats['acked'] / consumed:>8.1f} orders/s   "
+          f"{stats['receives']} receives, {stats['ack_calls']} ack calls, acked {stats['acked']}/{messages}")
+    return stats["acked"] == messages
+
+
+def redelivery(backend: Backend, visibility_timeout: float, max_deliveries: int) -> bool:
+    """A consumer that dies with the message in hand: redelivered, then dead-lettered"""
+    backend.publisher.send(order_bodies(1))
+    deliveries = 0
+    deadline = time.monotonic() + visibility_timeout * (max_deliveries + 3)
+    while time.monotonic() < deadline and not backend.dead_letters():
+        # Never acked - as if the worker died holding it
+        deliveries += len(backend.queue.receive(10, visibility_timeout / 4))
+    ok = deliveries == max_deliveries and backend.dead_letters() == 1 and not backend.queue.receive(10, 0.1)
+    print(f"  {'✅' if ok else '❌'} {backend.name:<7} unacked message delivered {deliveries}x "
+          f"(every {visibility_timeout:g}s), then dead-lettered ({backend.dead_letters()} dead letter)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--backends", nargs="+", default=["memory", "redis"], choices=["memory", "redis"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8], help="Batches in flight")
+    parser.add_argument("--publish-batch", type=int, default=10, help="Entries per send (OUTBOX_BATCH_SIZE)")
+    parser.add_argument("--txn-ms", type=float, default=2.0, help="Simulated time per batch")
+    parser.add_argument("--order-ms", type=float, default=0.1, help="Simulated time per order")
+    parser.add_argument("--visibility-timeout", type=float, default=1.0)
+    parser.add_argument("--max-deliveries", type=int, default=3)
+    args = parser.parse_args()
+
+    worker = load_worker()
+    # The worker logs every batch - keep the report readable
+    worker.logging.getLogger().setLevel(worker.logging.WARNING)
+    publisher_module = load_module("order_service_queue", os.path.join(ORDER_SERVICE_DIR, "order_queue.py"),
+                                   ORDER_SERVICE_DIR)
+    redis_client = worker.redis_client
+    if "redis" in args.backends and redis_client is None:
+        sys.exit("Redis is required for the redis backend (REDIS_HOST / REDIS_PORT)")
+
+    print("=" * 80)
+    print(f"🧪 ORDER QUEUE BACKENDS: {args.messages} orders, published {args.publish_batch} per send, "
+          f"simulated {args.txn_ms:g}ms/batch + {args.order_ms:g}ms/order")
+    print("=" * 80)
+    failures = 0
+    for name in args.backends:
+        for concurrency in args.concurrency:
+            backend = Backend(name, worker, publisher_module, redis_client, args.visibility_timeout,
+                              args.max_deliveries)
+            try:
+                failures += not throughput(worker, backend, args.messages, args.publish_batch, concurrency,
+                                           args.txn_ms, args.order_ms)
+            finally:
+                backend.close()
+
+    print(f"\nRedelivery: visibility timeout {args.visibility_timeout:g}s, max {args.max_deliveries} deliveries")
+    for name in args.backends:
+        backend = Backend(name, worker, publisher_module, redis_client, args.visibility_timeout,
+                          args.max_deliveries)
+        try:
+            failures += not redelivery(backend, args.visibility_timeout, args.max_deliveries)
+        finally:
+            backend.close()
+
+    if failures:
+        sys.exit(f"{failures} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
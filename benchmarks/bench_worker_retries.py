@@ -0,0 +1,267 @@
+"""
+Fulfillment Worker Retry Benchmark - backoff retries, dead letters, replay
+Runs the worker's real order processing (fulfillment-worker/main.py) against
+PostgreSQL and Redis (DB_* / REDIS_* environment) with injected failures.
+
+Scenarios (retry poller running, short backoff):
+
+  flaky       Redis stock fails twice, then works - completed on the 3rd attempt
+  down        Redis stock always fails - retried RETRY_MAX_ATTEMPTS times, then
+              FAILED and dead-lettered
+  bad-order   a quantity that is not a number - dead-lettered at once, no retries
+  replay      the 'down' order replayed with the dead-letters CLI once Redis
+              is back - completed
+
+Hot loop: --healthy good orders and --poison orders that always fail
+transiently are drained by one table-mode lane (QUEUE_BACKEND=table).
+Without the retry scheduler (the old behaviour) the poison orders stay
+PENDING, are the oldest, and are claimed again on every pass; with it they
+are parked with backoff and the healthy orders flow at full batch size:
+
+  python benchmarks/bench_worker_retries.py
+  python benchmarks/bench_worker_retries.py --healthy 2000 --poison 20
+
+Orders are written with customer_id 'bench_worker_retries' and deleted
+afterwards, with their dead letters and retries.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+WORKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fulfillment-worker")
+WORKER_PATH = os.path.join(WORKER_DIR, "main.py")
+BENCH_CUSTOMER = "bench_worker_retries"
+WAREHOUSE = "wh_bench_retries"
+ITEMS = [{"item_id": "apple", "warehouse_id": WAREHOUSE, "quantity": 1}]
+
+
+def load_worker():
+    """Import fulfillment-worker/main.py without SQS (nothing connects until it is used)"""
+    os.environ.setdefault("ENV", "local")
+    os.environ.setdefault("QUEUE_BACKEND", "table")  # the hot loop drains a table-mode lane
+    os.environ.setdefault("DB_HOST", "localhost")
+    sys.path.insert(0, WORKER_DIR)  # main.py imports its sibling modules
+    spec = importlib.util.spec_from_file_location("fulfillment_worker", WORKER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def new_orders(worker, count: int, items=ITEMS, age: float = 0) -> list:
+    """`count` PENDING orders, created `age` seconds ago (older orders are claimed first)"""
+    orders = [{"order_id": str(uuid.uuid4()), "customer_id": BENCH_CUSTOMER, "warehouse_id": WAREHOUSE,
+               "items": items} for _ in range(count)]
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO orders (order_id, customer_id, warehouse_id, status, items, created_at) "
+                "SELECT order_id, %s, %s, 'PENDING', %s::jsonb, %s FROM unnest(%s::text[]) AS order_id",
+                (BENCH_CUSTOMER, WAREHOUSE, json.dumps(items), datetime.utcnow() - timedelta(seconds=age),
+                 [order["order_id"] for order in orders])
+            )
+        conn.commit()
+    return orders
+
+
+def query(worker, sql: str, params=()) -> list:
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        conn.rollback()
+    return rows
+
+
+def order_status(worker, order_id: str) -> str:
+    return query(worker, "SELECT status FROM orders WHERE order_id = %s", (order_id,))[0][0]
+
+
+def dead_letters(worker, order_id: str) -> list:
+    return query(worker, "SELECT id, attempts, replayed_at FROM order_dead_letters WHERE order_id = %s "
+                         "ORDER BY id", (order_id,))
+
+
+def cleanup(worker):
+    order_ids = [row[0] for row in query(worker, "SELECT order_id FROM orders WHERE customer_id = %s",
+                                         (BENCH_CUSTOMER,))]
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM order_dead_letters WHERE order_id = ANY(%s)", (order_ids,))
+            cur.execute("DELETE FROM orders WHERE customer_id = %s", (BENCH_CUSTOMER,))
+        conn.commit()
+    client = worker.redis_client
+    retries = [member for member in client.zrange(worker.retry_scheduler.key, 0, -1)
+               if json.loads(member).get("customer_id") == BENCH_CUSTOMER]
+    if retries:
+        client.zrem(worker.retry_scheduler.key, *retries)
+    markers = [worker.STOCK_APPLIED_KEY.format(order_id=order_id) for order_id in order_ids]
+    for start in range(0, len(markers), 1000):
+        client.delete(*markers[start:start + 1000])
+
+
+class FailingStock:
+    """Replaces worker.apply_stock: orders in `failures` fail with StockUnavailable (count down; -1 = forever)"""
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.original = worker.apply_stock
+        self.failures = {}
+        self.attempts = 0
+        worker.apply_stock = self
+
+    def __call__(self, orders: list) -> int:
+        failing = [order_id for order_id, _, _ in orders if self.failures.get(order_id)]
+        if failing:
+            self.attempts += len(failing)
+            for order_id in failing:
+                if self.failures[order_id] > 0:
+                    self.failures[order_id] -= 1
+            raise self.worker.StockUnavailable(f"simulated Redis failure for {len(failing)} order(s)")
+        return self.original(orders)
+
+
+def wait_for(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def scenarios(worker, stock: FailingStock) -> int:
+    stop = threading.Event()
+    poller = worker.start_retry_poller(worker.process_orders, stop)
+    failures = 0
+
+    def check(name: str, ok: bool, detail: str):
+        nonlocal failures
+        failures += not ok
+        print(f"  {'✅' if ok else '❌'} {name:<10} {detail}")
+
+    max_attempts = worker.RETRY_MAX_ATTEMPTS
+    timeout = 30
+    try:
+        flaky = new_orders(worker, 1)[0]
+        stock.failures[flaky["order_id"]] = 2
+        worker.process_orders([flaky])
+        done = wait_for(lambda: order_status(worker, flaky["order_id"]) == "COMPLETED", timeout)
+        check("flaky", done and not dead_letters(worker, flaky["order_id"]),
+              f"status {order_status(worker, flaky['order_id'])} after 3 attempts, no dead letter")
+
+        down = new_orders(worker, 1)[0]
+        stock.failures[down["order_id"]] = -1
+        worker.process_orders([down])
+        wait_for(lambda: dead_letters(worker, down["order_id"]), timeout)
+        letters = dead_letters(worker, down["order_id"])
+        check("down", order_status(worker, down["order_id"]) == "FAILED" and len(letters) == 1
+              and letters[0][1] == max_attempts + 1,
+              f"status {order_status(worker, down['order_id'])}, dead-lettered after "
+              f"{letters[0][1] if letters else '-'} attempts (expected {max_attempts + 1})")
+
+        bad = new_orders(worker, 1, items=[{"item_id": "apple", "warehouse_id": WAREHOUSE, "quantity": "lots"}])[0]
+        scheduled = worker.retry_scheduler.scheduled
+        worker.process_orders([bad])
+        letters = dead_letters(worker, bad["order_id"])
+        check("bad-order", order_status(worker, bad["order_id"]) == "FAILED" and len(letters) == 1
+              and letters[0][1] == 1 and worker.retry_scheduler.scheduled == scheduled,
+              f"status {order_status(worker, bad['order_id'])}, dead-lettered after "
+              f"{letters[0][1] if letters else '-'} attempt, not retried")
+
+        # Redis is back for the 'down' order
+        stock.failures.pop(down["order_id"])
+        worker.dead_letters_cli(["--replay", str(dead_letters(worker, down["order_id"])[0][0])])
+        worker.process_pending_orders(10)
+        letters = dead_letters(worker, down["order_id"])
+        check("replay", order_status(worker, down["order_id"]) == "COMPLETED" and letters[0][2] is not None,
+              f"status {order_status(worker, down['order_id'])}, dead letter marked replayed")
+    finally:
+        stop.set()
+        if poller:
+            poller.join()
+    return failures
+
+
+def hot_loop(worker, stock: FailingStock, label: str, healthy: int, poison: int, claim_batch: int,
+             timeout: float):
+    # Poison orders are older, so a plain oldest-first claim always picks them first
+    for order in new_orders(worker, poison, age=60):
+        stock.failures[order["order_id"]] = -1
+    good = [order["order_id"] for order in new_orders(worker, healthy)]
+    stock.attempts = 0
+
+    stop = threading.Event()
+    poller = worker.start_retry_poller(worker.process_orders, stop) if worker.retry_scheduler else None
+    start = time.perf_counter()
+    remaining = healthy
+    try:
+        while remaining and time.perf_counter() - start < timeout:
+            worker.process_pending_orders(claim_batch)
+            remaining = query(worker, "SELECT count(*) FROM orders WHERE order_id = ANY(%s) "
+                                      "AND status <> 'COMPLETED'", (good,))[0][0]
+    finally:
+        stop.set()
+        if poller:
+            poller.join()
+    elapsed = time.perf_counter() - start
+
+    completed = healthy - remaining
+    print(f"  {label:<22} {completed / elapsed:>8.1f} healthy orders/s   {completed}/{healthy} in {elapsed:>5.2f}s   "
+          f"poison attempts: {stock.attempts}")
+    stock.failures.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--healthy", type=int, default=1000, help="Good orders in the hot-loop run")
+    parser.add_argument("--poison", type=int, default=10, help="Orders that always fail transiently")
+    parser.add_argument("--claim-batch", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60, help="Give up on a hot-loop run after this long")
+    args = parser.parse_args()
+
+    # Short backoff so the scenarios finish quickly; the hot loop keeps poison orders parked longer
+    os.environ.setdefault("RETRY_BASE_DELAY", "0.05")
+    os.environ.setdefault("RETRY_MAX_DELAY", "0.5")
+    os.environ.setdefault("RETRY_MAX_ATTEMPTS", "3")
+    os.environ.setdefault("RETRY_POLL_INTERVAL", "0.05")
+    worker = load_worker()
+    if worker.retry_scheduler is None:
+        sys.exit("Redis is required (REDIS_HOST / REDIS_PORT)")
+    # The worker logs every failure - keep the report readable
+    worker.logging.getLogger().setLevel(worker.logging.CRITICAL)
+    stock = FailingStock(worker)
+    scheduler = worker.retry_scheduler
+
+    print("=" * 80)
+    print(f"🧪 WORKER RETRIES: backoff {scheduler.base_delay:g}s..{scheduler.max_delay:g}s, "
+          f"{scheduler.max_attempts} retries, then dead letter")
+    print("=" * 80)
+    try:
+        failures = scenarios(worker, stock)
+        cleanup(worker)
+
+        print(f"\nHot loop: {args.healthy} healthy + {args.poison} poison orders, one lane, "
+              f"{args.claim_batch} per claim")
+        worker.retry_scheduler = None
+        hot_loop(worker, stock, "no retry scheduler", args.healthy, args.poison, args.claim_batch, args.timeout)
+        worker.retry_scheduler = scheduler
+        cleanup(worker)
+        scheduler.base_delay, scheduler.max_delay = 1.0, 300.0
+        hot_loop(worker, stock, "retry scheduler", args.healthy, args.poison, args.claim_batch, args.timeout)
+    finally:
+        worker.retry_scheduler = scheduler
+        cleanup(worker)
+
+    if failures:
+        sys.exit(f"{failures} scenario(s) failed")
+
+
+if __name__ == "__main__":
+    main()
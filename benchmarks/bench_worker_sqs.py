@@ -0,0 +1,334 @@
+"""
+Fulfillment Worker SQS Benchmark - batched, parallel consumption
+Drains N order messages from an in-memory SQS stand-in (same call shapes as
+boto3, a fixed latency per API call) with:
+
+  legacy   the old loop: MaxNumberOfMessages=1, orders processed serially,
+           a new DB connection + two UPDATEs + COMMIT per order, one
+           delete_message per order
+  batched  QueueConsumer on the SQS backend: 10 messages per receive
+           (concurrency / 4 parallel long polls), --concurrency batches in
+           parallel, one transaction per batch on a pooled connection, one
+           delete_message_batch per receive
+
+With --lanes the batched consumer also runs partitioned by warehouse (see
+QueueConsumer lanes) on a FIFO stand-in - one message group per warehouse, as
+order-service publishes them - for each --warehouses count, and checks that
+every warehouse's orders were processed in the order they were queued.
+
+By default order processing is simulated (--txn-ms per transaction plus
+--order-ms per order), so no database or AWS account is needed. With --db
+the real process_orders runs against PostgreSQL (DB_* environment) on
+seeded PENDING orders:
+
+  python benchmarks/bench_worker_sqs.py
+  python benchmarks/bench_worker_sqs.py --messages 2000 --concurrency 1 4 8 16 --api-ms 10
+  python benchmarks/bench_worker_sqs.py --db --messages 2000
+  python benchmarks/bench_worker_sqs.py --skip-legacy --concurrency 8 --lanes 8 --warehouses 1 4 16 64
+
+--db writes orders with customer_id 'bench_worker' and deletes them afterwards.
+"""
+
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+
+WORKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fulfillment-worker")
+WORKER_PATH = os.path.join(WORKER_DIR, "main.py")
+QUEUE_URL = "local://orders-queue"
+BENCH_CUSTOMER = "bench_worker"
+ITEMS = [{"item_id": "apple", "quantity": 1}]
+
+
+def load_worker():
+    """Import fulfillment-worker/main.py without SQS (nothing connects until it is used)"""
+    os.environ.setdefault("ENV", "local")
+    os.environ.setdefault("DB_HOST", "localhost")
+    sys.path.insert(0, WORKER_DIR)  # main.py imports its sibling modules
+    spec = importlib.util.spec_from_file_location("fulfillment_worker", WORKER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class LocalQueue:
+    """
+    In-memory SQS stand-in: receive_message / delete_message / delete_message_batch.
+    fifo=True behaves like a FIFO queue with MessageGroupId = warehouse_id: a
+    group's messages are not handed out while earlier ones are still in flight.
+    """
+
+    def __init__(self, api_ms: float, fifo: bool = False):
+        self.latency = api_ms / 1000.0
+        self.fifo = fifo
+        self._group_in_flight = Counter()
+        self.calls = Counter()
+        self._messages = deque()
+        self._in_flight = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self.deleted = 0
+        self.drained = threading.Event()
+        self._total = 0
+
+    def fill(self, orders: list):
+        """orders: (order_id, warehouse_id), queued in this order"""
+        sequence = Counter()
+        for order_id, warehouse_id in orders:
+            sequence[warehouse_id] += 1
+            body = {"order_id": order_id, "customer_id": BENCH_CUSTOMER, "warehouse_id": warehouse_id,
+                    "items": ITEMS, "seq": sequence[warehouse_id]}
+            self._messages.append({"MessageId": str(uuid.uuid4()), "Body": json.dumps(body),
+                                   "Group": warehouse_id})
+        self._total += len(orders)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _available(self) -> bool:
+        if not self.fifo:
+            return bool(self._messages)
+        return any(not self._group_in_flight[message["Group"]] for message in self._messages)
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, **kwargs):
+        time.sleep(self.latency)
+        with self._cond:
+            self.calls["receive_message"] += 1
+            self._cond.wait_for(lambda: self._available() or self._closed, timeout=WaitTimeSeconds)
+            if self.fifo:
+                # Like SQS FIFO: skip groups with messages in flight, and fill the
+                # receive with as many messages of the same group as possible
+                groups = {}
+                for message in self._messages:
+                    if not self._group_in_flight[message["Group"]]:
+                        groups.setdefault(message["Group"], []).append(message)
+                batch = [message for group in groups.values() for message in group][:MaxNumberOfMessages]
+            else:
+                batch = list(itertools.islice(self._messages, MaxNumberOfMessages))
+            for message in batch:
+                self._messages.remove(message)
+                self._group_in_flight[message["Group"]] += 1
+            batch = [dict(message, ReceiptHandle=uuid.uuid4().hex) for message in batch]
+            for message in batch:
+                self._in_flight[message["ReceiptHandle"]] = message
+        return {"Messages": batch} if batch else {}
+
+    def _ack(self, handles):
+        with self._cond:
+            for handle in handles:
+                message = self._in_flight.pop(handle, None)
+                if message is not None:
+                    self.deleted += 1
+                    self._group_in_flight[message["Group"]] -= 1
+            self._cond.notify_all()
+            if self.deleted >= self._total:
+                self.drained.set()
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        time.sleep(self.latency)
+        self.calls["delete_message"] += 1
+        self._ack([ReceiptHandle])
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        time.sleep(self.latency)
+        self.calls["delete_message_batch"] += 1
+        self._ack([entry["ReceiptHandle"] for entry in Entries])
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+
+def legacy_consume(queue, handler, stop: threading.Event):
+    """The loop poll_sqs_forever used to run"""
+    while not stop.is_set():
+        response = queue.receive_message(QueueUrl=QUEUE_URL, MaxNumberOfMessages=1, WaitTimeSeconds=20)
+        messages = response.get("Messages", [])
+        if not messages:
+            time.sleep(2)
+            continue
+        for msg in messages:
+            if handler(json.loads(msg["Body"])):
+                queue.delete_message(QueueUrl=QUEUE_URL, ReceiptHandle=msg["ReceiptHandle"])
+
+
+def legacy_process_order(worker, order_data: dict) -> bool:
+    """The old process_order DB work: new connection, two UPDATEs and a COMMIT per order"""
+    import psycopg2
+
+    conn = psycopg2.connect(host=worker.DB_HOST, port=worker.DB_PORT, database=worker.DB_NAME,
+                            user=worker.DB_USER, password=worker.DB_PASS)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE orders SET status = %s WHERE order_id = %s AND status = %s "
+                        "RETURNING customer_id, warehouse_id", ('PROCESSING', order_data["order_id"], 'PENDING'))
+            if cur.fetchone() is None:
+                conn.rollback()
+                return True
+            cur.execute("UPDATE orders SET status = %s WHERE order_id = %s", ('COMPLETED', order_data["order_id"]))
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+def make_orders(count: int, warehouses: int) -> list:
+    """(order_id, warehouse_id) spread round-robin over `warehouses` warehouses"""
+    return [(str(uuid.uuid4()), f"wh_bench_worker_{i % warehouses}") for i in range(count)]
+
+
+def seed_orders(worker, orders: list) -> list:
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO orders (order_id, customer_id, warehouse_id, status, items, created_at) "
+                "SELECT order_id, %s, warehouse_id, 'PENDING', %s::jsonb, %s "
+                "FROM unnest(%s::text[], %s::text[]) AS o(order_id, warehouse_id)",
+                (BENCH_CUSTOMER, json.dumps(ITEMS), datetime.utcnow(),
+                 [order_id for order_id, _ in orders], [warehouse_id for _, warehouse_id in orders])
+            )
+        conn.commit()
+    return orders
+
+
+class OrderLog:
+    """
+    Wraps a batch handler and records the order each warehouse's orders were
+    handled in, and how often a warehouse was being handled by two batches at once
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self._lock = threading.Lock()
+        self._seen = defaultdict(list)
+        self._active = Counter()
+        self.overlaps = 0
+
+    def __call__(self, orders: list) -> list:
+        warehouses = {order["warehouse_id"] for order in orders}
+        with self._lock:
+            for order in orders:
+                self._seen[order["warehouse_id"]].append(order["seq"])
+            self.overlaps += sum(1 for warehouse_id in warehouses if self._active[warehouse_id])
+            self._active.update(warehouses)
+        try:
+            return self.handler(orders)
+        finally:
+            with self._lock:
+                self._active.subtract(warehouses)
+
+    def out_of_order(self) -> int:
+        """Orders handled before an order queued ahead of them in the same warehouse"""
+        return sum(1 for seqs in self._seen.values() for prev, seq in zip(seqs, seqs[1:]) if seq < prev)
+
+
+def cleanup(worker):
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM orders WHERE customer_id = %s", (BENCH_CUSTOMER,))
+        conn.commit()
+
+
+def run(label: str, consume, queue: LocalQueue, orders: list, on_stop=None, order_log=None):
+    stop = threading.Event()
+    queue.fill(orders)
+    consumer = threading.Thread(target=consume, args=(stop,), daemon=True)
+    start = time.perf_counter()
+    consumer.start()
+    queue.drained.wait()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    queue.close()
+    if on_stop:
+        on_stop()
+    consumer.join(timeout=30)
+
+    calls = ", ".join(f"{name}={count}" for name, count in sorted(queue.calls.items()))
+    ordering = (f"   out of order: {order_log.out_of_order()}, overlapping: {order_log.overlaps}"
+                if order_log else "")
+    print(f"  {label:<24} {len(orders) / elapsed:>8.1f} orders/s   {elapsed:>7.2f}s   API calls: {calls}{ordering}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500, help="Orders in the queue per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--txn-ms", type=float, default=20, help="Simulated cost per DB transaction")
+    parser.add_argument("--order-ms", type=float, default=1, help="Simulated cost per order in a transaction")
+    parser.add_argument("--api-ms", type=float, default=10, help="Simulated latency per SQS API call")
+    parser.add_argument("--db", action="store_true", help="Process orders against PostgreSQL instead")
+    parser.add_argument("--skip-legacy", action="store_true")
+    parser.add_argument("--lanes", type=int, nargs="*", default=[], help="Also run partitioned with N lanes")
+    parser.add_argument("--warehouses", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="Warehouses the orders are spread over in the partitioned runs")
+    args = parser.parse_args()
+
+    # The worker sizes its connection pool from WORKER_CONCURRENCY / WORKER_LANES
+    os.environ["WORKER_CONCURRENCY"] = str(max(args.concurrency))
+    os.environ["WORKER_LANES"] = str(max(args.lanes, default=0))
+    worker = load_worker()
+    # Stock / cache side effects are not what is being measured
+    worker.redis_client = None
+
+    if args.db:
+        legacy_handler = lambda order: legacy_process_order(worker, order)  # noqa: E731
+        batch_handler = worker.process_orders
+        new_orders = lambda warehouses=1: seed_orders(worker, make_orders(args.messages, warehouses))  # noqa: E731
+    else:
+        def legacy_handler(order):
+            time.sleep((args.txn_ms + args.order_ms) / 1000.0)
+            return True
+
+        def batch_handler(orders):
+            time.sleep((args.txn_ms + args.order_ms * len(orders)) / 1000.0)
+            return [True] * len(orders)
+
+        new_orders = lambda warehouses=1: make_orders(args.messages, warehouses)  # noqa: E731
+
+    print("=" * 80)
+    print(f"🧪 WORKER SQS CONSUMPTION: {args.messages} orders, {args.api_ms:g}ms per SQS call, " +
+          ("PostgreSQL" if args.db else f"simulated {args.txn_ms:g}ms/transaction + {args.order_ms:g}ms/order"))
+    print("=" * 80)
+
+    # The worker logs every order - keep the report readable
+    worker.logging.getLogger().setLevel(worker.logging.WARNING)
+    try:
+        if not args.skip_legacy:
+            queue = LocalQueue(args.api_ms)
+            run("legacy (1, serial)", lambda stop: legacy_consume(queue, legacy_handler, stop), queue, new_orders())
+
+        for concurrency in args.concurrency:
+            queue = LocalQueue(args.api_ms)
+            consumer = worker.QueueConsumer(worker.SqsQueue(queue, QUEUE_URL), batch_handler,
+                                            concurrency=concurrency, max_messages=10, wait_seconds=20,
+                                            receivers=max(1, concurrency // 4))
+            run(f"batched x{concurrency}", consumer.run, queue, new_orders(), on_stop=consumer.wake)
+
+        # Standard and FIFO (one message group per warehouse) queue: unpartitioned vs warehouse lanes
+        for lanes in args.lanes:
+            concurrency = max(args.concurrency)
+            print(f"\nx{concurrency} batches in flight, {lanes} lanes vs unpartitioned:")
+            for warehouses, fifo, consumer_lanes in itertools.product(args.warehouses, (False, True), (0, lanes)):
+                label = f"{warehouses} wh, {'fifo' if fifo else 'std'}, {'lanes' if consumer_lanes else 'no lanes'}"
+                queue = LocalQueue(args.api_ms, fifo=fifo)
+                order_log = OrderLog(batch_handler)
+                consumer = worker.QueueConsumer(worker.SqsQueue(queue, QUEUE_URL), order_log,
+                                                concurrency=concurrency, max_messages=10, wait_seconds=20,
+                                                receivers=max(1, concurrency // 4), lanes=consumer_lanes)
+                run(label, consumer.run, queue, new_orders(warehouses), on_stop=consumer.wake,
+                    order_log=order_log)
+    finally:
+        if args.db:
+            cleanup(worker)
+
+
+if __name__ == "__main__":
+    main()
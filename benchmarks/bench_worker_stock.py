@@ -0,0 +1,311 @@
+"""
+Fulfillment Worker Stock Benchmark - exactly-once stock decrement per order
+Runs the worker's real order processing (fulfillment-worker/main.py) against
+PostgreSQL and Redis (DB_* / REDIS_* environment) through crashes and
+redeliveries, and checks that every order takes its stock exactly once:
+
+  once            order delivered once
+  redelivered     delivered again after it completed (ack lost)
+  crash-batch     worker dies after the stock decrement, before COMMIT, then
+                  the message is redelivered (batched path)
+  crash-single    same on the one-order-at-a-time fallback path
+  crash-commit    worker dies right after COMMIT, before the message is acked
+                  (the old worker only touched stock at this point)
+  parallel        the same message handled by --threads workers at once
+  failed          the order fails after its stock was taken - stock is given back
+  redis-down      Redis unreachable - the order stays PENDING and is parked for a
+                  retry, then retried
+
+Then the old read-modify-write (GET then SET per item) and the script are
+raced from --threads threads on one stock key to show the lost updates:
+
+  python benchmarks/bench_worker_stock.py
+  python benchmarks/bench_worker_stock.py --threads 16 --race-orders 2000
+
+Orders are written with customer_id 'bench_worker_stock' and deleted
+afterwards; stock keys live under the 'wh_bench_stock' warehouse.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+WORKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fulfillment-worker")
+WORKER_PATH = os.path.join(WORKER_DIR, "main.py")
+BENCH_CUSTOMER = "bench_worker_stock"
+WAREHOUSE = "wh_bench_stock"
+ITEMS = [
+    {"item_id": "apple", "warehouse_id": WAREHOUSE, "quantity": 2},
+    {"item_id": "milk", "warehouse_id": WAREHOUSE, "quantity": 1},
+]
+INITIAL_STOCK = 1000
+
+
+class Crash(BaseException):
+    """Simulated process death - not an Exception, so no handler in the worker catches it"""
+
+
+def load_worker():
+    """Import fulfillment-worker/main.py without SQS (nothing connects until it is used)"""
+    os.environ.setdefault("ENV", "local")
+    os.environ.setdefault("DB_HOST", "localhost")
+    sys.path.insert(0, WORKER_DIR)  # main.py imports its sibling modules
+    spec = importlib.util.spec_from_file_location("fulfillment_worker", WORKER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def stock_keys(worker) -> list:
+    return [worker.STOCK_KEY.format(warehouse_id=WAREHOUSE, item_id=item["item_id"]) for item in ITEMS]
+
+
+def reset_stock(worker):
+    for key in stock_keys(worker):
+        worker.redis_client.set(key, INITIAL_STOCK)
+
+
+def stock_taken(worker) -> list:
+    return [INITIAL_STOCK - int(worker.redis_client.get(key)) for key in stock_keys(worker)]
+
+
+def new_order(worker) -> dict:
+    order = {"order_id": str(uuid.uuid4()), "customer_id": BENCH_CUSTOMER, "warehouse_id": WAREHOUSE,
+             "items": ITEMS}
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO orders (order_id, customer_id, warehouse_id, status, items, created_at) "
+                "VALUES (%s, %s, %s, 'PENDING', %s, %s)",
+                (order["order_id"], BENCH_CUSTOMER, WAREHOUSE, json.dumps(ITEMS), datetime.utcnow())
+            )
+        conn.commit()
+    return order
+
+
+def order_status(worker, order_id: str) -> str:
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT status FROM orders WHERE order_id = %s", (order_id,))
+            status = cur.fetchone()[0]
+        conn.rollback()
+    return status
+
+
+def cleanup(worker):
+    with worker.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT order_id FROM orders WHERE customer_id = %s", (BENCH_CUSTOMER,))
+            order_ids = [row[0] for row in cur.fetchall()]
+            markers = [worker.STOCK_APPLIED_KEY.format(order_id=order_id) for order_id in order_ids]
+            cur.execute("DELETE FROM order_dead_letters WHERE order_id = ANY(%s)", (order_ids,))
+            cur.execute("DELETE FROM orders WHERE customer_id = %s", (BENCH_CUSTOMER,))
+        conn.commit()
+    if markers:
+        worker.redis_client.delete(*markers)
+    worker.redis_client.delete(*stock_keys(worker))
+
+
+def crash_once(worker, name: str):
+    """Make worker.<name> die the first time it is called"""
+    original = getattr(worker, name)
+
+    def crashing(*args, **kwargs):
+        setattr(worker, name, original)
+        raise Crash()
+
+    setattr(worker, name, crashing)
+    return original
+
+
+def deliver(handler, order):
+    try:
+        return handler(order)
+    except Crash:
+        return "crashed"
+
+
+# --- scenarios: each returns (expected stock taken per item, expected final status) ---
+
+def once(worker, order):
+    worker.process_orders([order])
+    return [2, 1], "COMPLETED"
+
+
+def redelivered(worker, order):
+    worker.process_orders([order])
+    worker.process_orders([order])
+    worker.process_order(order)
+    return [2, 1], "COMPLETED"
+
+
+def crash_batch(worker, order):
+    # apply_stock runs just before complete_claimed - die in between
+    crash_once(worker, "complete_claimed")
+    assert deliver(lambda o: worker.process_orders([o]), order) == "crashed"
+    worker.process_orders([order])
+    return [2, 1], "COMPLETED"
+
+
+def crash_single(worker, order):
+    original = worker.notify_order_status
+
+    def crash_on_completed(cur, order_id, customer_id, warehouse_id, status):
+        if status == "COMPLETED":
+            worker.notify_order_status = original
+            raise Crash()
+        return original(cur, order_id, customer_id, warehouse_id, status)
+
+    worker.notify_order_status = crash_on_completed
+    assert deliver(worker.process_order, order) == "crashed"
+    worker.process_order(order)
+    return [2, 1], "COMPLETED"
+
+
+def crash_commit(worker, order):
+    crash_once(worker, "apply_completed")
+    assert deliver(lambda o: worker.process_orders([o]), order) == "crashed"
+    worker.process_orders([order])
+    return [2, 1], "COMPLETED"
+
+
+def parallel(worker, order, threads: int):
+    barrier = threading.Barrier(threads)
+
+    def handle():
+        barrier.wait()
+        return worker.process_orders([order])
+
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(lambda _: handle(), range(threads)))
+    return [2, 1], "COMPLETED"
+
+
+def failed(worker, order):
+    original = worker.notify_order_status
+
+    def fail_on_completed(cur, order_id, customer_id, warehouse_id, status):
+        if status == "COMPLETED":
+            raise RuntimeError("simulated failure after the stock decrement")
+        return original(cur, order_id, customer_id, warehouse_id, status)
+
+    worker.notify_order_status = fail_on_completed
+    try:
+        worker.process_order(order)
+    finally:
+        worker.notify_order_status = original
+    worker.process_orders([order])
+    return [0, 0], "FAILED"
+
+
+def redis_down(worker, order):
+    import redis
+
+    client = worker.redis_client
+    worker.redis_client = redis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.5)
+    try:
+        # Acknowledged: parked on the retry set (a separate connection), not completed
+        result = worker.process_orders([order])
+        assert result == [True], result
+        assert order_status(worker, order["order_id"]) == "PENDING"
+    finally:
+        worker.redis_client = client
+    due = [(member, retry) for member, retry in worker.retry_scheduler.lease_due(100, 60)
+           if retry["order_id"] == order["order_id"]]
+    assert len(due) == 1, due
+    worker.process_orders([retry for _, retry in due])
+    worker.retry_scheduler.finish([member for member, _ in due])
+    return [2, 1], "COMPLETED"
+
+
+def legacy_update_redis_stock(redis_client, warehouse_id: str, item_id: str, quantity: int):
+    """The old update_redis_stock: GET then SET"""
+    key = f"{warehouse_id}:{item_id}"
+    current = redis_client.get(key)
+    if current:
+        redis_client.set(key, max(0, int(current) - quantity))
+
+
+def race(worker, orders: int, threads: int):
+    def legacy(i):
+        for item in ITEMS:
+            legacy_update_redis_stock(worker.redis_client, WAREHOUSE, item["item_id"], item["quantity"])
+
+    def script(i):
+        worker.apply_stock([(f"bench-race-{run_id}-{i}", WAREHOUSE, ITEMS)])
+
+    run_id = uuid.uuid4().hex
+    expected = [item["quantity"] * orders for item in ITEMS]
+    for label, apply in (("GET + SET (old)", legacy), ("apply script", script)):
+        for key in stock_keys(worker):
+            worker.redis_client.set(key, orders * 10)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(apply, range(orders)))
+        elapsed = time.perf_counter() - start
+        taken = [orders * 10 - int(worker.redis_client.get(key)) for key in stock_keys(worker)]
+        lost = sum(expected) - sum(taken)
+        print(f"  {label:<16} {orders / elapsed:>8.1f} orders/s   taken {taken} of {expected}   "
+              f"{'✅' if lost == 0 else '❌'} {lost} decrement(s) lost")
+    worker.redis_client.delete(*[worker.STOCK_APPLIED_KEY.format(order_id=f"bench-race-{run_id}-{i}")
+                                 for i in range(orders)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent deliveries / racing threads")
+    parser.add_argument("--race-orders", type=int, default=1000, help="Orders applied in the race")
+    args = parser.parse_args()
+
+    os.environ["WORKER_CONCURRENCY"] = str(args.threads)
+    os.environ["RETRY_BASE_DELAY"] = "0"
+    worker = load_worker()
+    if worker.redis_client is None:
+        sys.exit("Redis is required (REDIS_HOST / REDIS_PORT)")
+    # The worker logs every order and every simulated failure - keep the report readable
+    worker.logging.getLogger().setLevel(worker.logging.CRITICAL)
+
+    scenarios = [
+        ("once", once),
+        ("redelivered", redelivered),
+        ("crash-batch", crash_batch),
+        ("crash-single", crash_single),
+        ("crash-commit", crash_commit),
+        (f"parallel x{args.threads}", lambda w, o: parallel(w, o, args.threads)),
+        ("failed", failed),
+        ("redis-down", redis_down),
+    ]
+
+    print("=" * 80)
+    print("🧪 WORKER STOCK: exactly one decrement per order through crashes and redeliveries")
+    print("=" * 80)
+    failures = 0
+    try:
+        for name, scenario in scenarios:
+            reset_stock(worker)
+            order = new_order(worker)
+            expected, expected_status = scenario(worker, order)
+            taken, status = stock_taken(worker), order_status(worker, order["order_id"])
+            ok = taken == expected and status == expected_status
+            failures += not ok
+            print(f"  {'✅' if ok else '❌'} {name:<14} stock taken {taken} (expected {expected})   "
+                  f"status {status} (expected {expected_status})")
+
+        print(f"\nRace: {args.race_orders} orders from {args.threads} threads on the same stock keys")
+        race(worker, args.race_orders, args.threads)
+    finally:
+        cleanup(worker)
+
+    if failures:
+        sys.exit(f"{failures} scenario(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Fulfillment Worker Supervisor Benchmark - one container, several worker processes
+Runs fulfillment-worker/supervisor.py (QUEUE_BACKEND=table, so only PostgreSQL
+is needed) and checks what it promises:
+
+  drain     for each --processes count, --orders PENDING orders are placed at
+            once and timed until every one is COMPLETED (duplicates counted
+            from the COMPLETED notifications, as in bench_worker_local.py)
+  restart   a worker process is SIGKILLed --kills times in a row: it must come
+            back each time, after a backoff that doubles, while the orders
+            placed meanwhile are still completed exactly once
+  metrics   the supervisor's /metrics adds its processes up: processes alive,
+            restarts, one latency observation per completed order
+  shutdown  SIGTERM to the supervisor: every process drains and it exits 0
+
+  python benchmarks/bench_worker_supervisor.py
+  python benchmarks/bench_worker_supervisor.py --orders 20000 --processes 1 2 4 8
+
+Redis is disabled in the workers (REDIS_HOST points nowhere) as in
+bench_worker_local.py, whose helpers this reuses - orders are written with
+customer_id 'bench_worker_local' and deleted afterwards. Stop any other local
+worker first.
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SUPERVISOR_PATH = os.path.join(BENCH_DIR, "..", "fulfillment-worker", "supervisor.py")
+sys.path.insert(0, BENCH_DIR)
+
+from bench_worker_local import CompletionListener, cleanup, connect, seed_orders  # noqa: E402
+
+
+def start_supervisor(processes: int, port: int, claim_batch: int, base_delay: float) -> subprocess.Popen:
+    env = dict(os.environ, ENV="local", QUEUE_BACKEND="table", LOCAL_CLAIM_BATCH=str(claim_batch),
+               REDIS_HOST="127.0.0.1", REDIS_PORT="1", WORKER_CONCURRENCY="1", WORKER_LANES="0",
+               WORKER_PROCESSES=str(processes), WORKER_METRICS_PORT=str(port),
+               WORKER_METRICS_CACHE_SECONDS="0", WORKER_RESTART_BASE_DELAY=str(base_delay),
+               WORKER_DRAIN_TIMEOUT="10")
+    return subprocess.Popen([sys.executable, SUPERVISOR_PATH], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stats(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def wait_until(predicate, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if predicate():
+                return True
+        except OSError:
+            pass  # metrics not up yet
+        time.sleep(0.05)
+    return False
+
+
+def all_reporting(port: int, processes: int) -> bool:
+    return stats(port)["supervisor"]["reporting"] == processes
+
+
+def drain(conn, processes: int, orders: int, port: int, claim_batch: int) -> bool:
+    listener = CompletionListener()
+    supervisor = start_supervisor(processes, port, claim_batch, base_delay=1)
+    try:
+        if not wait_until(lambda: all_reporting(port, processes), 30):
+            print(f"  ❌ x{processes:<3} workers did not come up")
+            return False
+        start = time.perf_counter()
+        order_ids = seed_orders(conn, orders, warehouses=16, notify=True)
+        if not listener.wait_for(order_ids, timeout=300):
+            print(f"  ❌ x{processes:<3} timed out, {len(listener.completed_at)}/{orders} completed")
+            return False
+        elapsed = max(listener.completed_at.values()) - start
+        duplicates = sum(1 for order_id in order_ids if listener.completed[order_id] > 1)
+        # Every process's share shows up in the supervisor's histogram
+        counted = wait_until(lambda: stats(port)["order_latency_seconds"]["count"] == orders, 10)
+        busy = stats(port)["slots"].get("lane", {}).get("slot_busy_seconds", [])
+        ok = duplicates == 0 and counted
+        print(f"  {'✅' if ok else '❌'} x{processes:<3} {orders / elapsed:>8.1f} orders/s   {elapsed:>6.2f}s   "
+              f"duplicates {duplicates}   busy seconds per process {[round(seconds, 1) for seconds in busy]}")
+        return ok
+    finally:
+        supervisor.send_signal(signal.SIGTERM)
+        supervisor.wait(timeout=60)
+        listener.close()
+        cleanup(conn)
+
+
+def restart_and_shutdown(conn, kills: int, orders: int, port: int, claim_batch: int, base_delay: float) -> int:
+    listener = CompletionListener()
+    supervisor = start_supervisor(2, port, claim_batch, base_delay)
+    failures = 0
+    try:
+        wait_until(lambda: all_reporting(port, 2), 30)
+        order_ids = seed_orders(conn, orders, warehouses=16, notify=True)
+        downtimes, backoffs = [], []
+        for _ in range(kills):
+            pid = stats(port)["processes"][0]["pid"]
+            os.kill(pid, signal.SIGKILL)
+            killed = time.perf_counter()
+            wait_until(lambda: stats(port)["processes"][0]["pid"] not in (pid, None)
+                       and stats(port)["processes"][0]["alive"], 120)
+            downtimes.append(time.perf_counter() - killed)
+            backoffs.append(stats(port)["processes"][0]["backoff_seconds"])
+        more = seed_orders(conn, orders, warehouses=16, notify=True)
+        done = listener.wait_for(order_ids + more, timeout=300)
+        duplicates = sum(1 for order_id in order_ids + more if listener.completed[order_id] > 1)
+        # Each crash came within WORKER_RESTART_RESET of the last start, so the backoff doubles
+        doubling = all(later == earlier * 2 for earlier, later in zip(backoffs, backoffs[1:]))
+        ok = done and duplicates == 0 and doubling
+        failures += not ok
+        print(f"  {'✅' if ok else '❌'} restart   worker 0 killed {kills}x, backoff "
+              f"{', '.join(f'{seconds:g}s' for seconds in backoffs)}, back up after "
+              f"{', '.join(f'{seconds:.1f}s' for seconds in downtimes)}; "
+              f"{len(listener.completed_at)}/{2 * orders} orders completed, duplicates {duplicates}")
+
+        wait_until(lambda: stats(port)["order_latency_seconds"]["count"] > 0, 10)
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            text = response.read().decode()
+        expected = [f'worker_processes{{state="alive"}} 2', f"worker_process_restarts_total {kills}"]
+        ok = all(line in text for line in expected)
+        failures += not ok
+        print(f"  {'✅' if ok else '❌'} metrics   {', '.join(expected)} "
+              f"(orders completed by the killed processes are lost with their histograms)")
+
+        started = time.perf_counter()
+        supervisor.send_signal(signal.SIGTERM)
+        code = supervisor.wait(timeout=60)
+        ok = code == 0
+        failures += not ok
+        print(f"  {'✅' if ok else '❌'} shutdown  SIGTERM -> exit {code} in {time.perf_counter() - started:.2f}s")
+    finally:
+        if supervisor.poll() is None:
+            supervisor.kill()
+        listener.close()
+        cleanup(conn)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--claim-batch", type=int, default=10)
+    parser.add_argument("--kills", type=int, default=3)
+    parser.add_argument("--base-delay", type=float, default=0.5, help="WORKER_RESTART_BASE_DELAY")
+    parser.add_argument("--port", type=int, default=19200)
+    args = parser.parse_args()
+
+    conn = connect()
+    cleanup(conn)
+    print("=" * 80)
+    print(f"🧪 WORKER SUPERVISOR: table mode, {os.cpu_count()} CPU(s) here, claim batch {args.claim_batch}")
+    print("=" * 80)
+    failures = 0
+    for processes in args.processes:
+        failures += not drain(conn, processes, args.orders, args.port, args.claim_batch)
+    failures += restart_and_shutdown(conn, args.kills, 500, args.port, args.claim_batch, args.base_delay)
+    conn.close()
+    if failures:
+        sys.exit(f"{failures} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Postgres <-> Redis inventory reconciliation.
+
+Redis holds the live stock ("{warehouse_id}:{item_id}" -> int, written by
+availability-service and the worker); the Postgres inventory table follows it
+through the write-behind (stock_write_behind.py), so whatever that misses - a
+Redis failover before a flush, keys written by anything else - drifts. A run
+compares the two warehouse by warehouse instead of row by row:
+
+  1. checksums   one GROUP BY over inventory, one SCAN + MGET pass over Redis:
+                 (rows, sum of md5("{item_id}:{stock}")) per warehouse on each
+                 side - order independent, so a SCAN's random order is fine
+  2. diff        only warehouses whose checksums differ are read item by item:
+                 their Postgres rows, and the same keys MGET from Redis. A
+                 warehouse with more Redis keys than that (items never written
+                 to Postgres) is read with one more SCAN per group of
+                 warehouses, groups capped at `max_rows` rows in memory
+  3. repair      the differences are written to the stale side in batches:
+                 multi-row upserts / deletes in Postgres (source redis), or
+                 pipelined compare-and-set scripts in Redis (source postgres),
+                 which skip keys that changed since they were read
+
+Redis load is bounded: `scan_count` keys per SCAN, one SCAN in flight, at most
+`max_keys_per_second` keys examined, and diff reads / repairs sent PIPELINE_DEPTH
+batches of `batch_size` keys per round trip. A warehouse missing entirely from
+the source side is reported and left alone - restoring a flushed Redis is a
+`source="postgres"` run, never a delete of the whole warehouse.
+"""
+
+import hashlib
+import logging
+import time
+from collections import defaultdict
+
+from psycopg2.extras import execute_values
+
+CHECKSUM_MOD = 2 ** 64
+
+# Batches (MGETs / compare-and-set scripts of batch_size keys) sent per pipeline round trip
+PIPELINE_DEPTH = 10
+
+# Same hash as row_hash(): the first 60 bits of md5("{item_id}:{stock}")
+POSTGRES_CHECKSUMS_SQL = """
+    SELECT warehouse_id, count(*),
+           sum(('x' || substr(md5(item_id || ':' || coalesce(stock, 0)), 1, 15))::bit(60)::bigint)
+    FROM inventory
+    WHERE warehouse_id LIKE %s
+    GROUP BY warehouse_id
+"""
+
+UPSERT_SQL = """
+    INSERT INTO inventory (warehouse_id, item_id, stock) VALUES %s
+    ON CONFLICT (warehouse_id, item_id) DO UPDATE SET stock = EXCLUDED.stock
+"""
+
+DELETE_SQL = """
+    DELETE FROM inventory
+    WHERE (warehouse_id, item_id) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+"""
+
+# KEYS: stock keys. ARGV: expected value then new value per key ('' = missing / delete).
+# Writes a key only if it still holds what the diff read; returns the number written.
+COMPARE_AND_SET_SCRIPT = """
+local written = 0
+for i, key in ipairs(KEYS) do
+    local current = redis.call('GET', key) or ''
+    if current == ARGV[2 * i - 1] then
+        local value = ARGV[2 * i]
+        if value == '' then redis.call('DEL', key) else redis.call('SET', key, value) end
+        written = written + 1
+    end
+end
+return written
+"""
+
+
+def row_hash(item_id: str, stock: int) -> int:
+    return int(hashlib.md5(f"{item_id}:{stock}".encode()).hexdigest()[:15], 16)
+
+
+def glob_to_like(pattern: str) -> str:
+    """A Redis glob over warehouse ids (only * and ?) as a LIKE pattern"""
+    escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped.replace("*", "%").replace("?", "_")
+
+
+def parse_stock(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class InventoryReconciler:
+    def __init__(self, redis_client, db_connection, warehouse_pattern: str = "wh_*", scan_count: int = 1000,
+                 max_keys_per_second: float = 0, batch_size: int = 1000, max_rows: int = 1_000_000):
+        """db_connection: a context manager giving a Postgres connection (main.db_connection)"""
+        self.redis = redis_client
+        self.db_connection = db_connection
+        self.warehouse_pattern = warehouse_pattern
+        self.scan_count = scan_count
+        self.max_keys_per_second = max_keys_per_second
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self._compare_and_set = redis_client.register_script(COMPARE_AND_SET_SCRIPT)
+        self.keys_scanned = 0
+
+    # --- Checksums -------------------------------------------------------
+
+    def postgres_checksums(self) -> dict:
+        """{warehouse_id: (rows, checksum)} for the warehouses matching the pattern"""
+        with self.db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(POSTGRES_CHECKSUMS_SQL, (glob_to_like(self.warehouse_pattern),))
+                rows = cur.fetchall()
+            conn.rollback()
+        return {warehouse_id: (count, int(total) % CHECKSUM_MOD) for warehouse_id, count, total in rows}
+
+    def _scan(self, warehouses: set = None):
+        """(warehouse_id, item_id, stock) for every stock key in Redis (of `warehouses` only, if given)"""
+        started, examined, cursor = time.monotonic(), 0, 0
+        while True:
+            cursor, keys = self.redis.scan(cursor, match=f"{self.warehouse_pattern}:*",
+                                           count=self.scan_count, _type="string")
+            examined += self.scan_count
+            if warehouses is not None:
+                keys = [key for key in keys if key.partition(":")[0] in warehouses]
+            if keys:
+                self.keys_scanned += len(keys)
+                for key, value in zip(keys, self.redis.mget(keys)):
+                    warehouse_id, _, item_id = key.partition(":")
+                    stock = parse_stock(value)
+                    if ":" not in item_id and stock is not None:
+                        yield warehouse_id, item_id, stock
+            if cursor == 0:
+                return
+            if self.max_keys_per_second:
+                ahead = examined / self.max_keys_per_second - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    def redis_checksums(self) -> dict:
+        counts, sums = defaultdict(int), defaultdict(int)
+        for warehouse_id, item_id, stock in self._scan():
+            counts[warehouse_id] += 1
+            sums[warehouse_id] += row_hash(item_id, stock)
+        return {warehouse_id: (counts[warehouse_id], sums[warehouse_id] % CHECKSUM_MOD) for warehouse_id in counts}
+
+    # --- Diff ------------------------------------------------------------
+
+    def _postgres_rows(self, warehouses: list) -> dict:
+        rows = defaultdict(dict)
+        with self.db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT warehouse_id, item_id, coalesce(stock, 0) FROM inventory "
+                            "WHERE warehouse_id = ANY(%s)", (list(warehouses),))
+                for warehouse_id, item_id, stock in cur.fetchall():
+                    rows[warehouse_id][item_id] = stock
+            conn.rollback()
+        return rows
+
+    def _redis_rows(self, postgres_rows: dict) -> dict:
+        """The Redis values of the keys Postgres has, MGET `batch_size` keys at a time in one pipeline"""
+        keys = [(warehouse_id, item_id) for warehouse_id, items in postgres_rows.items() for item_id in items]
+        values = []
+        for start in range(0, len(keys), self.batch_size * PIPELINE_DEPTH):
+            pipe = self.redis.pipeline(transaction=False)
+            for batch_start in range(start, min(len(keys), start + self.batch_size * PIPELINE_DEPTH), self.batch_size):
+                pipe.mget([f"{warehouse_id}:{item_id}"
+                           for warehouse_id, item_id in keys[batch_start:batch_start + self.batch_size]])
+            values += [value for batch in pipe.execute() for value in batch]
+        rows = defaultdict(dict)
+        for (warehouse_id, item_id), value in zip(keys, values):
+            stock = parse_stock(value)
+            if stock is not None:
+                rows[warehouse_id][item_id] = stock
+        return rows
+
+    @staticmethod
+    def _differences(warehouses, postgres_rows: dict, redis_rows: dict) -> list:
+        """(warehouse_id, item_id, postgres stock, redis stock) - None where the side has no row"""
+        differences = []
+        for warehouse_id in warehouses:
+            postgres_items = postgres_rows.get(warehouse_id, {})
+            redis_items = redis_rows.get(warehouse_id, {})
+            for item_id in postgres_items.keys() | redis_items.keys():
+                postgres_stock, redis_stock = postgres_items.get(item_id), redis_items.get(item_id)
+                if postgres_stock != redis_stock:
+                    differences.append((warehouse_id, item_id, postgres_stock, redis_stock))
+        return differences
+
+    # --- Repair ----------------------------------------------------------
+
+    def _repair_postgres(self, differences: list) -> int:
+        upserts = [(warehouse_id, item_id, redis_stock)
+                   for warehouse_id, item_id, _, redis_stock in differences if redis_stock is not None]
+        deletes = [(warehouse_id, item_id)
+                   for warehouse_id, item_id, _, redis_stock in differences if redis_stock is None]
+        with self.db_connection() as conn:
+            with conn.cursor() as cur:
+                for start in range(0, len(upserts), self.batch_size):
+                    execute_values(cur, UPSERT_SQL, upserts[start:start + self.batch_size], page_size=self.batch_size)
+                    conn.commit()
+                for start in range(0, len(deletes), self.batch_size):
+                    batch = deletes[start:start + self.batch_size]
+                    cur.execute(DELETE_SQL, ([row[0] for row in batch], [row[1] for row in batch]))
+                    conn.commit()
+        return len(upserts) + len(deletes)
+
+    def _repair_redis(self, differences: list) -> int:
+        written = 0
+        for start in range(0, len(differences), self.batch_size * PIPELINE_DEPTH):
+            pipe = self.redis.pipeline(transaction=False)
+            for batch_start in range(start, min(len(differences), start + self.batch_size * PIPELINE_DEPTH),
+                                     self.batch_size):
+                batch = differences[batch_start:batch_start + self.batch_size]
+                args = []
+                for _, _, postgres_stock, redis_stock in batch:
+                    args += ["" if redis_stock is None else str(redis_stock),
+                             "" if postgres_stock is None else str(postgres_stock)]
+                self._compare_and_set(keys=[f"{warehouse_id}:{item_id}" for warehouse_id, item_id, _, _ in batch],
+                                      args=args, client=pipe)
+            written += sum(pipe.execute())
+        return written
+
+    # --- Run -------------------------------------------------------------
+
+    def run(self, source: str = "redis", dry_run: bool = False) -> dict:
+        """Make the other side match `source` ("redis" or "postgres") where the checksums differ"""
+        if source not in ("redis", "postgres"):
+            raise ValueError(f"Unknown source: {source}")
+        started = time.monotonic()
+        self.keys_scanned = 0
+        postgres = self.postgres_checksums()
+        redis_sums = self.redis_checksums()
+        checksum_seconds = time.monotonic() - started
+        mismatched = sorted(warehouse_id for warehouse_id in postgres.keys() | redis_sums.keys()
+                            if postgres.get(warehouse_id) != redis_sums.get(warehouse_id))
+        # The source side has none of these warehouses' rows - never empty a whole warehouse
+        source_sums = redis_sums if source == "redis" else postgres
+        skipped = [warehouse_id for warehouse_id in mismatched if warehouse_id not in source_sums]
+        if skipped:
+            logging.warning(f"{len(skipped)} warehouse(s) have no rows in {source}, left alone: {skipped[:10]}")
+        to_diff = [warehouse_id for warehouse_id in mismatched if warehouse_id in source_sums]
+        logging.info(f"Checksums: {len(postgres)} warehouse(s) in Postgres, {len(redis_sums)} in Redis, "
+                     f"{len(mismatched)} differ ({checksum_seconds:.1f}s)")
+
+        differences, unlisted = [], []
+
+        # Keys Postgres knows, warehouse by warehouse; warehouses with extra Redis keys wait for a scan
+        chunk = max(1, self.max_rows // max(1, max((count for count, _ in postgres.values()), default=1)))
+        for start in range(0, len(to_diff), chunk):
+            warehouses = to_diff[start:start + chunk]
+            postgres_rows = self._postgres_rows(warehouses)
+            redis_rows = self._redis_rows(postgres_rows)
+            listed = []
+            for warehouse_id in warehouses:
+                if redis_sums.get(warehouse_id, (0, 0))[0] > len(redis_rows.get(warehouse_id, {})):
+                    unlisted.append(warehouse_id)
+                else:
+                    listed.append(warehouse_id)
+            differences += self._differences(listed, postgres_rows, redis_rows)
+
+        # Those read in full, as few SCANs as fit in max_rows
+        groups, group, group_rows = [], [], 0
+        for warehouse_id in unlisted:
+            rows = redis_sums[warehouse_id][0]
+            if group and group_rows + rows > self.max_rows:
+                groups.append(group)
+                group, group_rows = [], 0
+            group.append(warehouse_id)
+            group_rows += rows
+        if group:
+            groups.append(group)
+        for group in groups:
+            redis_rows = defaultdict(dict)
+            for warehouse_id, item_id, stock in self._scan(set(group)):
+                redis_rows[warehouse_id][item_id] = stock
+            differences += self._differences(group, self._postgres_rows(group), redis_rows)
+
+        repaired = 0
+        if differences and not dry_run:
+            repaired = self._repair_postgres(differences) if source == "redis" else self._repair_redis(differences)
+        return {
+            "source": source,
+            "dry_run": dry_run,
+            "warehouses": len(postgres.keys() | redis_sums.keys()),
+            "mismatched_warehouses": len(mismatched),
+            "skipped_warehouses": len(skipped),
+            "extra_scans": len(groups),
+            "keys_scanned": self.keys_scanned,
+            "differences": len(differences),
+            "repaired": repaired,
+            # source postgres: keys that changed in Redis after the diff read them
+            "changed_meanwhile": len(differences) - repaired if source == "postgres" and not dry_run else 0,
+            "checksum_seconds": round(checksum_seconds, 2),
+            "seconds": round(time.monotonic() - started, 2),
+        }
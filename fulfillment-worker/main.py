@@ -1,13 +1,36 @@
 import os
+import sys
 import json
 import time
+import hashlib
+import select
+import signal
+import socket
+import threading
 import psycopg2
+import psycopg2.errors
+import psycopg2.pool
 import redis
 import logging
+import argparse
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime
+
+from inventory_reconcile import InventoryReconciler
+from order_queue import MemoryQueue, RedisStreamQueue, SqsQueue
+from retry_scheduler import PermanentError, RetryScheduler, TransientError, is_transient
+from stock_write_behind import STOCK_DIRTY_KEY, StockWriteBehind
+from worker_metrics import LatencyHistogram, SlotUsage, WorkerMetrics
+
+# Set by supervisor.py for each of its worker processes
+WORKER_PROCESS_INDEX = os.environ.get("WORKER_PROCESS_INDEX")
 
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
+    format="%(asctime)s [%(levelname)s] " + (f"[w{WORKER_PROCESS_INDEX}] " if WORKER_PROCESS_INDEX else "")
+           + "%(message)s"
 )
 
 # Environment
@@ -21,19 +44,102 @@ DB_PASS = os.environ.get("DB_PASS", "postgres")
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
 
-# Local mode doesn't require SQS
-if ENV != "local" and not SQS_QUEUE_URL:
-    raise RuntimeError("SQS_QUEUE_URL is required in production mode")
+# Order queue (see order_queue.py): sqs, redis (Redis Stream - local runs and CI), memory, or
+# table - claim PENDING orders straight from the orders table (no queue). Must match order-service
+QUEUE_BACKEND = os.environ.get("QUEUE_BACKEND", "redis" if ENV == "local" else "sqs")
+QUEUE_VISIBILITY_TIMEOUT = float(os.environ.get("QUEUE_VISIBILITY_TIMEOUT", "30"))  # SQS: must match queues.tf
+QUEUE_MAX_DELIVERIES = int(os.environ.get("QUEUE_MAX_DELIVERIES", "3"))  # then the queue's dead letters (SQS: redrive)
+
+# Heartbeats keep a running batch's messages invisible (every QUEUE_HEARTBEAT_INTERVAL, by
+# QUEUE_VISIBILITY_TIMEOUT); a batch still running after QUEUE_MAX_LEASE is left to be redelivered
+QUEUE_HEARTBEAT_INTERVAL = float(os.environ.get("QUEUE_HEARTBEAT_INTERVAL", str(QUEUE_VISIBILITY_TIMEOUT / 3)))
+QUEUE_MAX_LEASE = float(os.environ.get("QUEUE_MAX_LEASE", "900"))
+
+# SIGTERM: stop receiving, finish in-flight orders for up to WORKER_DRAIN_TIMEOUT (keep it under the
+# pod's terminationGracePeriodSeconds), then hand whatever is still running back to the queue
+WORKER_DRAIN_TIMEOUT = float(os.environ.get("WORKER_DRAIN_TIMEOUT", "25"))
+
+# Queue consumption - up to 10 messages per long poll; each batch is one transaction on a bounded thread pool
+SQS_MAX_MESSAGES = min(int(os.environ.get("SQS_MAX_MESSAGES", "10")), 10)
+SQS_WAIT_SECONDS = int(os.environ.get("SQS_WAIT_SECONDS", "20"))
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", "8"))
+SQS_RECEIVERS = int(os.environ.get("SQS_RECEIVERS", str(max(1, WORKER_CONCURRENCY // 4))))  # parallel long polls
+
+# Orders are partitioned by warehouse into WORKER_LANES lanes: each lane processes its
+# orders in arrival order, lanes run in parallel (0 = unpartitioned, no per-warehouse order)
+WORKER_LANES = int(os.environ.get("WORKER_LANES", str(WORKER_CONCURRENCY)))
+
+# Table mode (QUEUE_BACKEND=table) - PENDING orders claimed per transaction; polling is only a fallback for missed NOTIFYs
+LOCAL_CLAIM_BATCH = int(os.environ.get("LOCAL_CLAIM_BATCH", "10"))
+LOCAL_POLL_INTERVAL = float(os.environ.get("LOCAL_POLL_INTERVAL", "2"))
+
+# Retries - transient failures wait in a Redis sorted set (exponential backoff + jitter);
+# permanent failures and orders out of attempts go to the order_dead_letters table
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", "300"))
+RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BATCH = int(os.environ.get("RETRY_BATCH", "10"))  # due orders taken per poll
+RETRY_POLL_INTERVAL = float(os.environ.get("RETRY_POLL_INTERVAL", "1"))
+RETRY_LEASE = float(os.environ.get("RETRY_LEASE", "60"))  # a leased retry reappears if not finished by then
+
+# Lag / saturation metrics for autoscaling (worker_metrics.py) on WORKER_METRICS_PORT (0 = off):
+# GET /metrics (Prometheus) and /stats (JSON). Queue depth and the oldest PENDING order are
+# looked up at most every WORKER_METRICS_CACHE_SECONDS; busy ratios cover the last WORKER_BUSY_WINDOW
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", "9100"))
+WORKER_METRICS_HOST = os.environ.get("WORKER_METRICS_HOST", "0.0.0.0")  # supervisor.py children: 127.0.0.1
+WORKER_METRICS_CACHE_SECONDS = float(os.environ.get("WORKER_METRICS_CACHE_SECONDS", "5"))
+WORKER_BUSY_WINDOW = float(os.environ.get("WORKER_BUSY_WINDOW", "60"))
+
+# Order history cache kept by order-service (key layout must match order-service/history_cache.py)
+HISTORY_KEY = "orders:history:{customer_id}"
+HISTORY_GENERATION_KEY = "orders:history:{customer_id}:gen"
+HISTORY_GENERATION_TTL = 86400
+
+# Per-warehouse dashboard counters (key layout must match order-service/order_stats.py)
+STATS_KEY = "orders:stats:{warehouse_id}:{bucket}"
+STATS_HOUR_TTL = 2 * 86400
+STATS_DAY_TTL = 35 * 86400
+
+# Stock keys are "{warehouse_id}:{item_id}" (availability-service). Each order's
+# decrement leaves an applied-marker; it must outlive any redelivery of the
+# order's message (SQS retention is 1 day)
+STOCK_KEY = "{warehouse_id}:{item_id}"
+STOCK_APPLIED_KEY = "stock:applied:{order_id}"
+STOCK_APPLIED_TTL = int(os.environ.get("STOCK_APPLIED_TTL", str(2 * 86400)))
+
+# Write-behind of stock to the inventory table (stock_write_behind.py): stock writes mark their keys
+# dirty in Redis, and one worker process at a time upserts them every STOCK_FLUSH_INTERVAL seconds
+# (0 = off), STOCK_FLUSH_BATCH keys per statement
+STOCK_FLUSH_INTERVAL = float(os.environ.get("STOCK_FLUSH_INTERVAL", "0.25"))
+STOCK_FLUSH_BATCH = int(os.environ.get("STOCK_FLUSH_BATCH", "1000"))
+
+# Inventory reconciliation (python main.py reconcile-inventory, see inventory_reconcile.py): stock keys of
+# warehouses matching INVENTORY_WAREHOUSE_PATTERN, SCANned INVENTORY_SCAN_COUNT at a time and at most
+# INVENTORY_MAX_KEYS_PER_SECOND keys per second (0 = unthrottled); repairs are written INVENTORY_BATCH_SIZE at a time
+INVENTORY_WAREHOUSE_PATTERN = os.environ.get("INVENTORY_WAREHOUSE_PATTERN", "wh_*")
+INVENTORY_SCAN_COUNT = int(os.environ.get("INVENTORY_SCAN_COUNT", "1000"))
+INVENTORY_MAX_KEYS_PER_SECOND = float(os.environ.get("INVENTORY_MAX_KEYS_PER_SECOND", "200000"))
+INVENTORY_BATCH_SIZE = int(os.environ.get("INVENTORY_BATCH_SIZE", "1000"))
+
+# Order status events - order-service LISTENs on this channel and pushes them to SSE clients
+ORDER_EVENTS_CHANNEL = "order_status"
+
+if QUEUE_BACKEND not in ("sqs", "redis", "memory", "table"):
+    raise RuntimeError(f"Unknown QUEUE_BACKEND: {QUEUE_BACKEND}")
+
+# Only the SQS backend needs SQS
+if QUEUE_BACKEND == "sqs" and not SQS_QUEUE_URL:
+    raise RuntimeError("SQS_QUEUE_URL is required with QUEUE_BACKEND=sqs")
 
 if not DB_HOST:
     raise RuntimeError("DB_HOST is required")
 
-logging.info(f"Starting fulfillment worker (ENV={ENV})")
+logging.info(f"Starting fulfillment worker (ENV={ENV}, QUEUE_BACKEND={QUEUE_BACKEND})")
 logging.info(f"DB Host: {DB_HOST}:{DB_PORT}/{DB_NAME}")
 
-# Initialize SQS only in production
+# Initialize SQS only for the SQS backend
 sqs = None
-if ENV != "local":
+if QUEUE_BACKEND == "sqs":
     import boto3
     AWS_REGION = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION")
     if not AWS_REGION:
@@ -55,166 +161,1167 @@ except Exception as e:
     redis_client = None
 
 
-# Database Connection
-def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS
-    )
+retry_scheduler = RetryScheduler(
+    redis_client,
+    base_delay=RETRY_BASE_DELAY,
+    max_delay=RETRY_MAX_DELAY,
+    max_attempts=RETRY_MAX_ATTEMPTS
+) if redis_client else None
+
+# Order created -> COMPLETED committed, for every order this process completes
+order_latency = LatencyHistogram()
+
+
+# Database Connections - long-lived, one per borrowing thread at most (opened on first use). The pool
+# raises PoolError instead of waiting, so it holds one for every thread that may borrow at once: each
+# batch slot / lane, the retry poller (it runs batches itself without lanes and in table mode) and
+# the stock flusher
+db_pool = psycopg2.pool.ThreadedConnectionPool(
+    0,
+    max(WORKER_CONCURRENCY, WORKER_LANES) + 2,
+    host=DB_HOST,
+    port=DB_PORT,
+    database=DB_NAME,
+    user=DB_USER,
+    password=DB_PASS
+)
+
+# The metrics' lag query gets a connection of its own, so a scrape never takes one a lane
+# is about to borrow (WorkerMetrics runs its lookups one at a time)
+metrics_db_pool = psycopg2.pool.ThreadedConnectionPool(
+    0,
+    1,
+    host=DB_HOST,
+    port=DB_PORT,
+    database=DB_NAME,
+    user=DB_USER,
+    password=DB_PASS
+)
 
-# Update Redis stock after order processing
-def update_redis_stock(warehouse_id: str, item_id: str, quantity: int):
-    if redis_client:
-        key = f"{warehouse_id}:{item_id}"
+@contextmanager
+def db_connection(pool=None):
+    """Borrow a pooled connection (db_pool by default); broken connections are closed instead of returned"""
+    pool = pool or db_pool
+    conn = pool.getconn()
+    if conn.closed:
+        pool.putconn(conn, close=True)
+        conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        # The pool rolls back anything left open, so the next borrower starts clean
+        pool.putconn(conn, close=broken or bool(conn.closed))
+
+# KEYS: applied-marker, dirty set, stock keys. ARGV: marker TTL, now, quantity per stock key.
+# Decrements every item (never below 0, missing keys are left alone) and
+# records what was taken in the marker - all or nothing, and only the first
+# time for an order. Changed keys are marked for the write-behind.
+# Returns 1 if applied now, 0 if the order was already applied.
+STOCK_APPLY_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], '_', 1)
+for i = 3, #KEYS do
+    local current = tonumber(redis.call('GET', KEYS[i]))
+    if current then
+        local taken = math.max(0, math.min(current, tonumber(ARGV[i])))
+        if taken > 0 then
+            redis.call('DECRBY', KEYS[i], taken)
+            redis.call('HINCRBY', KEYS[1], KEYS[i], taken)
+            redis.call('ZADD', KEYS[2], 'NX', ARGV[2], KEYS[i])
+        end
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# KEYS: applied-marker, dirty set. ARGV: now. Puts back what STOCK_APPLY_SCRIPT took for a failed order.
+STOCK_RELEASE_SCRIPT = """
+local taken = redis.call('HGETALL', KEYS[1])
+for i = 1, #taken, 2 do
+    if taken[i] ~= '_' then
+        redis.call('INCRBY', taken[i], taken[i + 1])
+        redis.call('ZADD', KEYS[2], 'NX', ARGV[1], taken[i])
+    end
+end
+return redis.call('DEL', KEYS[1])
+"""
+
+stock_apply_script = redis_client.register_script(STOCK_APPLY_SCRIPT) if redis_client else None
+stock_release_script = redis_client.register_script(STOCK_RELEASE_SCRIPT) if redis_client else None
+
+stock_write_behind = StockWriteBehind(
+    redis_client,
+    db_connection,
+    interval=STOCK_FLUSH_INTERVAL,
+    batch_size=STOCK_FLUSH_BATCH
+) if redis_client and STOCK_FLUSH_INTERVAL > 0 else None
+
+
+class StockUnavailable(TransientError):
+    """Redis could not apply an order's stock - leave the order PENDING and retry it"""
+
+
+# Decrement stock for claimed orders BEFORE their transaction commits. A crash
+# or failed commit leaves the order PENDING with its marker set, so the retry
+# (queue redelivery / the next table-mode claim) is a no-op for stock.
+def apply_stock(orders: list) -> int:
+    """orders: (order_id, warehouse_id, items). One script call per order, all in one round trip."""
+    if not redis_client or not orders:
+        return 0
+    now = time.time()
+    pipe = redis_client.pipeline(transaction=False)
+    for order_id, warehouse_id, items in orders:
+        stock_apply_script(
+            keys=[STOCK_APPLIED_KEY.format(order_id=order_id), STOCK_DIRTY_KEY] + [
+                STOCK_KEY.format(warehouse_id=item.get("warehouse_id", warehouse_id), item_id=item["item_id"])
+                for item in items
+            ],
+            args=[STOCK_APPLIED_TTL, now] + [int(item["quantity"]) for item in items],
+            client=pipe
+        )
+    try:
+        applied = sum(pipe.execute())
+    except redis.RedisError as e:
+        raise StockUnavailable(f"Redis stock update failed: {e}") from e
+    if applied < len(orders):
+        logging.info(f"Stock already applied for {len(orders) - applied} of {len(orders)} order(s)")
+    return applied
+
+# Give back the stock of an order that ended up FAILED (no-op if none was taken)
+def release_stock(order_id: str):
+    if stock_release_script:
+        try:
+            stock_release_script(keys=[STOCK_APPLIED_KEY.format(order_id=order_id), STOCK_DIRTY_KEY],
+                                 args=[time.time()])
+        except Exception as e:
+            logging.warning(f"Stock release failed for {order_id}: {e}")
+
+# Drop the customers' cached order history after a status change (one round trip)
+def invalidate_order_history(*customer_ids: str):
+    customer_ids = [customer_id for customer_id in customer_ids if customer_id]
+    if redis_client and customer_ids:
         try:
-            current = redis_client.get(key)
-            if current:
-                new_stock = max(0, int(current) - quantity)
-                redis_client.set(key, new_stock)
-                logging.info(f"Redis updated: {key} = {new_stock}")
+            pipe = redis_client.pipeline(transaction=True)
+            for customer_id in customer_ids:
+                generation_key = HISTORY_GENERATION_KEY.format(customer_id=customer_id)
+                pipe.incr(generation_key)
+                pipe.expire(generation_key, HISTORY_GENERATION_TTL)
+                pipe.delete(HISTORY_KEY.format(customer_id=customer_id))
+            pipe.execute()
         except Exception as e:
-            logging.warning(f"Redis update failed: {e}")
+            logging.warning(f"History cache invalidation failed: {e}")
+
+# Count committed status changes in the warehouse's hour / day / all-time counters (one round trip)
+def record_order_status(warehouse_id: str, *statuses: str, count: int = 1):
+    if redis_client and warehouse_id:
+        try:
+            now = datetime.utcnow()
+            pipe = redis_client.pipeline(transaction=False)
+            for bucket, ttl in ((now.strftime("h:%Y%m%d%H"), STATS_HOUR_TTL),
+                                (now.strftime("d:%Y%m%d"), STATS_DAY_TTL),
+                                ("all", None)):
+                key = STATS_KEY.format(warehouse_id=warehouse_id, bucket=bucket)
+                for status in statuses:
+                    pipe.hincrby(key, status, count)
+                if ttl:
+                    pipe.expire(key, ttl)
+            pipe.execute()
+        except Exception as e:
+            logging.warning(f"Order stats update failed: {e}")
+
+# Announce a status change; delivered to listeners when the transaction commits
+def notify_order_status(cur, order_id: str, customer_id: str, warehouse_id: str, status: str):
+    payload = json.dumps({
+        "order_id": order_id,
+        "customer_id": customer_id,
+        "warehouse_id": warehouse_id,
+        "status": status,
+    }, separators=(",", ":"))
+    cur.execute("SELECT pg_notify(%s, %s)", (ORDER_EVENTS_CHANNEL, payload))
+
+# Same, for many orders in one statement; rows are (order_id, customer_id, warehouse_id)
+def notify_order_statuses(cur, rows, status: str):
+    payloads = [
+        json.dumps({"order_id": order_id, "customer_id": customer_id, "warehouse_id": warehouse_id,
+                    "status": status}, separators=(",", ":"))
+        for order_id, customer_id, warehouse_id in rows
+    ]
+    cur.execute("SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                (ORDER_EVENTS_CHANNEL, payloads))
+
+# Lane of a warehouse - must match LANE_SQL so both modes route a warehouse the same way
+def lane_of(warehouse_id, lanes: int) -> int:
+    return int(hashlib.md5((warehouse_id or "").encode()).hexdigest()[:7], 16) % lanes
+
+LANE_SQL = "('x' || substr(md5(coalesce(warehouse_id, '')), 1, 7))::bit(28)::int %% %s"
+
+# Advisory lock class for table-mode lanes: one transaction per lane at a time, across processes
+LANE_LOCK_CLASS = 4242
+
+# Set-based state transitions - one statement each for the whole batch
+CLAIM_ORDERS_SQL = """
+    UPDATE orders SET status = 'PROCESSING'
+    WHERE order_id = ANY(%s) AND status = 'PENDING'
+    RETURNING order_id, customer_id, warehouse_id
+"""
+
+COMPLETE_ORDERS_SQL = """
+    UPDATE orders SET status = 'COMPLETED'
+    WHERE order_id = ANY(%s) AND status = 'PROCESSING'
+    RETURNING order_id, created_at
+"""
+
+# Orders parked for a retry carry next_attempt_at (their due time) and are left to the retry
+# poller - unless the retry is overdue by more than a lease (lost from the retry set), then
+# they count as PENDING again
+NOT_RETRYING_SQL = "(next_attempt_at IS NULL OR next_attempt_at < CURRENT_TIMESTAMP - make_interval(secs => %s))"
+
+MARK_RETRY_SQL = """
+    UPDATE orders SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+    WHERE order_id = %s AND status = 'PENDING'
+"""
+
+# Local mode: take the lane's oldest PENDING orders nobody else holds - concurrent
+# workers skip each other's rows instead of racing for (or waiting on) them
+CLAIM_PENDING_SQL = f"""
+    WITH next_orders AS (
+        SELECT order_id FROM orders
+        WHERE status = 'PENDING' AND {LANE_SQL} = %s AND {NOT_RETRYING_SQL}
+        ORDER BY created_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE orders SET status = 'PROCESSING'
+    FROM next_orders
+    WHERE orders.order_id = next_orders.order_id
+    RETURNING orders.order_id, orders.customer_id, orders.warehouse_id, orders.items
+"""
+
+# Lag for the metrics: PENDING orders nobody is retrying yet (idx_orders_pending)
+PENDING_LAG_SQL = f"""
+    SELECT count(*), min(created_at) FROM orders
+    WHERE status = 'PENDING' AND {NOT_RETRYING_SQL}
+"""
+
+def pending_orders() -> tuple:
+    """(PENDING order count, oldest created_at) - orders parked for a retry are not lag"""
+    with db_connection(metrics_db_pool) as conn:
+        with conn.cursor() as cur:
+            cur.execute(PENDING_LAG_SQL, (RETRY_LEASE,))
+            count, oldest = cur.fetchone()
+        conn.rollback()
+    return count, oldest
+
+# Side effects of committed orders: history cache, dashboard counters, latency histogram
+def apply_completed(orders: list):
+    invalidate_order_history(*{order["customer_id"] for order in orders})
+    for warehouse_id, count in Counter(order["warehouse_id"] for order in orders).items():
+        record_order_status(warehouse_id, 'PROCESSING', 'COMPLETED', count=count)
+    now = datetime.utcnow()
+    order_latency.observe(*[max(0.0, (now - order["created_at"]).total_seconds())
+                            for order in orders if order.get("created_at")])
+
+# Failed orders - the message is kept in order_dead_letters for replay
+FAIL_ORDER_SQL = """
+    UPDATE orders SET status = 'FAILED'
+    WHERE order_id = %s AND status IN ('PENDING', 'PROCESSING')
+    RETURNING customer_id, warehouse_id
+"""
+
+DEAD_LETTER_SQL = """
+    INSERT INTO order_dead_letters (order_id, payload, error, attempts)
+    VALUES (%s, %s, %s, %s)
+"""
+
+def fail_order(order_data: dict, error: Exception, attempts: int) -> bool:
+    """Mark the order FAILED and dead-letter it in one transaction; False if that could not be recorded"""
+    order_id = order_data.get("order_id")
+    payload = {key: value for key, value in order_data.items() if key != "retry_attempt"}
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                row = None
+                if order_id:
+                    cur.execute(FAIL_ORDER_SQL, (order_id,))
+                    row = cur.fetchone()
+                    if row:
+                        notify_order_status(cur, order_id, row[0], row[1], 'FAILED')
+                cur.execute(DEAD_LETTER_SQL, (order_id, json.dumps(payload),
+                                              f"{type(error).__name__}: {error}"[:2000], attempts))
+            conn.commit()
+    except Exception as e:
+        logging.error(f"Could not dead-letter order {order_id}: {e}")
+        return False
+
+    logging.error(f"Order {order_id} dead-lettered after {attempts} attempt(s): {error}")
+    if row:
+        release_stock(order_id)
+        invalidate_order_history(row[0])
+        record_order_status(row[1], 'FAILED')
+    return True
+
+def mark_retry(order_id: str, delay: float):
+    """
+    Flag the PENDING row as waiting for a retry, so table-mode claims and the lag metric skip it
+    in SQL. Best effort: without the flag a claim may take the order before its retry is due,
+    which the PENDING check and the applied-marker make harmless.
+    """
+    if not order_id:
+        return
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(MARK_RETRY_SQL, (delay, order_id))
+            conn.commit()
+    except Exception as e:
+        logging.warning(f"Could not flag order {order_id} for its retry: {e}")
+
+def retry_or_fail(order_data: dict, error: Exception) -> bool:
+    """
+    Route a failed order: transient errors are retried later with backoff,
+    permanent ones (or transient ones out of attempts) are dead-lettered.
+    False if neither could be recorded - the message is then redelivered.
+    """
+    attempt = order_data.get("retry_attempt", 0) + 1
+    if is_transient(error) and attempt <= RETRY_MAX_ATTEMPTS:
+        if retry_scheduler is None:
+            return False
+        try:
+            delay = retry_scheduler.schedule(order_data, attempt)
+        except redis.RedisError as e:
+            logging.error(f"Could not schedule a retry for order {order_data.get('order_id')}: {e}")
+            return False
+        logging.warning(f"Order {order_data.get('order_id')} failed ({error}), "
+                        f"retry {attempt}/{RETRY_MAX_ATTEMPTS} in {delay:.1f}s")
+        mark_retry(order_data.get("order_id"), delay)
+        return True
+    return fail_order(order_data, error, attempt)
 
 # Order Processing Logic
 def process_order(order_data: dict) -> bool:
     order_id = order_data.get("order_id")
     items = order_data.get("items", [])
     warehouse_id = order_data.get("warehouse_id")
+    customer_id = order_data.get("customer_id")
 
     if not order_id or not items:
-        logging.error("Invalid order payload")
-        return False
-
-    conn = get_db_connection()
-    cur = conn.cursor()
+        return retry_or_fail(order_data, PermanentError("Invalid order payload"))
 
     try:
-        logging.info(f"Processing order {order_id}")
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                logging.info(f"Processing order {order_id}")
 
-        # Update order status to PROCESSING
-        cur.execute(
-            "UPDATE orders SET status = %s WHERE order_id = %s AND status = %s",
-            ('PROCESSING', order_id, 'PENDING')
-        )
-        
-        if cur.rowcount == 0:
-            logging.info(f"Order {order_id} already processed or not found")
-            conn.rollback()
-            return True
+                # Update order status to PROCESSING
+                cur.execute(CLAIM_ORDERS_SQL, ([order_id],))
+                row = cur.fetchone()
 
-        # Update Redis stock for each item
-        for item in items:
-            item_warehouse = item.get("warehouse_id", warehouse_id)
-            update_redis_stock(item_warehouse, item["item_id"], item["quantity"])
+                if row is None:
+                    logging.info(f"Order {order_id} already processed or not found")
+                    conn.rollback()
+                    return True
 
-        # Mark order as COMPLETED
-        cur.execute(
-            "UPDATE orders SET status = %s WHERE order_id = %s",
-            ('COMPLETED', order_id)
-        )
+                # The stored row is authoritative for routing the status events
+                customer_id, warehouse_id = row[1] or customer_id, row[2] or warehouse_id
+                notify_order_status(cur, order_id, customer_id, warehouse_id, 'PROCESSING')
+                apply_stock([(order_id, warehouse_id, items)])
 
-        conn.commit()
-        logging.info(f"Order {order_id} completed successfully")
-        return True
+                # Mark order as COMPLETED
+                cur.execute(COMPLETE_ORDERS_SQL, ([order_id],))
+                completed = cur.fetchone()
+                notify_order_status(cur, order_id, customer_id, warehouse_id, 'COMPLETED')
+
+            conn.commit()
 
     except Exception as e:
-        conn.rollback()
+        # Rolled back - the order is still PENDING
         logging.error(f"Order {order_id} failed: {e}")
-        # Mark as FAILED
+        return retry_or_fail(order_data, e)
+
+    # Caches are updated once the order is committed
+    apply_completed([{"customer_id": customer_id, "warehouse_id": warehouse_id, "items": items,
+                      "created_at": completed[1] if completed else None}])
+    logging.info(f"Order {order_id} completed successfully")
+    return True
+
+
+def complete_claimed(cur, claimed: list) -> list:
+    """
+    PROCESSING -> COMPLETED for claimed (order_id, customer_id, warehouse_id) rows, inside the
+    caller's transaction. Returns the completed rows with each order's created_at appended.
+    """
+    if not claimed:
+        return []
+    notify_order_statuses(cur, claimed, 'PROCESSING')
+    cur.execute(COMPLETE_ORDERS_SQL, ([row[0] for row in claimed],))
+    created = dict(cur.fetchall())
+    completed = [tuple(row) + (created[row[0]],) for row in claimed if row[0] in created]
+    notify_order_statuses(cur, [row[:3] for row in completed], 'COMPLETED')
+    return completed
+
+
+def process_orders(orders: list) -> list:
+    """
+    Process a batch of orders in ONE transaction: one set-based UPDATE per
+    state transition and one NOTIFY statement each, plus one Redis round trip
+    for the stock of every claimed order. Returns a flag per input
+    order - True when its message can be acknowledged (completed now, already
+    processed, scheduled for a retry or dead-lettered), False to let it be
+    redelivered. If the batch fails, its orders are retried one by one so one
+    bad order can't fail the rest.
+    """
+    valid, invalid = {}, {}
+    for index, order in enumerate(orders):
+        if order.get("order_id") and order.get("items"):
+            valid.setdefault(order["order_id"], order)
+        else:
+            invalid[index] = retry_or_fail(order, PermanentError("Invalid order payload"))
+    if not valid:
+        return [invalid[index] for index in range(len(orders))]
+
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(CLAIM_ORDERS_SQL, (list(valid),))
+                # The stored rows are authoritative for routing the status events
+                claimed = [
+                    (order_id, customer_id or valid[order_id].get("customer_id"),
+                     warehouse_id or valid[order_id].get("warehouse_id"))
+                    for order_id, customer_id, warehouse_id in cur.fetchall()
+                ]
+                apply_stock([(order_id, warehouse_id, valid[order_id]["items"])
+                             for order_id, _, warehouse_id in claimed])
+                completed = complete_claimed(cur, claimed)
+            conn.commit()
+    except StockUnavailable as e:
+        # Nothing to gain from trying them one by one
+        logging.error(f"Batch of {len(valid)} orders not processed: {e}")
+        results = {order_id: retry_or_fail(order, e) for order_id, order in valid.items()}
+        return [invalid[i] if i in invalid else results[order["order_id"]] for i, order in enumerate(orders)]
+    except Exception as e:
+        logging.error(f"Batch of {len(valid)} orders failed, retrying one by one: {e}")
+        results = {order_id: process_order(order) for order_id, order in valid.items()}
+        return [invalid[i] if i in invalid else results[order["order_id"]] for i, order in enumerate(orders)]
+
+    apply_completed([
+        {"customer_id": customer_id, "warehouse_id": warehouse_id, "items": valid[order_id]["items"],
+         "created_at": created_at}
+        for order_id, customer_id, warehouse_id, created_at in completed
+    ])
+    logging.info(f"Batch of {len(valid)} orders: {len(completed)} completed, "
+                 f"{len(valid) - len(completed)} already processed or not found")
+    return [invalid.get(i, True) for i in range(len(orders))]
+
+
+# Feed orders whose retry is due back through `handle` (process_orders or the consumer lanes)
+def retry_due_orders(handle, stop_event: threading.Event = None):
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        try:
+            due = retry_scheduler.lease_due(RETRY_BATCH, RETRY_LEASE)
+        except redis.RedisError as e:
+            logging.warning(f"Retry poll failed: {e}")
+            stop_event.wait(5)
+            continue
+        if not due:
+            stop_event.wait(RETRY_POLL_INTERVAL)
+            continue
+
+        logging.info(f"Retrying {len(due)} order(s)")
+        results = handle([order for _, order in due])
+        # Anything not finished stays leased and comes back after RETRY_LEASE
         try:
-            cur.execute(
-                "UPDATE orders SET status = %s WHERE order_id = %s",
-                ('FAILED', order_id)
-            )
+            retry_scheduler.finish([member for (member, _), ok in zip(due, results) if ok])
+        except redis.RedisError as e:
+            logging.warning(f"Could not clear finished retries: {e}")
+
+
+def start_stock_flusher():
+    """The stock write-behind on its own thread, until stop_stock_flusher() - once no more stock changes"""
+    if stock_write_behind is None:
+        logging.warning("Stock write-behind off - the inventory table is not kept up to date")
+        return None
+    stop_event = threading.Event()
+    thread = threading.Thread(target=stock_write_behind.run, args=(stop_event,), name="stock-flusher", daemon=True)
+    thread.start()
+    return thread, stop_event
+
+
+def stop_stock_flusher(flusher, timeout: float = 5):
+    """Flush what the drained batches changed, then stop"""
+    if flusher:
+        thread, stop_event = flusher
+        stop_event.set()
+        thread.join(timeout)
+
+
+def start_retry_poller(handle, stop_event: threading.Event = None):
+    if retry_scheduler is None:
+        logging.warning("Redis not available - failed orders are not retried")
+        return None
+    thread = threading.Thread(target=retry_due_orders, args=(handle, stop_event), name="retries", daemon=True)
+    thread.start()
+    return thread
+
+
+# TABLE MODE: Claim PENDING orders straight from the table
+def process_pending_orders(limit: int, lane: int = 0, lanes: int = 0) -> int:
+    """
+    Claim up to `limit` PENDING orders (SKIP LOCKED) and complete them in one
+    transaction. With lanes > 0 only the lane's warehouses are claimed, and only
+    while holding the lane's advisory lock, so a lane's orders are completed in
+    order even with several worker processes. Orders waiting for a retry are
+    left to the retry poller. Returns how many were claimed.
+    """
+    rows, items = [], {}
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                if lanes:
+                    cur.execute("SELECT pg_try_advisory_xact_lock(%s, %s)", (LANE_LOCK_CLASS, lane))
+                    if not cur.fetchone()[0]:
+                        # Another worker is draining this lane right now
+                        conn.rollback()
+                        return 0
+                cur.execute(CLAIM_PENDING_SQL, (lanes or 1, lane, RETRY_LEASE, limit))
+                rows = cur.fetchall()
+                items = {
+                    order_id: items if isinstance(items, list) else json.loads(items)
+                    for order_id, _, _, items in rows
+                }
+                apply_stock([(order_id, warehouse_id, items[order_id]) for order_id, _, warehouse_id, _ in rows])
+                completed = complete_claimed(cur, [row[:3] for row in rows])
             conn.commit()
-        except:
-            pass
-        return False
+    except Exception as e:
+        if not rows:
+            raise
+        # Rolled back - the orders are PENDING again; find the one(s) at fault
+        logging.error(f"Batch of {len(rows)} claimed orders failed, retrying one by one: {e}")
+        for order_id, customer_id, warehouse_id, order_items in rows:
+            process_order({"order_id": order_id, "customer_id": customer_id, "warehouse_id": warehouse_id,
+                           "items": items.get(order_id, order_items)})
+        return len(rows)
+
+    apply_completed([
+        {"customer_id": customer_id, "warehouse_id": warehouse_id, "items": items[order_id],
+         "created_at": created_at}
+        for order_id, customer_id, warehouse_id, created_at in completed
+    ])
+    if rows:
+        logging.info(f"Claimed {len(rows)} pending order(s), {len(completed)} completed")
+    return len(rows)
 
-    finally:
-        cur.close()
-        conn.close()
+
+def listen_for_new_orders():
+    """Dedicated connection LISTENing for order-service's order status NOTIFYs (None if unavailable)"""
+    try:
+        conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, database=DB_NAME, user=DB_USER, password=DB_PASS)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {ORDER_EVENTS_CHANNEL}")
+        return conn
+    except Exception as e:
+        logging.warning(f"LISTEN unavailable, polling every {LOCAL_POLL_INTERVAL}s: {e}")
+        return None
+
+
+def wait_for_new_orders(listen_conn, timeout: float, lanes: int):
+    """
+    Block until new PENDING orders are announced or `timeout` passes.
+    Returns (listen connection to keep using - None once it broke, lanes with new orders).
+    """
+    if listen_conn is None:
+        time.sleep(timeout)
+        return listen_for_new_orders(), set()
+
+    woken = set()
+    try:
+        if select.select([listen_conn], [], [], timeout)[0]:
+            listen_conn.poll()
+        for notify in listen_conn.notifies:
+            # Status changes from other workers share the channel - only new orders wake a lane
+            if '"status":"PENDING"' in notify.payload:
+                woken.add(lane_of(json.loads(notify.payload).get("warehouse_id"), lanes) if lanes else 0)
+        listen_conn.notifies.clear()
+        return listen_conn, woken
+    except Exception as e:
+        logging.warning(f"LISTEN connection lost: {e}")
+        listen_conn.close()
+        return None, set()
+
+
+def drain_lane(lane: int, lanes: int, wakeup: threading.Event, stop_event: threading.Event, usage: SlotUsage):
+    """Claim the lane's orders batch by batch; sleep until woken (or the fallback poll) when it is empty"""
+    while not stop_event.is_set():
+        # Clear before claiming so a wake-up that lands mid-claim isn't lost
+        wakeup.clear()
+        try:
+            with usage.busy(lane):
+                claimed = process_pending_orders(LOCAL_CLAIM_BATCH, lane, lanes)
+        except Exception as e:
+            logging.error(f"Database polling error (lane {lane}): {e}")
+            stop_event.wait(5)
+            continue
+
+        # A full batch means there is probably more waiting - go straight round
+        if claimed < LOCAL_CLAIM_BATCH:
+            wakeup.wait(LOCAL_POLL_INTERVAL)
 
 
-# LOCAL MODE: Poll database for pending orders
 def poll_database_forever():
-    logging.info("LOCAL MODE: Polling database for pending orders...")
-    
-    while True:
+    logging.info(f"TABLE MODE: Claiming pending orders ({LOCAL_CLAIM_BATCH} per transaction, "
+                 f"{WORKER_LANES or 'no'} warehouse lanes, woken by NOTIFY, "
+                 f"polling every {LOCAL_POLL_INTERVAL}s as fallback)...")
+    stop_event = stop_on_signals()
+    wakeups = [threading.Event() for _ in range(WORKER_LANES or 1)]
+    usage = SlotUsage(len(wakeups), window=WORKER_BUSY_WINDOW)
+    lanes = [
+        threading.Thread(target=drain_lane, args=(lane, WORKER_LANES, wakeup, stop_event, usage),
+                         name=f"lane-{lane}", daemon=True)
+        for lane, wakeup in enumerate(wakeups)
+    ]
+    start_metrics_server(pools={"lane": usage})
+    for thread in lanes:
+        thread.start()
+
+    start_retry_poller(process_orders, stop_event)
+    flusher = start_stock_flusher()
+
+    listen_conn = listen_for_new_orders()
+    while not stop_event.is_set():
+        listen_conn, woken = wait_for_new_orders(listen_conn, LOCAL_POLL_INTERVAL, WORKER_LANES)
+        for lane in woken:
+            wakeups[lane].set()
+
+    # Stopping: each lane finishes the claim it is in (one transaction) and exits
+    for wakeup in wakeups:
+        wakeup.set()
+    deadline = time.monotonic() + WORKER_DRAIN_TIMEOUT
+    for thread in lanes:
+        thread.join(max(0, deadline - time.monotonic()))
+    stop_stock_flusher(flusher)
+    return not any(thread.is_alive() for thread in lanes)
+
+
+class Lane:
+    """
+    One warehouse lane: a single thread that runs handler(orders) on submitted
+    parts strictly in submission order. Parts queued while the lane is busy are
+    handled together in one call, so a busy lane still gets full batches.
+    """
+
+    def __init__(self, handler, name: str):
+        self.handler = handler
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, orders: list) -> Future:
+        """Queue orders behind everything already submitted; the future resolves to their ok flags"""
+        future = Future()
+        with self._cond:
+            self._pending.append((orders, future))
+            self._cond.notify()
+        return future
+
+    def close(self):
+        """Finish the queued parts, then stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                parts = list(self._pending)
+                self._pending.clear()
+            orders = [order for part, _ in parts for order in part]
+            results = self.handler(orders)
+            self.batches += 1
+            start = 0
+            for part, future in parts:
+                future.set_result(results[start:start + len(part)])
+                start += len(part)
+
+
+class QueueConsumer:
+    """
+    Receives up to max_messages per long poll from `queue` (any order_queue
+    backend) and hands each received batch to handler(list of order dicts) on
+    one of `concurrency` threads; the handler returns one ok flag per order
+    (see process_orders). A new receive is only issued while a worker slot is
+    free, so no batch sits waiting on its visibility timeout. Accepted
+    messages are acked with one call per batch; the rest are redelivered by
+    the queue.
+
+    With lanes > 0 each received batch is split by warehouse (lane_of) and
+    every part is handled on its lane's single thread (see Lane), so one
+    warehouse's orders are processed in the order they were received while
+    other warehouses' lanes run in parallel. On a FIFO queue (MessageGroupId =
+    warehouse_id) SQS holds back a group's next messages until the current
+    ones are deleted, so the order holds across receives too. It covers an
+    order's first attempt only: an order parked for a retry (retry_scheduler)
+    comes back through handle() outside its message group, after later
+    orders of its warehouse may have completed.
+
+    Every received message is leased until its batch is done: a heartbeat
+    extends the visibility of messages held longer than heartbeat_interval
+    (up to max_lease), so a slow batch is not redelivered to another worker
+    while it is still running.
+
+    Busy time is tracked per batch slot (`concurrency`) and per lane, for the
+    worker's saturation metrics.
+    """
+
+    def __init__(self, queue, handler, concurrency: int = 8, max_messages: int = 10, wait_seconds: int = 20,
+                 receivers: int = 1, lanes: int = 0, visibility_timeout: float = 30,
+                 heartbeat_interval: float = 10, max_lease: float = 900, busy_window: float = 60):
+        if concurrency < 1:
+            raise ValueError("concurrency must be >= 1")
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_messages = max_messages
+        self.wait_seconds = wait_seconds
+        # One receive returns at most 10 messages per round trip; parallel long
+        # polls keep a large pool fed
+        self.receivers = max(1, min(receivers, concurrency))
+        self.lanes = lanes
+        self.batch_usage = SlotUsage(concurrency, window=busy_window)
+        self.lane_usage = SlotUsage(lanes, window=busy_window)
+        self._lanes = [Lane(self._lane_handler(lane), name=f"lane-{lane}") for lane in range(lanes)]
+
+        self.visibility_timeout = visibility_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.max_lease = max_lease
+
+        self._slots = threading.Condition()
+        self._in_flight = 0
+        self._leases = {}  # receipt -> received at, for every message whose batch is not done
+        self._stopping = False
+
+        # Metrics
+        self.received = 0
+        self.receives = 0
+        self.empty_receives = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.acked = 0
+        self.ack_calls = 0
+        self.heartbeats = 0
+        self.extended = 0
+        self.released = 0
+
+    def run(self, stop_event: threading.Event = None, drain_timeout: float = None) -> bool:
+        """
+        Consume until stop_event is set, then stop receiving and finish the
+        in-flight batches, waiting up to drain_timeout seconds (None = as long
+        as they take). Returns False if batches were still running at the
+        deadline; their messages are made visible again for other workers.
+        """
+        stop_event = stop_event or threading.Event()
+        done = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="order")
+        # Daemon threads: a long poll still waiting at shutdown must not hold the process up
+        threads = [
+            threading.Thread(target=self._receive_loop, args=(stop_event, executor), name=f"receiver-{i}",
+                             daemon=True)
+            for i in range(self.receivers)
+        ]
+        if self.heartbeat_interval > 0:
+            threads.append(threading.Thread(target=self._heartbeat_loop, args=(done,), name="heartbeat",
+                                            daemon=True))
+        for thread in threads:
+            thread.start()
+
+        stop_event.wait()
+        with self._slots:
+            # Receives that are still waiting hand their messages straight back (see _receive_loop)
+            self._stopping = True
+            self._slots.notify_all()
+            drained = self._slots.wait_for(lambda: not self._leases, timeout=drain_timeout)
+            unfinished = list(self._leases)
+        done.set()
+        if not drained:
+            logging.warning(f"Drain timed out with {len(unfinished)} message(s) in flight - releasing them")
+            self._give_back(unfinished)
+        executor.shutdown(wait=drained)
+        if drained:
+            for lane in self._lanes:
+                lane.close()
+        return drained
+
+    def _receive_loop(self, stop_event: threading.Event, executor):
+        while not stop_event.is_set():
+            # Reserve a worker slot before receiving, so no batch waits on a busy pool
+            with self._slots:
+                self._slots.wait_for(lambda: self._in_flight < self.concurrency or stop_event.is_set())
+                if stop_event.is_set():
+                    break
+                self._in_flight += 1
+            try:
+                messages = self.queue.receive(self.max_messages, self.wait_seconds)
+            except Exception as e:
+                self._release()
+                logging.error(f"Queue polling error ({self.queue.name}): {e}")
+                time.sleep(5)
+                continue
+
+            with self._slots:
+                self.receives += 1
+                self.received += len(messages)
+                if not messages:
+                    self.empty_receives += 1
+                stopping = self._stopping
+                if messages and not stopping:
+                    now = time.monotonic()
+                    self._leases.update((message.receipt, now) for message in messages)
+            if not messages or stopping:
+                # The long poll already waited - go straight back (or stop)
+                self._give_back([message.receipt for message in messages])
+                self._release()
+                continue
+            executor.submit(self._process, messages)
+
+    def _release(self):
+        with self._slots:
+            self._in_flight -= 1
+            self._slots.notify_all()
+
+    def wake(self):
+        """Re-check the stop event (call after setting it)."""
+        with self._slots:
+            self._slots.notify_all()
+
+    def _process(self, messages: list):
+        parsed, orders = [], []
+        for message in messages:
+            try:
+                orders.append(json.loads(message.body))
+                parsed.append(message)
+            except ValueError as e:
+                logging.error(f"Message {message.message_id} is not valid JSON: {e}")
+        with self.batch_usage.busy():
+            results = self.handle(orders)
+
+        acks = [message.receipt for message, ok in zip(parsed, results) if ok]
+        with self._slots:
+            self.succeeded += len(acks)
+            self.failed += len(messages) - len(acks)
+        if acks:
+            self._ack(acks)
+        with self._slots:
+            for message in messages:
+                self._leases.pop(message.receipt, None)
+            self._slots.notify_all()
+        self._release()
+
+    def handle(self, orders: list) -> list:
+        """Run the handler on orders from anywhere (e.g. due retries), through the lanes if partitioned"""
+        if self.lanes and orders:
+            return self._handle_by_lane(orders)
+        return self._handle(orders)
+
+    def _handle(self, orders: list) -> list:
         try:
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            # Find pending orders
-            cur.execute("""
-                SELECT order_id, customer_id, warehouse_id, items 
-                FROM orders 
-                WHERE status = 'PENDING' 
-                ORDER BY created_at ASC 
-                LIMIT 5
-            """)
-            
-            orders = cur.fetchall()
-            cur.close()
-            conn.close()
-            
-            if not orders:
-                time.sleep(2)  # No pending orders, wait
+            return self.handler(orders) if orders else []
+        except Exception as e:
+            logging.error(f"Batch of {len(orders)} orders failed: {e}")
+            return [False] * len(orders)
+
+    def _lane_handler(self, lane: int):
+        def handle(orders: list) -> list:
+            with self.lane_usage.busy(lane):
+                return self._handle(orders)
+        return handle
+
+    def _handle_by_lane(self, orders: list) -> list:
+        """Run each warehouse lane's share of the batch on that lane's thread, keeping receive order"""
+        parts = {}
+        for index, order in enumerate(orders):
+            parts.setdefault(lane_of(order.get("warehouse_id"), self.lanes), []).append(index)
+        futures = {lane: self._lanes[lane].submit([orders[i] for i in indexes]) for lane, indexes in parts.items()}
+        wait(futures.values())
+
+        results = [False] * len(orders)
+        for lane, indexes in parts.items():
+            for index, ok in zip(indexes, futures[lane].result()):
+                results[index] = ok
+        return results
+
+    def _heartbeat_loop(self, done: threading.Event):
+        """Extend the visibility of messages held longer than heartbeat_interval"""
+        while not done.wait(self.heartbeat_interval):
+            now = time.monotonic()
+            with self._slots:
+                receipts = [receipt for receipt, received_at in self._leases.items()
+                            if self.heartbeat_interval <= now - received_at < self.max_lease]
+            if not receipts:
                 continue
-            
-            for order in orders:
-                order_data = {
-                    "order_id": order[0],
-                    "customer_id": order[1],
-                    "warehouse_id": order[2],
-                    "items": order[3] if isinstance(order[3], list) else json.loads(order[3])
-                }
-                process_order(order_data)
-                
+            try:
+                extended = self.queue.extend(receipts, self.visibility_timeout)
+            except Exception as e:
+                logging.warning(f"Heartbeat failed for {len(receipts)} message(s): {e}")
+                continue
+            with self._slots:
+                self.heartbeats += 1
+                self.extended += extended
+
+    def _give_back(self, receipts: list):
+        """Make messages visible again right away instead of after their timeout"""
+        if not receipts:
+            return
+        try:
+            self.queue.extend(receipts, 0)
+        except Exception as e:
+            logging.warning(f"Could not release {len(receipts)} message(s), they reappear after the timeout: {e}")
+            return
+        with self._slots:
+            self.released += len(receipts)
+
+    def _ack(self, receipts: list):
+        try:
+            acked = self.queue.ack(receipts)
         except Exception as e:
-            logging.error(f"Database polling error: {e}")
-            time.sleep(5)
+            logging.error(f"Queue ack failed for {len(receipts)} message(s), they will be redelivered: {e}")
+            return
+        if acked < len(receipts):
+            logging.warning(f"Queue ack failed for {len(receipts) - acked} of {len(receipts)} message(s)")
+        with self._slots:
+            self.ack_calls += 1
+            self.acked += acked
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.queue.name,
+            "concurrency": self.concurrency,
+            "receivers": self.receivers,
+            "lanes": self.lanes,
+            "lane_batches": [lane.batches for lane in self._lanes],
+            "batches_in_flight": self._in_flight,
+            "messages_in_flight": len(self._leases),
+            "receives": self.receives,
+            "empty_receives": self.empty_receives,
+            "received": self.received,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "acked": self.acked,
+            "ack_calls": self.ack_calls,
+            "heartbeats": self.heartbeats,
+            "extended": self.extended,
+            "released": self.released,
+            "busy_ratio": self.batch_usage.snapshot()["busy_ratio"],
+            "lane_busy_ratio": self.lane_usage.snapshot()["busy_ratio"],
+        }
+
 
+def open_order_queue():
+    """The QUEUE_BACKEND queue (not for table mode)"""
+    if QUEUE_BACKEND == "sqs":
+        return SqsQueue(sqs, SQS_QUEUE_URL)
+    if QUEUE_BACKEND == "memory":
+        # Nothing else can send to it - only useful when the worker is driven in-process
+        return MemoryQueue(visibility_timeout=QUEUE_VISIBILITY_TIMEOUT, max_deliveries=QUEUE_MAX_DELIVERIES)
+    if redis_client is None:
+        raise RuntimeError("QUEUE_BACKEND=redis needs Redis")
+    # Under supervisor.py a restarted process keeps its consumer name, so the group
+    # doesn't collect one dead consumer per crash
+    consumer = f"{socket.gethostname()}-w{WORKER_PROCESS_INDEX}" if WORKER_PROCESS_INDEX else None
+    return RedisStreamQueue(redis_client, consumer=consumer, visibility_timeout=QUEUE_VISIBILITY_TIMEOUT,
+                            max_deliveries=QUEUE_MAX_DELIVERIES)
 
-# PRODUCTION MODE: Poll SQS for orders
-def poll_sqs_forever():
-    logging.info("PRODUCTION MODE: Polling SQS for orders...")
 
-    while True:
+def poll_queue_forever(queue=None):
+    queue = queue or open_order_queue()
+    logging.info(f"Consuming {queue.name} queue ({WORKER_CONCURRENCY} batches in parallel, "
+                 f"up to {SQS_MAX_MESSAGES} messages per receive, {WORKER_LANES or 'no'} warehouse lanes)...")
+    consumer = QueueConsumer(
+        queue,
+        process_orders,
+        concurrency=WORKER_CONCURRENCY,
+        max_messages=SQS_MAX_MESSAGES,
+        wait_seconds=SQS_WAIT_SECONDS,
+        receivers=SQS_RECEIVERS,
+        lanes=WORKER_LANES,
+        visibility_timeout=QUEUE_VISIBILITY_TIMEOUT,
+        heartbeat_interval=QUEUE_HEARTBEAT_INTERVAL,
+        max_lease=QUEUE_MAX_LEASE,
+        busy_window=WORKER_BUSY_WINDOW
+    )
+    start_metrics_server(queue=queue, pools={"batch": consumer.batch_usage, "lane": consumer.lane_usage},
+                         stats=consumer.stats)
+    stop_event = stop_on_signals()
+    start_retry_poller(consumer.handle, stop_event)
+    flusher = start_stock_flusher()
+    drained = consumer.run(stop_event, drain_timeout=WORKER_DRAIN_TIMEOUT)
+    stop_stock_flusher(flusher)
+    logging.info(f"Consumer stopped: {consumer.stats()}")
+    return drained
+
+
+def start_metrics_server(queue=None, pools: dict = None, stats=None):
+    """Serve /metrics and /stats on WORKER_METRICS_PORT; the worker runs on without them if the port is taken"""
+    metrics = WorkerMetrics(order_latency, queue=queue, pending=pending_orders, pools=pools, stats=stats,
+                            stock=stock_write_behind.lag if stock_write_behind else None,
+                            cache_seconds=WORKER_METRICS_CACHE_SECONDS)
+    if WORKER_METRICS_PORT:
         try:
-            response = sqs.receive_message(
-                QueueUrl=SQS_QUEUE_URL,
-                MaxNumberOfMessages=1,
-                WaitTimeSeconds=20
-            )
+            metrics.serve(WORKER_METRICS_PORT, WORKER_METRICS_HOST)
+            logging.info(f"Metrics on {WORKER_METRICS_HOST}:{WORKER_METRICS_PORT}/metrics")
+        except OSError as e:
+            logging.warning(f"Metrics server not started on :{WORKER_METRICS_PORT}: {e}")
+    return metrics
 
-            messages = response.get("Messages", [])
 
-            if not messages:
-                time.sleep(2)
-                continue
+def stop_on_signals() -> threading.Event:
+    """An event set by SIGTERM (pod shutdown, scale-in, deploy) or SIGINT"""
+    stop_event = threading.Event()
 
-            for msg in messages:
-                receipt_handle = msg["ReceiptHandle"]
-                body = json.loads(msg["Body"])
+    def stop(signum, frame):
+        logging.info(f"{signal.Signals(signum).name} received - no new orders, finishing in-flight ones "
+                     f"(up to {WORKER_DRAIN_TIMEOUT:g}s)")
+        stop_event.set()
 
-                if process_order(body):
-                    sqs.delete_message(
-                        QueueUrl=SQS_QUEUE_URL,
-                        ReceiptHandle=receipt_handle
-                    )
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    return stop_event
 
-        except Exception as e:
-            logging.error(f"SQS polling error: {e}")
-            time.sleep(5)
+
+# Dead letters - python main.py dead-letters [--replay ID ... | --replay-all]
+def dead_letters_cli(argv: list) -> int:
+    parser = argparse.ArgumentParser(prog="main.py dead-letters",
+                                     description="List dead-lettered orders, or replay them")
+    parser.add_argument("--replay", type=int, nargs="+", metavar="ID", help="Replay these dead letters")
+    parser.add_argument("--replay-all", action="store_true", help="Replay every dead letter not replayed yet")
+    parser.add_argument("--limit", type=int, default=50, help="Rows to list")
+    args = parser.parse_args(argv)
+
+    if not args.replay and not args.replay_all:
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id, order_id, attempts, failed_at, error FROM order_dead_letters
+                    WHERE replayed_at IS NULL ORDER BY id DESC LIMIT %s
+                """, (args.limit,))
+                rows = cur.fetchall()
+            conn.rollback()
+        for dead_letter_id, order_id, attempts, failed_at, error in rows:
+            print(f"{dead_letter_id:>8}  {order_id or '-':<38} {attempts:>3} attempt(s)  "
+                  f"{failed_at:%Y-%m-%d %H:%M:%S}  {(error or '')[:80]}")
+        print(f"{len(rows)} dead letter(s) waiting for replay")
+        return 0
+
+    replayed, skipped, requeue = 0, 0, []
+    reopened = Counter()  # warehouse_id -> orders back to PENDING
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, order_id, payload FROM order_dead_letters
+                WHERE replayed_at IS NULL AND (%s OR id = ANY(%s))
+                ORDER BY id
+                FOR UPDATE SKIP LOCKED
+            """, (args.replay_all, args.replay or []))
+            for dead_letter_id, order_id, payload in cur.fetchall():
+                if not order_id:
+                    print(f"⚠️ {dead_letter_id}: no order_id in the payload, cannot replay")
+                    skipped += 1
+                    continue
+                # Back to PENDING: a table-mode worker claims it (woken by the NOTIFY), queue
+                # consumers get it from the retry set once this commits
+                cur.execute("UPDATE orders SET status = 'PENDING', next_attempt_at = NULL "
+                            "WHERE order_id = %s AND status = 'FAILED' "
+                            "RETURNING customer_id, warehouse_id", (order_id,))
+                row = cur.fetchone()
+                if row:
+                    notify_order_status(cur, order_id, row[0], row[1], 'PENDING')
+                    requeue.append(json.loads(payload))
+                    reopened[row[1]] += 1
+                else:
+                    print(f"⚠️ {dead_letter_id}: order {order_id} is no longer FAILED, marking replayed")
+                cur.execute("UPDATE order_dead_letters SET replayed_at = %s WHERE id = %s",
+                            (datetime.utcnow(), dead_letter_id))
+                replayed += 1
+        conn.commit()
+    # Counted as REPLAYED, not PENDING, so open_orders sees them open again (order-service/order_stats.py)
+    for warehouse_id, count in reopened.items():
+        record_order_status(warehouse_id, 'REPLAYED', count=count)
+
+    if QUEUE_BACKEND != "table":
+        if retry_scheduler is None:
+            print("❌ Redis not available - replayed orders are PENDING but not queued")
+            return 1
+        for order in requeue:
+            retry_scheduler.schedule(order, attempt=0, delay=0)
+    print(f"✅ Replayed {replayed} dead letter(s), {len(requeue)} order(s) back to PENDING, {skipped} skipped")
+    return 0
+
+
+# Inventory reconciliation - python main.py reconcile-inventory [--source redis|postgres] [--dry-run]
+def reconcile_inventory_cli(argv: list) -> int:
+    parser = argparse.ArgumentParser(prog="main.py reconcile-inventory",
+                                     description="Repair drift between the Postgres inventory table and Redis stock")
+    parser.add_argument("--source", choices=["redis", "postgres"], default="redis",
+                        help="The side to trust: redis (live stock, repairs Postgres) or postgres (restores Redis)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the differences")
+    parser.add_argument("--max-keys-per-second", type=float, default=INVENTORY_MAX_KEYS_PER_SECOND,
+                        help="Redis keys examined per second (0 = unthrottled)")
+    args = parser.parse_args(argv)
+
+    if not redis_client:
+        print("❌ Redis not available")
+        return 1
+    reconciler = InventoryReconciler(
+        redis_client,
+        db_connection,
+        warehouse_pattern=INVENTORY_WAREHOUSE_PATTERN,
+        scan_count=INVENTORY_SCAN_COUNT,
+        max_keys_per_second=args.max_keys_per_second,
+        batch_size=INVENTORY_BATCH_SIZE
+    )
+    try:
+        result = reconciler.run(source=args.source, dry_run=args.dry_run)
+    except psycopg2.errors.UndefinedTable as e:
+        print(f"❌ {str(e).strip().splitlines()[0]} - create it with the seed script "
+              f"(seed.py, seed_aws.py or local/seed_local.py)")
+        return 1
+    except (psycopg2.OperationalError, redis.RedisError) as e:
+        print(f"❌ Reconciliation failed: {e}")
+        return 1
+    print(f"{'🔍' if args.dry_run else '✅'} {result['mismatched_warehouses']} of {result['warehouses']} "
+          f"warehouse(s) differ, {result['differences']} item(s) - {result['repaired']} repaired from "
+          f"{args.source} in {result['seconds']:g}s ({result['keys_scanned']} Redis keys read)")
+    if result["skipped_warehouses"]:
+        print(f"⚠️ {result['skipped_warehouses']} warehouse(s) missing from {args.source} were left alone")
+    if result["changed_meanwhile"]:
+        print(f"⚠️ {result['changed_meanwhile']} key(s) changed in Redis during the run - run again to recheck them")
+    return 0
 
 
 # Entrypoint
 if __name__ == "__main__":
-    if ENV == "local":
-        poll_database_forever()
-    else:
-        poll_sqs_forever()
+    if len(sys.argv) > 1 and sys.argv[1] == "dead-letters":
+        sys.exit(dead_letters_cli(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "reconcile-inventory":
+        sys.exit(reconcile_inventory_cli(sys.argv[2:]))
+    drained = poll_database_forever() if QUEUE_BACKEND == "table" else poll_queue_forever()
+    if not drained:
+        # Batches still running are abandoned: their transactions roll back with the
+        # connection and the orders come back through the queue (or stay PENDING)
+        logging.warning("Drain deadline passed - exiting with orders in flight")
+        logging.shutdown()
+        os._exit(1)
+    logging.info("Drained - exiting")
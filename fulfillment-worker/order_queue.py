@@ -0,0 +1,332 @@
+"""
+Order queue backends for the fulfillment worker.
+
+QueueConsumer (main.py) talks to a queue only through these calls, so the
+production pipeline - batched receives, lanes, batched acks, retries - runs
+unchanged on every backend:
+
+  send(entries)        entries are (id, body); returns the ids accepted
+  receive(max, wait)   up to `max` QueueMessages, long-polling up to `wait` seconds
+  ack(receipts)        done with these messages; returns how many were acked
+  extend(receipts, s)  keep these messages invisible for `s` more seconds (the
+                       heartbeat for slow batches); 0 makes them visible again now
+  depth()              {"visible", "in_flight", "oldest_age_seconds"} - the backlog,
+                       for the worker's metrics (oldest age None if not known)
+
+Backends (QUEUE_BACKEND):
+
+  sqs     Amazon SQS (production). FIFO queues get one message group per
+          warehouse.
+  redis   a Redis Stream with a consumer group - local runs and CI. A message
+          that is not acked within `visibility_timeout` is reclaimed by the
+          next receive (XAUTOCLAIM), like an SQS redelivery; after
+          `max_deliveries` it moves to the dead-letter stream, like the SQS
+          redrive policy.
+  memory  in-process, for benchmarks and tests - same visibility timeout.
+
+The message format must match order-service/order_queue.py.
+"""
+
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+import redis
+
+STREAM_KEY = "orders:queue"
+STREAM_GROUP = "fulfillment"
+STREAM_BODY_FIELD = "body"
+
+
+class QueueMessage(NamedTuple):
+    message_id: str
+    body: str
+    receipt: str  # what ack() takes: the SQS receipt handle, the stream entry id
+
+
+class SqsQueue:
+    """Amazon SQS through a boto3 client (or anything with the same call shapes)"""
+
+    name = "sqs"
+    MAX_BATCH = 10  # receive_message / *_batch calls take at most 10 entries
+
+    def __init__(self, client, queue_url: str):
+        self.client = client
+        self.queue_url = queue_url
+        self.fifo = queue_url.endswith(".fifo")
+
+    def send(self, entries: list) -> list:
+        accepted = []
+        for start in range(0, len(entries), self.MAX_BATCH):
+            batch = {str(entry_id): body for entry_id, body in entries[start:start + self.MAX_BATCH]}
+            response = self.client.send_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[self._entry(entry_id, body) for entry_id, body in batch.items()]
+            )
+            accepted.extend(entry["Id"] for entry in response.get("Successful", []))
+        return accepted
+
+    def _entry(self, entry_id: str, body: str) -> dict:
+        entry = {"Id": entry_id, "MessageBody": body}
+        if self.fifo:
+            # One message group per warehouse (same as order-service)
+            message = json.loads(body)
+            entry["MessageGroupId"] = message.get("warehouse_id") or "none"
+            entry["MessageDeduplicationId"] = message["order_id"]
+        return entry
+
+    def receive(self, max_messages: int, wait_seconds: float) -> list:
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, self.MAX_BATCH),
+            WaitTimeSeconds=int(wait_seconds)
+        )
+        return [QueueMessage(message.get("MessageId"), message["Body"], message["ReceiptHandle"])
+                for message in response.get("Messages", [])]
+
+    def ack(self, receipts: list) -> int:
+        acked = 0
+        for start in range(0, len(receipts), self.MAX_BATCH):
+            batch = receipts[start:start + self.MAX_BATCH]
+            response = self.client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{"Id": str(i), "ReceiptHandle": receipt} for i, receipt in enumerate(batch)]
+            )
+            acked += len(batch) - len(response.get("Failed", []))
+        return acked
+
+    def extend(self, receipts: list, seconds: float) -> int:
+        extended = 0
+        for start in range(0, len(receipts), self.MAX_BATCH):
+            batch = receipts[start:start + self.MAX_BATCH]
+            response = self.client.change_message_visibility_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{"Id": str(i), "ReceiptHandle": receipt, "VisibilityTimeout": int(seconds)}
+                         for i, receipt in enumerate(batch)]
+            )
+            extended += len(batch) - len(response.get("Failed", []))
+        return extended
+
+    def depth(self) -> dict:
+        # Approximate, like everything SQS counts. The oldest message's age is a
+        # CloudWatch metric (ApproximateAgeOfOldestMessage), not a queue attribute
+        attributes = self.client.get_queue_attributes(
+            QueueUrl=self.queue_url,
+            AttributeNames=["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible"]
+        )["Attributes"]
+        return {
+            "visible": int(attributes.get("ApproximateNumberOfMessages", 0)),
+            "in_flight": int(attributes.get("ApproximateNumberOfMessagesNotVisible", 0)),
+            "oldest_age_seconds": None,
+        }
+
+
+class RedisStreamQueue:
+    """
+    A Redis Stream read through one consumer group: every worker process is a
+    consumer, so each message goes to one of them. Acked entries are deleted,
+    so the stream only holds messages not yet done.
+    """
+
+    name = "redis"
+
+    def __init__(self, redis_client, key: str = STREAM_KEY, group: str = STREAM_GROUP,
+                 consumer: str = None, visibility_timeout: float = 30, max_deliveries: int = 3,
+                 max_length: int = 1_000_000):
+        self.redis = redis_client
+        self.key = key
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.visibility_timeout = visibility_timeout
+        self.max_deliveries = max_deliveries
+        self.max_length = max_length
+        self.dead_letter_key = f"{key}:dlq"
+        self._group_ready = False
+
+        # Metrics
+        self.reclaimed = 0
+        self.dead_lettered = 0
+
+    def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            # From the start of the stream: messages sent before the first worker ran are not skipped
+            self.redis.xgroup_create(self.key, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    def send(self, entries: list) -> list:
+        pipe = self.redis.pipeline(transaction=False)
+        for _, body in entries:
+            pipe.xadd(self.key, {STREAM_BODY_FIELD: body}, maxlen=self.max_length, approximate=True)
+        results = pipe.execute(raise_on_error=False)
+        return [str(entry_id) for (entry_id, _), result in zip(entries, results)
+                if not isinstance(result, Exception)]
+
+    def receive(self, max_messages: int, wait_seconds: float) -> list:
+        self._ensure_group()
+        # Messages another consumer took but never acked (it died, or gave up) come first
+        messages = self._reclaim(max_messages)
+        if messages:
+            return messages
+        response = self.redis.xreadgroup(self.group, self.consumer, {self.key: ">"}, count=max_messages,
+                                         block=max(1, int(wait_seconds * 1000)))
+        return [self._message(entry_id, fields) for _, entries in response or [] for entry_id, fields in entries]
+
+    def _reclaim(self, max_messages: int) -> list:
+        result = self.redis.xautoclaim(self.key, self.group, self.consumer,
+                                       min_idle_time=int(self.visibility_timeout * 1000),
+                                       start_id="0-0", count=max_messages)
+        # Entries deleted while pending come back without fields (Redis 6.2)
+        entries = [(entry_id, fields) for entry_id, fields in result[1] if fields]
+        if not entries:
+            return []
+        deliveries = {
+            pending["message_id"]: pending["times_delivered"]
+            for pending in self.redis.xpending_range(self.key, self.group, min=entries[0][0],
+                                                     max=entries[-1][0], count=len(entries) * 2)
+        }
+        messages, dead = [], []
+        for entry_id, fields in entries:
+            if deliveries.get(entry_id, 0) > self.max_deliveries:
+                dead.append((entry_id, fields))
+            else:
+                messages.append(self._message(entry_id, fields))
+        if dead:
+            pipe = self.redis.pipeline(transaction=False)
+            for entry_id, fields in dead:
+                pipe.xadd(self.dead_letter_key, dict(fields, source_id=entry_id), maxlen=self.max_length,
+                          approximate=True)
+            self._ack(pipe, [entry_id for entry_id, _ in dead])
+            pipe.execute()
+            self.dead_lettered += len(dead)
+        self.reclaimed += len(messages)
+        return messages
+
+    def _message(self, entry_id: str, fields: dict) -> QueueMessage:
+        return QueueMessage(entry_id, fields.get(STREAM_BODY_FIELD, ""), entry_id)
+
+    def _ack(self, pipe, entry_ids: list):
+        pipe.xack(self.key, self.group, *entry_ids)
+        pipe.xdel(self.key, *entry_ids)
+
+    def ack(self, receipts: list) -> int:
+        if not receipts:
+            return 0
+        pipe = self.redis.pipeline(transaction=False)
+        self._ack(pipe, receipts)
+        acked, _ = pipe.execute()
+        return acked
+
+    def extend(self, receipts: list, seconds: float) -> int:
+        # Re-claiming resets the entry's idle time; IDLE backdates it so it is
+        # reclaimable in `seconds`. JUSTID leaves the delivery count alone.
+        if not receipts:
+            return 0
+        idle = max(0, int((self.visibility_timeout - seconds) * 1000))
+        return len(self.redis.xclaim(self.key, self.group, self.consumer, min_idle_time=0,
+                                     message_ids=receipts, idle=idle, justid=True))
+
+    def depth(self) -> dict:
+        # Acked entries are deleted, so every entry is either waiting or pending
+        # (delivered, not acked); the oldest entry's id is its XADD time in ms
+        self._ensure_group()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xlen(self.key)
+        pipe.xpending(self.key, self.group)
+        pipe.xrange(self.key, count=1)
+        length, pending, oldest = pipe.execute()
+        in_flight = pending["pending"] if pending else 0
+        oldest_age = 0.0
+        if oldest:
+            added_ms = int(oldest[0][0].split("-")[0])
+            oldest_age = round(max(0.0, time.time() - added_ms / 1000), 3)
+        return {"visible": max(0, length - in_flight), "in_flight": in_flight,
+                "oldest_age_seconds": oldest_age}
+
+
+class MemoryQueue:
+    """In-process queue with the same visibility-timeout semantics, for benchmarks and tests"""
+
+    name = "memory"
+
+    def __init__(self, visibility_timeout: float = 30, max_deliveries: int = 3):
+        self.visibility_timeout = visibility_timeout
+        self.max_deliveries = max_deliveries
+        self._ids = itertools.count(1)
+        self._messages = deque()  # (message_id, body, deliveries, sent at)
+        self._in_flight = {}  # receipt -> (message_id, body, deliveries, sent at, visible again at)
+        self._cond = threading.Condition()
+        self.dead_letters = []
+
+    def send(self, entries: list) -> list:
+        with self._cond:
+            for _, body in entries:
+                self._messages.append((str(next(self._ids)), body, 0, time.time()))
+            self._cond.notify_all()
+        return [str(entry_id) for entry_id, _ in entries]
+
+    def _requeue_expired(self):
+        now = time.monotonic()
+        expired = [receipt for receipt, (*_, visible_at) in self._in_flight.items() if visible_at <= now]
+        for receipt in expired:
+            message_id, body, deliveries, sent_at, _ = self._in_flight.pop(receipt)
+            if deliveries >= self.max_deliveries:
+                self.dead_letters.append(body)
+            else:
+                self._messages.appendleft((message_id, body, deliveries, sent_at))
+
+    def receive(self, max_messages: int, wait_seconds: float) -> list:
+        deadline = time.monotonic() + wait_seconds
+        with self._cond:
+            while True:
+                self._requeue_expired()
+                if self._messages:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                # Wake up for sends, and for in-flight messages whose timeout runs out
+                self._cond.wait(min(remaining, self.visibility_timeout))
+            messages = []
+            while self._messages and len(messages) < max_messages:
+                message_id, body, deliveries, sent_at = self._messages.popleft()
+                receipt = f"{message_id}:{deliveries + 1}"
+                self._in_flight[receipt] = (message_id, body, deliveries + 1, sent_at,
+                                            time.monotonic() + self.visibility_timeout)
+                messages.append(QueueMessage(message_id, body, receipt))
+            return messages
+
+    def ack(self, receipts: list) -> int:
+        with self._cond:
+            return sum(self._in_flight.pop(receipt, None) is not None for receipt in receipts)
+
+    def extend(self, receipts: list, seconds: float) -> int:
+        with self._cond:
+            extended = 0
+            for receipt in receipts:
+                if receipt in self._in_flight:
+                    message_id, body, deliveries, sent_at, _ = self._in_flight[receipt]
+                    self._in_flight[receipt] = (message_id, body, deliveries, sent_at, time.monotonic() + seconds)
+                    extended += 1
+            self._cond.notify_all()
+            return extended
+
+    def depth(self) -> dict:
+        with self._cond:
+            self._requeue_expired()
+            sent = [message[3] for message in self._messages] + [message[3] for message in self._in_flight.values()]
+            return {"visible": len(self._messages), "in_flight": len(self._in_flight),
+                    "oldest_age_seconds": round(max(0.0, time.time() - min(sent)), 3) if sent else 0.0}
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._messages) + len(self._in_flight)
@@ -0,0 +1,114 @@
+"""
+Delayed retries for orders that failed with a transient error.
+
+A failed order is classified first: lost database / Redis connections, an
+exhausted connection pool, deadlocks, serialization failures and timeouts are
+transient and worth retrying; anything else (bad payload, constraint
+violation, a bug) is permanent and goes straight to the dead-letter table.
+
+Transient failures are parked in ONE Redis sorted set scored by due time,
+with exponential backoff and jitter between attempts, instead of being
+redelivered by SQS after its visibility timeout or re-claimed in a tight
+loop. A single poller per worker leases due orders in small batches and feeds
+them back through the normal handler; a leased order reappears after
+`lease` seconds if the worker dies before finishing it.
+"""
+
+import json
+import random
+import time
+
+import psycopg2
+import psycopg2.pool
+import redis
+
+RETRY_KEY = "orders:retry"
+
+# KEYS: retry set. ARGV: now, lease until, max orders.
+# Pushes the due members' scores out to the lease deadline and returns them.
+LEASE_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[3]))
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], 'XX', ARGV[2], member)
+end
+return due
+"""
+
+
+class TransientError(Exception):
+    """A failure that may go away on its own - the order is retried later"""
+
+
+class PermanentError(Exception):
+    """A failure retrying cannot fix - the order is dead-lettered"""
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, PermanentError):
+        return False
+    # OperationalError covers lost connections, deadlocks / serialization
+    # failures (TransactionRollbackError) and statement / lock timeouts;
+    # PoolError is an exhausted connection pool, which frees up on its own
+    return isinstance(error, (
+        TransientError,
+        psycopg2.OperationalError,
+        psycopg2.InterfaceError,
+        psycopg2.pool.PoolError,
+        redis.RedisError,
+        ConnectionError,
+        TimeoutError,
+    ))
+
+
+class RetryScheduler:
+    def __init__(self, redis_client, base_delay: float = 1.0, max_delay: float = 300.0,
+                 max_attempts: int = 5, key: str = RETRY_KEY):
+        self.redis = redis_client
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.key = key
+        self._lease_script = redis_client.register_script(LEASE_DUE_SCRIPT)
+
+        # Metrics
+        self.scheduled = 0
+        self.leased = 0
+        self.finished = 0
+
+    def delay(self, attempt: int) -> float:
+        """Backoff before retry number `attempt` (1-based): half of the capped exponential delay, plus up to half again at random"""
+        capped = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return capped / 2 + random.uniform(0, capped / 2)
+
+    def schedule(self, order: dict, attempt: int, delay: float = None) -> float:
+        """
+        Park `order` for retry number `attempt`; the attempt travels with the
+        order as "retry_attempt". Returns the delay in seconds; raises RedisError.
+        """
+        delay = self.delay(attempt) if delay is None else delay
+        member = json.dumps(dict(order, retry_attempt=attempt), sort_keys=True)
+        self.redis.zadd(self.key, {member: time.time() + delay})
+        self.scheduled += 1
+        return delay
+
+    def lease_due(self, limit: int, lease: float) -> list:
+        """Up to `limit` orders whose retry is due, as (member, order); call finish(members) once handled"""
+        now = time.time()
+        members = self._lease_script(keys=[self.key], args=[now, now + lease, limit])
+        self.leased += len(members)
+        return [(member, json.loads(member)) for member in members]
+
+    def finish(self, members: list):
+        if members:
+            self.redis.zrem(self.key, *members)
+            self.finished += len(members)
+
+    def stats(self) -> dict:
+        return {
+            "base_delay": self.base_delay,
+            "max_delay": self.max_delay,
+            "max_attempts": self.max_attempts,
+            "scheduled": self.scheduled,
+            "leased": self.leased,
+            "finished": self.finished,
+        }
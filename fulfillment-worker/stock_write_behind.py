@@ -0,0 +1,177 @@
+"""
+Write-behind of Redis stock to the Postgres inventory table.
+
+Stock is only ever written to Redis - availability-service's update_stock and
+the worker's apply / release scripts - and those writes stay one Redis round
+trip. Each of them also does `ZADD NX` of the stock key into STOCK_DIRTY_KEY,
+scored by the time of the key's first change not yet in Postgres. That
+coalesces the changes per key: however often a key changes between two
+flushes it is one member, and the flush writes its value at that moment. The
+set holds at most one member per stock key, and a flusher holds at most
+`batch_size` keys in memory.
+
+The flusher (StockWriteBehind.run, one thread per worker process) wakes every
+`interval` seconds; the process holding STOCK_FLUSH_LOCK_KEY moves up to
+`batch_size` keys from the dirty set to STOCK_FLUSHING_KEY (scores kept),
+MGETs their values, upserts them in one statement and drops them from the
+flushing set once that committed. A key changed after it was taken is back in
+the dirty set for the next batch. A flusher that dies mid-flush leaves its keys
+in the flushing set, and the next lock holder puts them back - a crash means a
+key is written twice, never that a change is lost.
+
+Durability lag is the age of the oldest score in either set: how far Postgres
+is behind Redis, and what a Redis failover or flush would lose (the inventory
+reconciliation job, inventory_reconcile.py, repairs anything older).
+"""
+
+import logging
+import time
+import uuid
+
+import psycopg2.errors
+from psycopg2.extras import execute_values
+
+from inventory_reconcile import DELETE_SQL, UPSERT_SQL, parse_stock
+
+# Key layout must match availability-service/main.py
+STOCK_DIRTY_KEY = "stock:dirty"
+STOCK_FLUSHING_KEY = "stock:dirty:flushing"
+STOCK_FLUSH_LOCK_KEY = "stock:dirty:lock"
+
+# KEYS: dirty set, flushing set. ARGV: max keys.
+# Moves the oldest dirty keys to the flushing set; returns [key, score, ...].
+TAKE_SCRIPT = """
+local taken = redis.call('ZRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1, 'WITHSCORES')
+for i = 1, #taken, 2 do
+    redis.call('ZADD', KEYS[2], taken[i + 1], taken[i])
+    redis.call('ZREM', KEYS[1], taken[i])
+end
+return taken
+"""
+
+# KEYS: dirty set, flushing set. Puts a dead flusher's keys back, keeping the older score.
+RESTORE_SCRIPT = """
+local flushing = redis.call('ZRANGE', KEYS[2], 0, -1, 'WITHSCORES')
+for i = 1, #flushing, 2 do
+    local dirty = redis.call('ZSCORE', KEYS[1], flushing[i])
+    if not dirty or tonumber(dirty) > tonumber(flushing[i + 1]) then
+        redis.call('ZADD', KEYS[1], flushing[i + 1], flushing[i])
+    end
+end
+redis.call('DEL', KEYS[2])
+return #flushing / 2
+"""
+
+# KEYS: lock. ARGV: token, milliseconds (0 = release). Only the holder extends or releases it.
+LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if tonumber(ARGV[2]) > 0 then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return redis.call('DEL', KEYS[1])
+"""
+
+
+class StockWriteBehind:
+    def __init__(self, redis_client, db_connection, interval: float = 0.25, batch_size: int = 1000,
+                 max_keys: int = 50_000, lock_timeout: float = 30):
+        """db_connection: a context manager giving a Postgres connection (main.db_connection)"""
+        self.redis = redis_client
+        self.db_connection = db_connection
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_keys = max_keys  # per flush, so the lock is given up now and then
+        self.lock_timeout = lock_timeout
+        self._take = redis_client.register_script(TAKE_SCRIPT)
+        self._restore = redis_client.register_script(RESTORE_SCRIPT)
+        self._lock = redis_client.register_script(LOCK_SCRIPT)
+        self.flushes = 0
+        self.keys_flushed = 0
+        self.errors = 0
+
+    def flush(self) -> int:
+        """Write the dirty keys' values to Postgres; returns how many (0 if another process is flushing)"""
+        token = uuid.uuid4().hex
+        lock_ms = int(self.lock_timeout * 1000)
+        if not self.redis.set(STOCK_FLUSH_LOCK_KEY, token, nx=True, px=lock_ms):
+            return 0
+        try:
+            restored = self._restore(keys=[STOCK_DIRTY_KEY, STOCK_FLUSHING_KEY])
+            if restored:
+                logging.warning(f"Re-flushing {restored} stock key(s) left by an interrupted flush")
+            flushed = 0
+            while flushed < self.max_keys:
+                taken = self._take(keys=[STOCK_DIRTY_KEY, STOCK_FLUSHING_KEY], args=[self.batch_size])
+                if not taken:
+                    break
+                keys = taken[0::2]
+                self._write(keys, self.redis.mget(keys))
+                self.redis.zrem(STOCK_FLUSHING_KEY, *keys)
+                self._lock(keys=[STOCK_FLUSH_LOCK_KEY], args=[token, lock_ms])
+                flushed += len(keys)
+                self.keys_flushed += len(keys)
+                # Dirty set drained: keys changed from here on wait for the next flush, coalescing meanwhile
+                if len(keys) < self.batch_size:
+                    break
+            if flushed:
+                self.flushes += 1
+            return flushed
+        finally:
+            self._lock(keys=[STOCK_FLUSH_LOCK_KEY], args=[token, 0])
+
+    def _write(self, keys: list, values: list):
+        upserts, deletes = [], []
+        for key, value in zip(keys, values):
+            warehouse_id, _, item_id = key.partition(":")
+            stock = parse_stock(value)
+            if value is None:
+                deletes.append((warehouse_id, item_id))
+            elif stock is not None:
+                upserts.append((warehouse_id, item_id, stock))
+            else:
+                logging.warning(f"Stock key {key} holds {value!r}, not flushed")
+        with self.db_connection() as conn:
+            with conn.cursor() as cur:
+                if upserts:
+                    execute_values(cur, UPSERT_SQL, upserts, page_size=len(upserts))
+                if deletes:
+                    cur.execute(DELETE_SQL, ([row[0] for row in deletes], [row[1] for row in deletes]))
+            conn.commit()
+
+    def run(self, stop_event):
+        """Flush every `interval` seconds until stop_event is set, then once more"""
+        while True:
+            stopping = stop_event.wait(self.interval)
+            try:
+                self.flush()
+            except psycopg2.errors.UndefinedTable as e:
+                # Not something the next flush fixes (a database seeded without the table): stop
+                # once, instead of failing every interval; the keys wait in Redis for a restart
+                self.errors += 1
+                logging.warning(f"Stock write-behind off until restarted - {str(e).strip()}")
+                return
+            except Exception as e:
+                # Keys stay in the flushing set and are put back by the next flush
+                self.errors += 1
+                logging.warning(f"Stock flush failed: {e}")
+            if stopping:
+                return
+
+    def lag(self) -> dict:
+        """Stock keys changed in Redis and not yet in Postgres, and the age of the oldest change"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zcard(STOCK_DIRTY_KEY)
+        pipe.zcard(STOCK_FLUSHING_KEY)
+        pipe.zrange(STOCK_DIRTY_KEY, 0, 0, withscores=True)
+        pipe.zrange(STOCK_FLUSHING_KEY, 0, 0, withscores=True)
+        dirty, flushing, oldest_dirty, oldest_flushing = pipe.execute()
+        oldest = min([score for _, score in oldest_dirty + oldest_flushing], default=None)
+        return {
+            "unflushed_keys": dirty + flushing,
+            "durability_lag_seconds": round(max(0.0, time.time() - oldest), 3) if oldest is not None else 0.0,
+        }
+
+    def stats(self) -> dict:
+        return {"flushes": self.flushes, "keys_flushed": self.keys_flushed, "errors": self.errors}
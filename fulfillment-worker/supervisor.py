@@ -0,0 +1,312 @@
+"""
+Fulfillment worker supervisor - one container, all of its CPUs.
+
+main.py is a single Python process, so the GIL keeps it on one core however
+many batches it runs in parallel. The supervisor (the container's CMD) starts
+WORKER_PROCESSES copies of main.py - by default one per CPU the container may
+use (its cgroup CPU quota, i.e. the k8s limit, else its CPU affinity):
+
+  - every child gets the container's environment, so the config is shared;
+    each also gets WORKER_PROCESS_INDEX and its own metrics port on 127.0.0.1
+  - a child that exits is started again after a backoff: WORKER_RESTART_BASE_DELAY,
+    doubling per crash up to WORKER_RESTART_MAX_DELAY, back to the base once a
+    child has stayed up WORKER_RESTART_RESET seconds
+  - /metrics and /stats on WORKER_METRICS_PORT add the children's metrics up
+    (see worker_metrics.merge_metrics), plus processes alive and restarts
+  - SIGTERM / SIGINT is passed on to every child, which drains as usual
+    (WORKER_DRAIN_TIMEOUT); children still running WORKER_KILL_GRACE seconds
+    after that are killed
+
+The children coordinate the way separate pods do - consumer group / SQS
+visibility, SKIP LOCKED claims and lane advisory locks in table mode - so
+nothing else changes. Each child opens up to max(WORKER_CONCURRENCY,
+WORKER_LANES) + 4 Postgres connections: its DB pool (batch slots / lanes, the
+retry poller and the stock flusher), the metrics connection and the LISTEN
+connection. "auto" starts no more children than WORKER_DB_MAX_CONNECTIONS
+allows; an explicit WORKER_PROCESSES over it only gets a warning.
+
+  python supervisor.py
+  WORKER_PROCESSES=4 python supervisor.py
+"""
+
+import json
+import logging
+import math
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from worker_metrics import merge_metrics, serve_metrics
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] [supervisor] %(message)s"
+)
+
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+# Processes: a number, or "auto" = the CPUs the container may use
+WORKER_PROCESSES = os.environ.get("WORKER_PROCESSES", "auto")
+
+# Postgres connections all children together may open (0 = no limit) - keep it
+# below max_connections minus what order-service and the other pods need
+WORKER_DB_MAX_CONNECTIONS = int(os.environ.get("WORKER_DB_MAX_CONNECTIONS", "40"))
+
+# Crashed children come back after WORKER_RESTART_BASE_DELAY, doubling per crash up to
+# WORKER_RESTART_MAX_DELAY; a child that stayed up WORKER_RESTART_RESET seconds starts over
+WORKER_RESTART_BASE_DELAY = float(os.environ.get("WORKER_RESTART_BASE_DELAY", "1"))
+WORKER_RESTART_MAX_DELAY = float(os.environ.get("WORKER_RESTART_MAX_DELAY", "60"))
+WORKER_RESTART_RESET = float(os.environ.get("WORKER_RESTART_RESET", "60"))
+
+# Shutdown: children drain for WORKER_DRAIN_TIMEOUT (main.py), are killed WORKER_KILL_GRACE later
+WORKER_DRAIN_TIMEOUT = float(os.environ.get("WORKER_DRAIN_TIMEOUT", "25"))
+WORKER_KILL_GRACE = float(os.environ.get("WORKER_KILL_GRACE", "5"))
+
+# Metrics: the supervisor serves WORKER_METRICS_PORT, child i serves WORKER_METRICS_PORT + 1 + i on 127.0.0.1
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", "9100"))
+
+
+def cgroup_cpu_quota():
+    """The container's CPU limit in CPUs (cgroup v2, then v1), None if unlimited"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """CPUs this process may use - a limit of 300m still gets one process"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+
+def connections_per_process() -> int:
+    """Most Postgres connections one main.py opens, from the same settings it reads"""
+    concurrency = int(os.environ.get("WORKER_CONCURRENCY", "8"))
+    lanes = int(os.environ.get("WORKER_LANES", str(concurrency)))
+    # db_pool (slots / lanes + retry poller + stock flusher), metrics pool, LISTEN
+    return max(concurrency, lanes) + 2 + 1 + 1
+
+
+def process_count(setting: str, max_connections: int = 0) -> int:
+    per_process = connections_per_process()
+    if setting.strip().lower() in ("", "auto", "0"):
+        processes = available_cpus()
+        if max_connections and processes * per_process > max_connections:
+            fitting = max(1, max_connections // per_process)
+            logging.warning(
+                f"{processes} CPU(s) but {processes} x {per_process} connections > "
+                f"WORKER_DB_MAX_CONNECTIONS={max_connections} - starting {fitting} process(es)"
+            )
+            processes = fitting
+        return processes
+    processes = max(1, int(setting))
+    if max_connections and processes * per_process > max_connections:
+        logging.warning(
+            f"WORKER_PROCESSES={processes} may open {processes * per_process} Postgres connections, "
+            f"over WORKER_DB_MAX_CONNECTIONS={max_connections}"
+        )
+    return processes
+
+
+class Child:
+    """One main.py process and its restart state"""
+
+    def __init__(self, index: int, metrics_port: int):
+        self.index = index
+        self.metrics_port = metrics_port
+        self.proc = None
+        self.started_at = None
+        self.restart_at = 0.0
+        self.crashes = 0  # in a row - sets the backoff
+        self.backoff = 0.0  # before the last restart
+        self.restarts = 0
+        self.last_exit = None
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+
+class Supervisor:
+    def __init__(self, processes: int, command: list = None, env: dict = None, metrics_port: int = 0,
+                 base_delay: float = 1, max_delay: float = 60, reset_after: float = 60,
+                 drain_timeout: float = 25, kill_grace: float = 5):
+        self.command = command or [sys.executable, "-u", WORKER_PATH]
+        self.env = dict(env if env is not None else os.environ)
+        self.metrics_port = metrics_port
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.reset_after = reset_after
+        self.drain_timeout = drain_timeout
+        self.kill_grace = kill_grace
+        self.children = [Child(i, metrics_port + 1 + i if metrics_port else 0) for i in range(processes)]
+        self._lock = threading.Lock()
+        self._scrapes = ThreadPoolExecutor(max_workers=min(8, processes), thread_name_prefix="scrape")
+
+    def _start(self, child: Child):
+        env = dict(self.env,
+                   WORKER_PROCESS_INDEX=str(child.index),
+                   WORKER_METRICS_PORT=str(child.metrics_port),
+                   WORKER_METRICS_HOST="127.0.0.1")
+        child.proc = subprocess.Popen(self.command, env=env)
+        child.started_at = time.monotonic()
+        logging.info(f"Worker {child.index} started (pid {child.proc.pid})")
+
+    def start(self):
+        with self._lock:
+            for child in self.children:
+                self._start(child)
+
+    def check(self):
+        """Reap children that exited and start the ones whose backoff is over"""
+        now = time.monotonic()
+        with self._lock:
+            for child in self.children:
+                if child.proc is not None and child.proc.poll() is not None:
+                    child.last_exit = child.proc.returncode
+                    uptime = now - child.started_at
+                    child.crashes = 1 if uptime >= self.reset_after else child.crashes + 1
+                    delay = min(self.max_delay, self.base_delay * 2 ** (child.crashes - 1))
+                    logging.warning(f"Worker {child.index} (pid {child.proc.pid}) exited with {child.last_exit} "
+                                    f"after {uptime:.1f}s - restarting in {delay:g}s")
+                    child.proc = None
+                    child.backoff = delay
+                    child.restart_at = now + delay
+                if child.proc is None and now >= child.restart_at:
+                    self._start(child)
+                    child.restarts += 1
+
+    def run(self, stop_event: threading.Event) -> bool:
+        """Keep the children running until stop_event is set, then drain them; True if all drained"""
+        self.start()
+        while not stop_event.wait(0.5):
+            self.check()
+        return self.stop()
+
+    def stop(self) -> bool:
+        with self._lock:
+            running = [child for child in self.children if child.alive]
+            for child in running:
+                child.proc.send_signal(signal.SIGTERM)
+            deadline = time.monotonic() + self.drain_timeout + self.kill_grace
+            drained = True
+            for child in running:
+                try:
+                    child.proc.wait(max(0, deadline - time.monotonic()))
+                except subprocess.TimeoutExpired:
+                    logging.error(f"Worker {child.index} (pid {child.proc.pid}) still running - killing it")
+                    child.proc.kill()
+                    child.proc.wait()
+                child.last_exit = child.proc.returncode
+                # Killed by the SIGTERM itself: still starting up, its handler (set before it
+                # takes any order) was not installed yet - nothing was in flight
+                drained = drained and child.last_exit in (0, -signal.SIGTERM)
+        logging.info(f"Workers stopped (exit codes {[child.last_exit for child in running]})")
+        return drained
+
+    def _scrape(self, child: Child):
+        if not child.metrics_port or not child.alive:
+            return None
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{child.metrics_port}/stats", timeout=2) as response:
+                return json.loads(response.read())
+        except Exception as e:
+            logging.debug(f"Worker {child.index} metrics unavailable: {e}")
+            return None
+
+    def collect(self) -> dict:
+        """The children's metrics added up, plus process counts"""
+        snapshots = [snapshot for snapshot in self._scrapes.map(self._scrape, self.children) if snapshot]
+        metrics = merge_metrics(snapshots)
+        metrics["consumer"] = merge_counters([snapshot["consumer"] for snapshot in snapshots if "consumer" in snapshot])
+        metrics["supervisor"] = {
+            "processes": len(self.children),
+            "alive": sum(child.alive for child in self.children),
+            "restarts": sum(child.restarts for child in self.children),
+            "reporting": len(snapshots),
+        }
+        return metrics
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {"processes": [
+            {"index": child.index, "pid": child.proc.pid if child.proc else None, "alive": child.alive,
+             "uptime_seconds": round(now - child.started_at, 1) if child.alive else 0.0,
+             "restarts": child.restarts, "backoff_seconds": child.backoff, "last_exit": child.last_exit}
+            for child in self.children
+        ]}
+
+
+def merge_counters(stats: list) -> dict:
+    """Sum the children's QueueConsumer.stats(); ratios are averaged, labels taken from the first"""
+    merged = {}
+    for child_stats in stats:
+        for key, value in child_stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                merged.setdefault(key, value)
+            else:
+                merged[key] = merged.get(key, 0) + value
+    for key in merged:
+        if key.endswith("ratio") and stats:
+            merged[key] = round(merged[key] / len(stats), 4)
+    return merged
+
+
+def main() -> int:
+    processes = process_count(WORKER_PROCESSES, WORKER_DB_MAX_CONNECTIONS)
+    supervisor = Supervisor(
+        processes,
+        metrics_port=WORKER_METRICS_PORT,
+        base_delay=WORKER_RESTART_BASE_DELAY,
+        max_delay=WORKER_RESTART_MAX_DELAY,
+        reset_after=WORKER_RESTART_RESET,
+        drain_timeout=WORKER_DRAIN_TIMEOUT,
+        kill_grace=WORKER_KILL_GRACE
+    )
+    logging.info(f"Supervising {processes} worker process(es) ({available_cpus()} CPU(s) available)")
+
+    stop_event = threading.Event()
+
+    def stop(signum, frame):
+        logging.info(f"{signal.Signals(signum).name} received - draining {processes} worker(s)")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    if WORKER_METRICS_PORT:
+        try:
+            serve_metrics(supervisor.collect, WORKER_METRICS_PORT, stats=supervisor.stats)
+            logging.info(f"Metrics on :{WORKER_METRICS_PORT}/metrics")
+        except OSError as e:
+            logging.warning(f"Metrics server not started on :{WORKER_METRICS_PORT}: {e}")
+
+    drained = supervisor.run(stop_event)
+    logging.info("Drained - exiting" if drained else "Some workers did not drain")
+    return 0 if drained else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""
+Fixtures for the worker tests: fulfillment-worker/main.py imported against an
+in-process Redis (fakeredis, with lupa for the Lua scripts). No PostgreSQL is
+needed - the connection pool only connects when a connection is borrowed.
+
+  pip install -r requirements.txt -r requirements-test.txt
+  python -m pytest fulfillment-worker/tests
+"""
+
+import importlib.util
+import os
+import sys
+
+import fakeredis
+import pytest
+import redis
+
+WORKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+WORKER_PATH = os.path.join(WORKER_DIR, "main.py")
+sys.path.insert(0, WORKER_DIR)  # main.py and the tests import its sibling modules
+
+
+@pytest.fixture(scope="session")
+def worker():
+    """main.py with redis_client (and the scripts registered on it) backed by fakeredis"""
+    os.environ.setdefault("ENV", "local")
+    os.environ.setdefault("DB_HOST", "localhost")
+    os.environ["WORKER_METRICS_PORT"] = "0"
+    server = fakeredis.FakeServer()
+    real_redis = redis.Redis
+    redis.Redis = lambda *args, **kwargs: fakeredis.FakeRedis(server=server, decode_responses=True)
+    try:
+        spec = importlib.util.spec_from_file_location("fulfillment_worker", WORKER_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        redis.Redis = real_redis
+    return module
+
+
+@pytest.fixture(autouse=True)
+def flush_redis(worker):
+    worker.redis_client.flushall()
+    yield
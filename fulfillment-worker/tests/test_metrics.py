@@ -0,0 +1,22 @@
+"""
+The metrics' lag lookup (pending_orders) borrows from its own pool, never the lanes' db_pool.
+"""
+
+import pytest
+
+
+class Borrowed(Exception):
+    pass
+
+
+def test_pending_orders_does_not_use_the_lane_pool(worker, monkeypatch):
+    def borrow(name):
+        def getconn():
+            raise Borrowed(name)
+        return getconn
+
+    monkeypatch.setattr(worker.db_pool, "getconn", borrow("db_pool"))
+    monkeypatch.setattr(worker.metrics_db_pool, "getconn", borrow("metrics_db_pool"))
+
+    with pytest.raises(Borrowed, match="metrics_db_pool"):
+        worker.pending_orders()
@@ -0,0 +1,14 @@
+"""
+reconcile-inventory CLI: a database without the inventory table is an error message, not a traceback.
+"""
+
+import psycopg2.errors
+
+
+def test_missing_inventory_table(worker, monkeypatch, capsys):
+    def no_table(self, source="redis", dry_run=False):
+        raise psycopg2.errors.UndefinedTable('relation "inventory" does not exist\nLINE 4: FROM inventory')
+
+    monkeypatch.setattr(worker.InventoryReconciler, "run", no_table)
+    assert worker.reconcile_inventory_cli(["--dry-run"]) == 1
+    assert capsys.readouterr().out.startswith('❌ relation "inventory" does not exist - create it with the seed script')
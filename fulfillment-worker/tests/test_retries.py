@@ -0,0 +1,50 @@
+"""
+Failure routing (retry_or_fail): transient failures are parked on orders:retry,
+permanent ones are dead-lettered.
+"""
+
+import json
+
+import psycopg2
+import psycopg2.pool
+import pytest
+
+from retry_scheduler import PermanentError, RETRY_KEY, is_transient
+
+ORDER = {"order_id": "order-1", "customer_id": "customer-1", "warehouse_id": "wh_test",
+         "items": [{"item_id": "apple", "quantity": 1}]}
+
+
+@pytest.mark.parametrize("error, transient", [
+    (psycopg2.pool.PoolError("connection pool exhausted"), True),
+    (psycopg2.OperationalError("server closed the connection"), True),
+    (psycopg2.InterfaceError("connection already closed"), True),
+    (PermanentError("Invalid order payload"), False),
+    (psycopg2.IntegrityError("duplicate key"), False),
+    (ValueError("bug"), False),
+])
+def test_is_transient(error, transient):
+    assert is_transient(error) is transient
+
+
+def test_exhausted_pool_retries_the_order(worker, monkeypatch):
+    def exhausted():
+        raise psycopg2.pool.PoolError("connection pool exhausted")
+
+    dead_lettered = []
+    monkeypatch.setattr(worker.db_pool, "getconn", exhausted)
+    monkeypatch.setattr(worker, "fail_order", lambda *args: dead_lettered.append(args) or True)
+
+    assert worker.process_order(dict(ORDER)) is True
+    assert dead_lettered == []
+    parked = [json.loads(member) for member in worker.redis_client.zrange(RETRY_KEY, 0, -1)]
+    assert [(order["order_id"], order["retry_attempt"]) for order in parked] == [("order-1", 1)]
+
+
+def test_permanent_error_is_dead_lettered(worker, monkeypatch):
+    dead_lettered = []
+    monkeypatch.setattr(worker, "fail_order", lambda order, error, attempts: dead_lettered.append(order) or True)
+
+    assert worker.process_order(dict(ORDER, items=[])) is True
+    assert [order["order_id"] for order in dead_lettered] == ["order-1"]
+    assert worker.redis_client.zcard(RETRY_KEY) == 0
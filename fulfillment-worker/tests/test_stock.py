@@ -0,0 +1,105 @@
+"""
+Exactly-once stock decrement (STOCK_APPLY_SCRIPT / STOCK_RELEASE_SCRIPT and the
+applied-marker): an order's stock is taken once however often it is delivered,
+and given back once if it fails.
+"""
+
+import pytest
+
+WAREHOUSE = "wh_test"
+ITEMS = [{"item_id": "apple", "quantity": 2}, {"item_id": "milk", "quantity": 1}]
+INITIAL_STOCK = 10
+
+
+class Crash(BaseException):
+    """Simulated process death - not an Exception, so no handler in the worker catches it"""
+
+
+@pytest.fixture
+def stock(worker):
+    for item in ITEMS:
+        worker.redis_client.set(f"{WAREHOUSE}:{item['item_id']}", INITIAL_STOCK)
+
+    def taken() -> list:
+        return [INITIAL_STOCK - int(worker.redis_client.get(f"{WAREHOUSE}:{item['item_id']}")) for item in ITEMS]
+
+    return taken
+
+
+def marker(worker, order_id: str) -> dict:
+    return worker.redis_client.hgetall(worker.STOCK_APPLIED_KEY.format(order_id=order_id))
+
+
+def test_apply_takes_stock_and_records_it(worker, stock):
+    assert worker.apply_stock([("order-1", WAREHOUSE, ITEMS)]) == 1
+    assert stock() == [2, 1]
+    assert marker(worker, "order-1") == {"_": "1", f"{WAREHOUSE}:apple": "2", f"{WAREHOUSE}:milk": "1"}
+    assert worker.redis_client.ttl(worker.STOCK_APPLIED_KEY.format(order_id="order-1")) > 0
+
+
+def test_apply_twice_takes_stock_once(worker, stock):
+    assert worker.apply_stock([("order-1", WAREHOUSE, ITEMS)]) == 1
+    assert worker.apply_stock([("order-1", WAREHOUSE, ITEMS)]) == 0
+    assert stock() == [2, 1]
+
+
+def test_batch_with_an_already_applied_order(worker, stock):
+    worker.apply_stock([("order-1", WAREHOUSE, ITEMS)])
+    assert worker.apply_stock([("order-1", WAREHOUSE, ITEMS), ("order-2", WAREHOUSE, ITEMS)]) == 1
+    assert stock() == [4, 2]
+
+
+def test_redelivery_after_crash_between_apply_and_commit(worker, stock):
+    # First delivery: stock applied, then the worker dies before its transaction commits,
+    # so the order is still PENDING and the message is redelivered
+    def deliver(order_id: str):
+        worker.apply_stock([(order_id, WAREHOUSE, ITEMS)])
+        raise Crash()
+
+    with pytest.raises(Crash):
+        deliver("order-1")
+    assert stock() == [2, 1]
+
+    # Redelivery runs the whole order again - the marker makes the decrement a no-op
+    assert worker.apply_stock([("order-1", WAREHOUSE, ITEMS)]) == 0
+    assert stock() == [2, 1]
+
+
+def test_release_after_apply_gives_stock_back_once(worker, stock):
+    worker.apply_stock([("order-1", WAREHOUSE, ITEMS)])
+    worker.release_stock("order-1")
+    assert stock() == [0, 0]
+    assert marker(worker, "order-1") == {}
+
+    worker.release_stock("order-1")
+    assert stock() == [0, 0]
+
+
+def test_release_without_apply_is_a_no_op(worker, stock):
+    worker.release_stock("order-1")
+    assert stock() == [0, 0]
+    assert worker.redis_client.zcard(worker.STOCK_DIRTY_KEY) == 0
+
+
+def test_apply_never_goes_below_zero_and_skips_missing_keys(worker, stock):
+    worker.redis_client.set(f"{WAREHOUSE}:apple", 1)
+    items = ITEMS + [{"item_id": "unknown", "quantity": 5}]
+    assert worker.apply_stock([("order-1", WAREHOUSE, items)]) == 1
+    assert worker.redis_client.get(f"{WAREHOUSE}:apple") == "0"
+    assert worker.redis_client.get(f"{WAREHOUSE}:unknown") is None
+    assert marker(worker, "order-1") == {"_": "1", f"{WAREHOUSE}:apple": "1", f"{WAREHOUSE}:milk": "1"}
+
+    # Only what was taken comes back
+    worker.release_stock("order-1")
+    assert worker.redis_client.get(f"{WAREHOUSE}:apple") == "1"
+    assert stock()[1] == 0
+
+
+def test_apply_and_release_mark_keys_for_the_write_behind(worker, stock):
+    worker.apply_stock([("order-1", WAREHOUSE, ITEMS)])
+    dirty = dict(worker.redis_client.zrange(worker.STOCK_DIRTY_KEY, 0, -1, withscores=True))
+    assert set(dirty) == {f"{WAREHOUSE}:apple", f"{WAREHOUSE}:milk"}
+
+    # NX: the key keeps the time of its first change not yet flushed
+    worker.release_stock("order-1")
+    assert dict(worker.redis_client.zrange(worker.STOCK_DIRTY_KEY, 0, -1, withscores=True)) == dirty
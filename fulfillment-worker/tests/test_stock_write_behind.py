@@ -0,0 +1,71 @@
+"""
+Stock write-behind (stock_write_behind.py) with the Postgres write replaced by
+a recorder: what a flush takes from the dirty set, what survives a failed
+flush, and a database without the inventory table.
+"""
+
+import threading
+
+import psycopg2
+import psycopg2.errors
+import pytest
+
+from stock_write_behind import STOCK_DIRTY_KEY, STOCK_FLUSHING_KEY, StockWriteBehind
+
+
+@pytest.fixture
+def write_behind(worker):
+    flusher = StockWriteBehind(worker.redis_client, worker.db_connection, interval=0, batch_size=2)
+    flusher.written = []
+    flusher._write = lambda keys, values: flusher.written.extend(zip(keys, values))
+    return flusher
+
+
+def mark(worker, **stock):
+    for key, value in stock.items():
+        worker.redis_client.set(f"wh_test:{key}", value)
+        worker.redis_client.zadd(STOCK_DIRTY_KEY, {f"wh_test:{key}": 1}, nx=True)
+
+
+def test_flush_writes_every_dirty_key(worker, write_behind):
+    mark(worker, apple=5, milk=3, bread=0)
+    assert write_behind.flush() == 3
+    assert sorted(write_behind.written) == [("wh_test:apple", "5"), ("wh_test:bread", "0"), ("wh_test:milk", "3")]
+    assert write_behind.lag() == {"unflushed_keys": 0, "durability_lag_seconds": 0.0}
+
+
+def test_failed_flush_is_written_by_the_next_one(worker, write_behind):
+    mark(worker, apple=5)
+
+    def postgres_down(keys, values):
+        raise psycopg2.OperationalError("connection lost")
+
+    write = write_behind._write
+    write_behind._write = postgres_down
+    with pytest.raises(psycopg2.OperationalError):
+        write_behind.flush()
+    assert worker.redis_client.zrange(STOCK_FLUSHING_KEY, 0, -1) == ["wh_test:apple"]
+
+    write_behind._write = write
+    assert write_behind.flush() == 1
+    assert write_behind.written == [("wh_test:apple", "5")]
+    assert write_behind.lag()["unflushed_keys"] == 0
+
+
+def test_missing_inventory_table_stops_the_flusher_once(worker, write_behind, caplog):
+    mark(worker, apple=5)
+
+    def no_table(keys, values):
+        raise psycopg2.errors.UndefinedTable('relation "inventory" does not exist')
+
+    write_behind._write = no_table
+    thread = threading.Thread(target=write_behind.run, args=(threading.Event(),), daemon=True)
+    thread.start()
+    thread.join(2)
+
+    assert not thread.is_alive()
+    assert write_behind.errors == 1
+    assert [record.message for record in caplog.records if "write-behind off" in record.message] == [
+        'Stock write-behind off until restarted - relation "inventory" does not exist']
+    # The change is kept for the next flusher
+    assert write_behind.lag()["unflushed_keys"] == 1
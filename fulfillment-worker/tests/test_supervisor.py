@@ -0,0 +1,38 @@
+"""
+How many processes supervisor.py starts: "auto" follows the CPUs but stays
+within WORKER_DB_MAX_CONNECTIONS; an explicit count is kept.
+"""
+
+import pytest
+
+import supervisor
+
+
+@pytest.fixture(autouse=True)
+def worker_settings(monkeypatch):
+    monkeypatch.setenv("WORKER_CONCURRENCY", "8")
+    monkeypatch.delenv("WORKER_LANES", raising=False)
+
+
+def test_connections_per_process_follows_the_larger_of_slots_and_lanes(monkeypatch):
+    assert supervisor.connections_per_process() == 12
+    monkeypatch.setenv("WORKER_LANES", "16")
+    assert supervisor.connections_per_process() == 20
+
+
+def test_auto_starts_one_process_per_cpu_within_the_limit(monkeypatch):
+    monkeypatch.setattr(supervisor, "available_cpus", lambda: 2)
+    assert supervisor.process_count("auto", max_connections=40) == 2
+
+
+def test_auto_is_capped_by_the_connection_limit(monkeypatch, caplog):
+    monkeypatch.setattr(supervisor, "available_cpus", lambda: 16)
+    assert supervisor.process_count("auto", max_connections=40) == 3
+    assert supervisor.process_count("auto", max_connections=5) == 1
+    assert supervisor.process_count("auto", max_connections=0) == 16
+    assert "WORKER_DB_MAX_CONNECTIONS=40" in caplog.text
+
+
+def test_explicit_count_is_kept_with_a_warning(caplog):
+    assert supervisor.process_count("6", max_connections=40) == 6
+    assert "may open 72 Postgres connections" in caplog.text
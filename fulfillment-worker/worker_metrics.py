@@ -0,0 +1,357 @@
+"""
+Lag and saturation metrics for the fulfillment worker, served over HTTP so an
+autoscaler can tell whether the workers are keeping up:
+
+  GET /metrics   Prometheus text format - scraped by Prometheus; prometheus-adapter
+                 turns a series into an HPA custom / external metric
+  GET /stats     the same numbers as JSON, plus the consumer's counters
+
+Series:
+
+  worker_queue_messages{state}          queue depth: visible (waiting) and in_flight
+                                        (received, not acked yet), from the backend
+  worker_queue_oldest_age_seconds       age of the oldest message still in the queue
+                                        (Redis Stream / memory - SQS only has it in CloudWatch)
+  worker_pending_orders                 PENDING orders in the table (not waiting for a retry)
+  worker_oldest_pending_age_seconds     age of the oldest of them - the lag end to end,
+                                        on every backend (outbox -> queue -> worker)
+  worker_order_latency_seconds          histogram: order created -> COMPLETED committed
+  worker_slot_busy_ratio{pool,slot}     share of the last `window` seconds a slot was busy
+  worker_busy_ratio{pool}               the same over all of a pool's slots
+  worker_slot_busy_seconds_total        cumulative, for rate() in PromQL
+  worker_processes{state}               under supervisor.py: configured and alive processes
+  worker_process_restarts_total         under supervisor.py: crashed processes restarted
+
+Queue depth and the table lag are shared by every replica; they are refreshed
+at most every `cache_seconds`, whoever asks, so scrapes never add load.
+Everything else is per process; supervisor.py serves its processes added up
+(merge_metrics). Only the standard library is used.
+"""
+
+import heapq
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds - from sub-second batches up to the retry backoff ceiling
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class LatencyHistogram:
+    """Cumulative histogram with Prometheus `le` buckets"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, *seconds: float):
+        with self._lock:
+            for value in seconds:
+                self._counts[bisect_left(self.buckets, value)] += 1
+                self._sum += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else f"{bound:g}"] = cumulative
+        return {"buckets": buckets, "sum": round(total, 6), "count": cumulative}
+
+
+class SlotUsage:
+    """
+    Busy time of a pool's slots (batch threads, lanes). A thread marks a slot
+    busy for as long as it works (`with usage.busy():`); ratios are taken over
+    the last `window` seconds from samples recorded when they are read - no
+    sampling thread.
+    """
+
+    def __init__(self, slots: int, window: float = 60):
+        self.slots = slots
+        self.window = window
+        self._lock = threading.Lock()
+        self._busy_total = [0.0] * slots
+        self._busy_since = [None] * slots
+        self._free = list(range(slots))  # heap: busy() without a slot takes the lowest free one
+        now = time.monotonic()
+        self._samples = [(now, [0.0] * slots)]
+
+    @contextmanager
+    def busy(self, slot: int = None):
+        with self._lock:
+            if slot is None:
+                slot = heapq.heappop(self._free) if self._free else None
+            elif slot in self._free:
+                self._free.remove(slot)
+                heapq.heapify(self._free)
+            if slot is not None:
+                self._busy_since[slot] = time.monotonic()
+        try:
+            yield slot
+        finally:
+            if slot is not None:
+                with self._lock:
+                    self._busy_total[slot] += time.monotonic() - self._busy_since[slot]
+                    self._busy_since[slot] = None
+                    heapq.heappush(self._free, slot)
+
+    def _totals(self, now: float) -> list:
+        return [total + (now - since if since is not None else 0)
+                for total, since in zip(self._busy_total, self._busy_since)]
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            totals = self._totals(now)
+            if now - self._samples[-1][0] >= 1:
+                self._samples.append((now, totals))
+            # Keep one sample at (or just past) the window's start as the base
+            while len(self._samples) > 1 and self._samples[1][0] <= now - self.window:
+                self._samples.pop(0)
+            base_time, base_totals = self._samples[0]
+            busy_now = sum(since is not None for since in self._busy_since)
+        elapsed = max(now - base_time, 1e-9)
+        ratios = [min(1.0, (total - base) / elapsed) for total, base in zip(totals, base_totals)]
+        return {
+            "slots": self.slots,
+            "busy_now": busy_now,
+            "window_seconds": round(elapsed, 1),
+            "busy_ratio": round(sum(ratios) / self.slots, 4) if self.slots else 0.0,
+            "slot_busy_ratio": [round(ratio, 4) for ratio in ratios],
+            "slot_busy_seconds": [round(total, 3) for total in totals],
+        }
+
+
+class WorkerMetrics:
+    """
+    Collects the worker's lag and saturation numbers from:
+
+      queue     an order_queue backend with depth() (None in table mode)
+      pending   callable -> (PENDING order count, oldest created_at as naive UTC)
+      latency   LatencyHistogram fed as orders complete
+      pools     {"batch": SlotUsage, "lane": SlotUsage, ...}
+      stats     callable -> extra counters for /stats (e.g. QueueConsumer.stats)
+      stock     callable -> stock write-behind lag (StockWriteBehind.lag)
+    """
+
+    def __init__(self, latency: LatencyHistogram, queue=None, pending=None, pools: dict = None, stats=None,
+                 stock=None, cache_seconds: float = 5):
+        self.latency = latency
+        self.queue = queue
+        self.pending = pending
+        self.stock = stock
+        self.pools = {name: usage for name, usage in (pools or {}).items() if usage and usage.slots}
+        self.stats = stats
+        self.cache_seconds = cache_seconds
+        self._cache_lock = threading.Lock()
+        self._cached_at = None
+        self._cached = {}
+        self.scrapes = 0
+        self.refreshes = 0
+
+    def _lag(self) -> dict:
+        """Queue depth, table lag and stock write-behind lag, refreshed at most every cache_seconds"""
+        with self._cache_lock:
+            now = time.monotonic()
+            if self._cached_at is not None and now - self._cached_at < self.cache_seconds:
+                return self._cached
+            lag = {}
+            if self.queue is not None:
+                try:
+                    lag["queue"] = self.queue.depth()
+                except Exception as e:
+                    logging.warning(f"Queue depth unavailable ({self.queue.name}): {e}")
+            if self.pending is not None:
+                try:
+                    count, oldest = self.pending()
+                    lag["pending_orders"] = count
+                    lag["oldest_pending_age_seconds"] = (
+                        round(max(0.0, (datetime.utcnow() - oldest).total_seconds()), 3) if oldest else 0.0
+                    )
+                except Exception as e:
+                    logging.warning(f"Pending order lag unavailable: {e}")
+            if self.stock is not None:
+                try:
+                    lag["stock_write_behind"] = self.stock()
+                except Exception as e:
+                    logging.warning(f"Stock write-behind lag unavailable: {e}")
+            self._cached, self._cached_at = lag, now
+            self.refreshes += 1
+            return lag
+
+    def collect(self) -> dict:
+        self.scrapes += 1
+        metrics = dict(self._lag())
+        if "queue" in metrics:
+            metrics["queue"] = dict(metrics["queue"], backend=self.queue.name)
+        latency = self.latency.snapshot()
+        metrics["order_latency_seconds"] = dict(latency, p50=histogram_quantile(latency["buckets"], 0.5),
+                                                p99=histogram_quantile(latency["buckets"], 0.99))
+        metrics["slots"] = {name: usage.snapshot() for name, usage in self.pools.items()}
+        return metrics
+
+    def prometheus(self) -> str:
+        return render_prometheus(self.collect())
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve /metrics and /stats on a daemon thread"""
+        return serve_metrics(self.collect, port, host,
+                             stats=(lambda: {"consumer": self.stats()}) if self.stats else None)
+
+
+def histogram_quantile(buckets: dict, q: float):
+    """Upper bound of the bucket holding the q-quantile, from cumulative `le` buckets (None if empty)"""
+    total = buckets.get("+Inf", 0)
+    if not total:
+        return None
+    for bound, cumulative in buckets.items():
+        if cumulative >= q * total:
+            return bound if bound == "+Inf" else float(bound)
+    return "+Inf"
+
+
+def merge_metrics(snapshots: list) -> dict:
+    """
+    One view of several worker processes' collect() snapshots (the supervisor's
+    children): queue depth, table lag and stock lag are global, so the freshest
+    one is kept; latency histograms and busy time add up; slots are numbered
+    across processes in process order, and a pool's busy ratio is over all of them.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for key in ("queue", "pending_orders", "oldest_pending_age_seconds", "stock_write_behind"):
+            if key in snapshot:
+                merged[key] = snapshot[key]
+
+    buckets, total, count = {}, 0.0, 0
+    for snapshot in snapshots:
+        latency = snapshot.get("order_latency_seconds") or {}
+        for bound, cumulative in latency.get("buckets", {}).items():
+            buckets[bound] = buckets.get(bound, 0) + cumulative
+        total += latency.get("sum", 0.0)
+        count += latency.get("count", 0)
+    merged["order_latency_seconds"] = {"buckets": buckets, "sum": round(total, 6), "count": count,
+                                       "p50": histogram_quantile(buckets, 0.5),
+                                       "p99": histogram_quantile(buckets, 0.99)}
+
+    pools = {}
+    for snapshot in snapshots:
+        for name, usage in snapshot.get("slots", {}).items():
+            pool = pools.setdefault(name, {"slots": 0, "busy_now": 0, "window_seconds": 0.0,
+                                           "slot_busy_ratio": [], "slot_busy_seconds": []})
+            pool["slots"] += usage["slots"]
+            pool["busy_now"] += usage["busy_now"]
+            pool["window_seconds"] = max(pool["window_seconds"], usage["window_seconds"])
+            pool["slot_busy_ratio"] += usage["slot_busy_ratio"]
+            pool["slot_busy_seconds"] += usage["slot_busy_seconds"]
+    for pool in pools.values():
+        pool["busy_ratio"] = round(sum(pool["slot_busy_ratio"]) / pool["slots"], 4) if pool["slots"] else 0.0
+    merged["slots"] = pools
+    return merged
+
+
+def render_prometheus(metrics: dict) -> str:
+    """Prometheus text format of a collect() / merge_metrics() snapshot"""
+    lines = []
+
+    def series(name: str, help_text: str, samples: list, kind: str = "gauge"):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    queue = metrics.get("queue")
+    if queue:
+        backend = {"backend": queue.get("backend", "")}
+        series("worker_queue_messages", "Messages in the order queue",
+               [(dict(backend, state="visible"), queue["visible"]),
+                (dict(backend, state="in_flight"), queue["in_flight"])])
+        if queue.get("oldest_age_seconds") is not None:
+            series("worker_queue_oldest_age_seconds", "Age of the oldest message in the order queue",
+                   [(backend, queue["oldest_age_seconds"])])
+    if "pending_orders" in metrics:
+        series("worker_pending_orders", "PENDING orders not waiting for a retry",
+               [({}, metrics["pending_orders"])])
+        series("worker_oldest_pending_age_seconds", "Age of the oldest PENDING order",
+               [({}, metrics["oldest_pending_age_seconds"])])
+    stock = metrics.get("stock_write_behind")
+    if stock:
+        series("worker_stock_unflushed_keys", "Stock keys changed in Redis, not yet written to Postgres",
+               [({}, stock["unflushed_keys"])])
+        series("worker_stock_durability_lag_seconds", "Age of the oldest stock change not yet in Postgres",
+               [({}, stock["durability_lag_seconds"])])
+
+    latency = metrics["order_latency_seconds"]
+    lines.append("# HELP worker_order_latency_seconds Order created to COMPLETED committed")
+    lines.append("# TYPE worker_order_latency_seconds histogram")
+    for bound, count in latency["buckets"].items():
+        lines.append(f'worker_order_latency_seconds_bucket{{le="{bound}"}} {count}')
+    lines.append(f"worker_order_latency_seconds_sum {latency['sum']}")
+    lines.append(f"worker_order_latency_seconds_count {latency['count']}")
+
+    slots = metrics["slots"]
+    if slots:
+        series("worker_busy_ratio", "Share of the window the pool's slots were busy",
+               [({"pool": pool}, usage["busy_ratio"]) for pool, usage in slots.items()])
+        series("worker_slot_busy_ratio", "Share of the window the slot was busy",
+               [({"pool": pool, "slot": slot}, ratio)
+                for pool, usage in slots.items() for slot, ratio in enumerate(usage["slot_busy_ratio"])])
+        series("worker_slot_busy_seconds_total", "Seconds the slot has been busy",
+               [({"pool": pool, "slot": slot}, seconds)
+                for pool, usage in slots.items() for slot, seconds in enumerate(usage["slot_busy_seconds"])],
+               kind="counter")
+
+    supervisor = metrics.get("supervisor")
+    if supervisor:
+        series("worker_processes", "Worker processes under the supervisor",
+               [({"state": "configured"}, supervisor["processes"]), ({"state": "alive"}, supervisor["alive"])])
+        series("worker_process_restarts_total", "Worker processes restarted after they exited",
+               [({}, supervisor["restarts"])], kind="counter")
+    return "\n".join(lines) + "\n"
+
+
+def serve_metrics(collect, port: int, host: str = "0.0.0.0", stats=None) -> ThreadingHTTPServer:
+    """
+    Serve /metrics (render_prometheus of collect()) and /stats (collect() plus
+    the stats() dict, as JSON) on a daemon thread
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            try:
+                if path == "/metrics":
+                    body, content_type = render_prometheus(collect()).encode(), "text/plain; version=0.0.4"
+                elif path == "/stats":
+                    body = dict(collect(), **(stats() if stats else {}))
+                    body, content_type = json.dumps(body).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+            except Exception as e:
+                logging.error(f"Metrics request failed: {e}")
+                self.send_error(500)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scraped every few seconds - not worth a log line each
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
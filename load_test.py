@@ -3,6 +3,7 @@ Load Test Script for Rapid Delivery Service
 Tests concurrent users hitting the local APIs
 """
 
+import argparse
 import asyncio
 import aiohttp
 import time
@@ -96,10 +97,37 @@ async def run_user_simulation(user_id: int, session: aiohttp.ClientSession) -> L
     
     return results
 
-async def run_load_test(concurrent_users: int, iterations: int = 1):
+async def run_order_simulation(user_id: int, session: aiohttp.ClientSession) -> List[TestResult]:
+    """Simulate a user hitting only the order service (database-bound path)"""
+    results = []
+    results.append(await test_place_order(session))
+    results.append(await test_order_history(session))
+    return results
+
+SCENARIOS = {
+    "mixed": run_user_simulation,
+    "orders": run_order_simulation,
+}
+
+async def print_order_service_metrics(session: aiohttp.ClientSession):
+    """Print order-service connection pool metrics (wait times, timeouts)"""
+    try:
+        async with session.get(f"{BASE_ORDER_URL}/metrics", timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            if resp.status != 200:
+                return
+            pool = (await resp.json()).get("db_pool", {})
+    except Exception:
+        return
+    print(f"🗄  DB POOL: size={pool.get('size')}/{pool.get('max_size')} | "
+          f"waited={pool.get('waited')}/{pool.get('acquired')} | "
+          f"wait avg={pool.get('wait_avg_ms')}ms max={pool.get('wait_max_ms')}ms | "
+          f"timeouts={pool.get('timeouts')}\n")
+
+async def run_load_test(concurrent_users: int, iterations: int = 1, scenario: str = "mixed"):
     """Run load test with specified concurrent users"""
+    simulate = SCENARIOS[scenario]
     print(f"\n{'='*60}")
-    print(f"🧪 LOAD TEST: {concurrent_users} concurrent users, {iterations} iterations")
+    print(f"🧪 LOAD TEST ({scenario}): {concurrent_users} concurrent users, {iterations} iterations")
     print(f"{'='*60}\n")
     
     all_results: List[TestResult] = []
@@ -110,7 +138,7 @@ async def run_load_test(concurrent_users: int, iterations: int = 1):
         for iteration in range(iterations):
             tasks = []
             for user_id in range(concurrent_users):
-                tasks.append(run_user_simulation(user_id, session))
+                tasks.append(simulate(user_id, session))
             
             iteration_results = await asyncio.gather(*tasks)
             for user_results in iteration_results:
@@ -119,7 +147,8 @@ async def run_load_test(concurrent_users: int, iterations: int = 1):
             if iterations > 1:
                 print(f"  Iteration {iteration + 1}/{iterations} complete")
     
-    total_time = time.perf_counter() - start_time
+        total_time = time.perf_counter() - start_time
+        await print_order_service_metrics(session)
     
     # Analyze results
     analyze_results(all_results, concurrent_users, total_time)
@@ -200,15 +229,22 @@ def analyze_results(results: List[TestResult], concurrent_users: int, total_time
         print(f"❌ System overloaded with {concurrent_users} users")
         print(f"   Too many failures - reduce load or scale up\n")
 
-async def main():
+async def main(user_counts: List[int], iterations: int, scenario: str):
     print("\n" + "="*60)
     print("🚀 RAPID DELIVERY SERVICE - LOAD TESTER")
     print("="*60)
     
     # Test with increasing load
-    for users in [5, 10, 25, 50]:
-        await run_load_test(concurrent_users=users, iterations=2)
+    for users in user_counts:
+        await run_load_test(concurrent_users=users, iterations=iterations, scenario=scenario)
         await asyncio.sleep(2)  # Cool down between tests
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Load test the Rapid Delivery APIs")
+    parser.add_argument("--users", type=int, nargs="+", default=[5, 10, 25, 50],
+                        help="Concurrent user counts to run, in order")
+    parser.add_argument("--iterations", type=int, default=2)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed",
+                        help="mixed = availability + products + order, orders = order service only")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.iterations, args.scenario))
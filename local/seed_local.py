@@ -12,7 +12,7 @@ USAGE:
   python local/seed_local.py
 
 This creates:
-  - PostgreSQL: items, orders tables + sample data
+  - PostgreSQL: items, orders, inventory tables + sample data
   - Redis: Inventory for 3 warehouses (Jaipur, Delhi, Mumbai)
   - OpenSearch: Warehouse geo-locations for nearest search
 =============================================================
@@ -109,6 +109,8 @@ def seed_postgres():
         """)
         
         # Drop and recreate orders table with correct schema (includes warehouse_id for seller filtering)
+        cur.execute("DROP TABLE IF EXISTS order_outbox CASCADE")
+        cur.execute("DROP TABLE IF EXISTS order_dead_letters CASCADE")
         cur.execute("DROP TABLE IF EXISTS orders CASCADE")
         cur.execute("""
             CREATE TABLE orders (
@@ -117,13 +119,61 @@ def seed_postgres():
                 warehouse_id VARCHAR(100),
                 status VARCHAR(50) DEFAULT 'PENDING',
                 items JSONB NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                next_attempt_at TIMESTAMP  -- set while the worker has the order parked for a retry
             )
         """)
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_warehouse ON orders(warehouse_id)")
+        # Keyset pagination indexes - (filter, created_at, order_id) matches the listing ORDER BY
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer_created ON orders (customer_id, created_at DESC, order_id DESC) INCLUDE (status)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_warehouse_created ON orders (warehouse_id, created_at DESC, order_id DESC) INCLUDE (status)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_warehouse_status_created ON orders (warehouse_id, status, created_at DESC, order_id DESC)")
+        # Local-mode worker claims the oldest PENDING orders (FOR UPDATE SKIP LOCKED)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_pending ON orders (created_at) WHERE status = 'PENDING'")
         print("   ✅ Created orders table with warehouse_id column")
         
+        # Transactional outbox - order-service relays these rows to the queue
+        cur.execute("""
+            CREATE TABLE order_outbox (
+                id BIGSERIAL PRIMARY KEY,
+                order_id VARCHAR(50) NOT NULL,
+                payload JSONB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        print("   ✅ Created order_outbox table")
+
+        # Orders the fulfillment worker gave up on (permanent error / retries exhausted);
+        # replay them with: python main.py dead-letters --replay <id>... (fulfillment-worker)
+        cur.execute("""
+            CREATE TABLE order_dead_letters (
+                id BIGSERIAL PRIMARY KEY,
+                order_id VARCHAR(50),
+                payload TEXT NOT NULL,
+                error TEXT,
+                attempts INT NOT NULL DEFAULT 1,
+                failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                replayed_at TIMESTAMP
+            )
+        """)
+        print("   ✅ Created order_dead_letters table")
+
+        # Stock - Redis holds the live values; the fulfillment worker writes them behind to
+        # this table and reconcile-inventory compares the two (same rows as seed_redis)
+        cur.execute("DROP TABLE IF EXISTS inventory CASCADE")
+        cur.execute("""
+            CREATE TABLE inventory (
+                warehouse_id VARCHAR(50),
+                item_id VARCHAR(50),
+                stock INT,
+                PRIMARY KEY (warehouse_id, item_id)
+            )
+        """)
+        for warehouse_id, items in INVENTORY.items():
+            for item_id, quantity in items.items():
+                cur.execute("INSERT INTO inventory (warehouse_id, item_id, stock) VALUES (%s, %s, %s)",
+                            (warehouse_id, item_id, quantity))
+        print(f"   ✅ Created inventory table ({sum(len(items) for items in INVENTORY.values())} rows)")
+        
         # Insert items
         for item_id, name, price in ITEMS:
             cur.execute("""
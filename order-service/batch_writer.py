@@ -0,0 +1,207 @@
+"""
+Group-commit writer for order inserts.
+
+Under peak load every place_order used to commit its own single-row INSERT,
+so throughput was capped by Postgres commit latency (one WAL flush per order).
+OrderBatchWriter collects orders that arrive within a short window into one
+multi-row INSERT and one commit. Each caller awaits the commit that contains
+its row, so an acknowledgement still means the row is durable.
+
+Each entry carries its order_outbox row too, and both INSERTs (plus the
+order status NOTIFY) share the batch's transaction, so the outbox guarantee
+holds for batched writes.
+
+A caller that times out never leaves its order in an unknown state: a row
+still waiting in the queue is withdrawn and never written, and a row already
+in a batch is waited for - every statement of a batch is bounded by
+`statement_timeout`, so the batch always ends in a commit or a rollback.
+"""
+
+import asyncio
+import time
+
+from order_events import CHANNEL, event_payload
+
+# Column arrays + unnest: one statement (and one parse) whatever the batch size
+INSERT_ORDERS_SQL = """
+    INSERT INTO orders (order_id, customer_id, warehouse_id, status, items, created_at)
+    SELECT * FROM unnest($1::varchar[], $2::varchar[], $3::varchar[], $4::varchar[], $5::jsonb[], $6::timestamp[])
+"""
+
+INSERT_OUTBOX_SQL = """
+    INSERT INTO order_outbox (order_id, payload)
+    SELECT * FROM unnest($1::varchar[], $2::jsonb[])
+"""
+
+# One statement announces every order in the batch (delivered on COMMIT)
+NOTIFY_BATCH_SQL = "SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload"
+
+
+class OrderBatchWriter:
+    def __init__(self, pool, window_ms: float = 2.0, max_batch: int = 100,
+                 statement_timeout: float = 5.0):
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        self.pool = pool
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.statement_timeout = statement_timeout
+
+        self._queue = None  # created in start(), on the serving event loop
+        self._task = None
+        self._running = False
+        self._batched = set()  # futures of rows taken into a batch, until it resolves
+
+        # Metrics
+        self._batches = 0
+        self._rows = 0
+        self._largest_batch = 0
+        self._failed_batches = 0
+        self._withdrawn = 0
+        self._commit_total = 0.0
+
+    def start(self):
+        """Start the writer task (call from the running event loop)."""
+        if self._task is not None:
+            return
+        self._running = True
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Flush whatever is queued and stop the writer task."""
+        if self._task is None:
+            return
+        self._running = False
+        self._batched = set()  # futures of rows taken into a batch, until it resolves
+        self._queue.put_nowait(None)  # wake the writer
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
+
+    async def write(self, row: tuple, outbox_row: tuple, timeout: float = 10.0):
+        """
+        Queue one orders row (plus its outbox row) and wait until its batch
+        is committed. Re-raises the database error if it could not be written.
+        Raises asyncio.TimeoutError if the row was still queued after `timeout`
+        (it is withdrawn, so it is never written).
+        """
+        if not self._running:
+            raise RuntimeError("Order batch writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(((row, outbox_row), future))
+        try:
+            # shield: a caller timing out must not cancel the shared batch result
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if future not in self._batched:
+                future.cancel()  # the writer skips it
+                self._withdrawn += 1
+                raise
+        # Already in a batch that may still commit - wait for its outcome
+        return await asyncio.shield(future)
+
+    # -----------------------------------------------------
+    # Writer task
+    # -----------------------------------------------------
+
+    def _take(self, entry, batch: list):
+        _, future = entry
+        if future.cancelled():
+            return  # withdrawn by a caller that timed out
+        self._batched.add(future)
+        future.add_done_callback(self._batched.discard)
+        batch.append(entry)
+
+    async def _collect(self, first) -> list:
+        batch = []
+        self._take(first, batch)
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Always drain what is already queued, even with a 0ms window
+                if remaining > 0:
+                    entry = await asyncio.wait_for(self._queue.get(), remaining)
+                else:
+                    entry = self._queue.get_nowait()
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            if entry is None:
+                break
+            self._take(entry, batch)
+        return batch
+
+    async def _run(self):
+        while self._running or not self._queue.empty():
+            first = await self._queue.get()
+            if first is None:
+                continue
+            batch = await self._collect(first)
+            if batch:
+                await self._flush(batch)
+
+    async def _insert(self, rows: list):
+        orders = [order for order, _ in rows]
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                await conn.execute(INSERT_ORDERS_SQL, *[list(column) for column in zip(*orders)],
+                                   timeout=self.statement_timeout)
+                await conn.execute(INSERT_OUTBOX_SQL, *[list(column) for column in zip(*[o for _, o in rows])],
+                                   timeout=self.statement_timeout)
+                await conn.execute(NOTIFY_BATCH_SQL, CHANNEL, [event_payload(*order[:4]) for order in orders],
+                                   timeout=self.statement_timeout)
+
+    async def _flush(self, batch: list):
+        rows = [row for row, _ in batch]
+        start = time.monotonic()
+        try:
+            await self._insert(rows)
+        except Exception as batch_error:
+            self._failed_batches += 1
+            if len(batch) == 1 or isinstance(batch_error, asyncio.TimeoutError):
+                # A slow database, not a bad row - retrying row by row would only be slower
+                for _, future in batch:
+                    _resolve(future, error=batch_error)
+                return
+            # One bad row must not fail its neighbours - retry them one by one
+            for row, future in batch:
+                try:
+                    await self._insert([row])
+                    _resolve(future)
+                except Exception as row_error:
+                    _resolve(future, error=row_error)
+            return
+
+        elapsed = time.monotonic() - start
+        self._batches += 1
+        self._rows += len(rows)
+        self._largest_batch = max(self._largest_batch, len(rows))
+        self._commit_total += elapsed
+        for _, future in batch:
+            _resolve(future)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self._batches,
+            "rows": self._rows,
+            "avg_batch_size": round(self._rows / self._batches, 2) if self._batches else 0.0,
+            "largest_batch": self._largest_batch,
+            "failed_batches": self._failed_batches,
+            "withdrawn": self._withdrawn,
+            "avg_commit_ms": round(self._commit_total / self._batches * 1000, 3) if self._batches else 0.0,
+        }
+
+
+def _resolve(future, error: Exception = None):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(None)
@@ -0,0 +1,487 @@
+"""
+Streaming bulk order import (partner / B2B replays).
+
+Replaying thousands of orders through POST /orders costs a request, a
+statement and a commit per order. OrderImporter reads a JSONL or CSV body as
+a stream, validates each record as it arrives and writes valid orders in
+chunks: one COPY into a temp staging table, then one INSERT ... SELECT into
+orders and order_outbox per chunk, in a single transaction.
+
+- Memory is bounded by the chunk size, not the file size: the next chunk is
+  only read once the previous one has been committed.
+- Fulfillment is enqueued through the outbox, so the relay drains it to SQS
+  in send_message_batch calls (and the local worker sees PENDING rows).
+- Orders with an order_id that already exists are skipped, so a replay that
+  carries order_ids can be re-run safely after a failure.
+- Invalid records are counted and reported (with their line number); they
+  never stop the import.
+
+JSONL, one order per line:
+  {"customer_id": "c1", "items": [{"item_id": "apple", "warehouse_id": "wh_lnmiit", "quantity": 2}],
+   "order_id": "optional", "created_at": "optional ISO 8601 (UTC)"}
+
+CSV with a header row, one item per line:
+  customer_id,warehouse_id,item_id,quantity[,order_id][,created_at]
+  Consecutive lines with the same order_id form one order; lines without an
+  order_id are one order each.
+
+CLI (same DB_* / REDIS_* environment as the service):
+  python bulk_import.py orders.jsonl
+  python bulk_import.py partner_orders.csv --chunk-size 5000
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+import redis
+import redis.asyncio as aioredis
+
+from batch_writer import NOTIFY_BATCH_SQL
+from db_pool import ConnectionPool
+from history_cache import HistoryCache
+from order_events import CHANNEL, event_payload
+from order_stats import WarehouseStats
+
+IMPORT_FORMATS = ("jsonl", "csv")
+
+CSV_REQUIRED_COLUMNS = ("customer_id", "warehouse_id", "item_id", "quantity")
+
+# orders.order_id / customer_id / warehouse_id are VARCHAR(50) in the smallest schema
+MAX_ID_LENGTH = 50
+
+# Lives for one chunk's transaction only
+CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE order_import (
+        line INTEGER,
+        order_id VARCHAR(100),
+        customer_id VARCHAR(100),
+        warehouse_id VARCHAR(100),
+        items JSONB,
+        created_at TIMESTAMP
+    ) ON COMMIT DROP
+"""
+
+STAGING_COLUMNS = ["line", "order_id", "customer_id", "warehouse_id", "items", "created_at"]
+
+# Existing order_ids (and repeats inside the chunk) are skipped; every new
+# order gets its outbox row in the same statement
+IMPORT_ORDERS_SQL = """
+    WITH inserted AS (
+        INSERT INTO orders (order_id, customer_id, warehouse_id, status, items, created_at)
+        SELECT DISTINCT ON (order_id) order_id, customer_id, warehouse_id, 'PENDING', items, created_at
+        FROM order_import
+        ORDER BY order_id, line
+        ON CONFLICT (order_id) DO NOTHING
+        RETURNING order_id, customer_id, warehouse_id, items, created_at
+    ), outbox AS (
+        INSERT INTO order_outbox (order_id, payload)
+        SELECT order_id, jsonb_build_object(
+            'order_id', order_id, 'customer_id', customer_id, 'warehouse_id', warehouse_id, 'items', items
+        )
+        FROM inserted
+    )
+    SELECT order_id, customer_id, warehouse_id, created_at FROM inserted
+"""
+
+
+class InvalidRecord(ValueError):
+    """A record that fails validation - reported and skipped"""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(message)
+        self.line = line
+
+
+# -----------------------------------------------------
+# Parsing and validation (streaming)
+# -----------------------------------------------------
+
+def _check_id(line: int, name: str, value, required: bool = True):
+    if value is None or value == "":
+        if required:
+            raise InvalidRecord(line, f"{name} is required")
+        return None
+    if not isinstance(value, str):
+        raise InvalidRecord(line, f"{name} must be a string")
+    if len(value) > MAX_ID_LENGTH:
+        raise InvalidRecord(line, f"{name} is longer than {MAX_ID_LENGTH} characters")
+    return value
+
+
+def _check_item(line: int, item) -> dict:
+    if not isinstance(item, dict):
+        raise InvalidRecord(line, "each item must be an object")
+    quantity = item.get("quantity")
+    if isinstance(quantity, str) and quantity.strip().isdigit():
+        quantity = int(quantity)
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+        raise InvalidRecord(line, "quantity must be a positive integer")
+    return {
+        "item_id": _check_id(line, "item_id", item.get("item_id")),
+        "warehouse_id": _check_id(line, "warehouse_id", item.get("warehouse_id")),
+        "quantity": quantity,
+    }
+
+
+def _parse_created_at(line: int, value) -> datetime:
+    if value is None or value == "":
+        return datetime.utcnow()
+    if not isinstance(value, str):
+        raise InvalidRecord(line, "created_at must be an ISO 8601 string")
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise InvalidRecord(line, f"created_at is not ISO 8601: {value[:40]}")
+    # orders.created_at is a naive UTC timestamp
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def staging_row(line: int, customer_id, items, order_id=None, created_at=None) -> tuple:
+    """Validate one order and build its order_import row (raises InvalidRecord)"""
+    customer_id = _check_id(line, "customer_id", customer_id)
+    order_id = _check_id(line, "order_id", order_id, required=False) or str(uuid.uuid4())
+    if not isinstance(items, list) or not items:
+        raise InvalidRecord(line, "items must be a non-empty list")
+    items = [_check_item(line, item) for item in items]
+    return (
+        line,
+        order_id,
+        customer_id,
+        items[0]["warehouse_id"],  # primary warehouse, as place_order does
+        json.dumps(items),
+        _parse_created_at(line, created_at),
+    )
+
+
+async def iter_lines(chunks, max_line_bytes: int = 65536):
+    """
+    Split a stream of byte chunks into (line_number, text) without holding
+    more than one partial line. Lines over max_line_bytes are yielded as an
+    InvalidRecord and skipped up to the next newline.
+    """
+    buffer = b""
+    line_no = 0
+    skipping = False
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        for raw in lines:
+            line_no += 1
+            if skipping:
+                skipping = False
+                continue
+            if len(raw) > max_line_bytes:
+                yield line_no, InvalidRecord(line_no, f"line is longer than {max_line_bytes} bytes")
+                continue
+            yield line_no, raw
+        if len(buffer) > max_line_bytes:
+            if not skipping:
+                yield line_no + 1, InvalidRecord(line_no + 1, f"line is longer than {max_line_bytes} bytes")
+            skipping = True
+            buffer = b""
+    if buffer and not skipping:
+        yield line_no + 1, buffer
+
+
+def _decode(line_no: int, raw: bytes) -> str:
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        raise InvalidRecord(line_no, "line is not valid UTF-8")
+    if line_no == 1:
+        text = text.lstrip("\ufeff")
+    return text.rstrip("\r")
+
+
+async def iter_jsonl_orders(lines):
+    async for line_no, raw in lines:
+        if isinstance(raw, InvalidRecord):
+            yield raw
+            continue
+        try:
+            text = _decode(line_no, raw)
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                raise InvalidRecord(line_no, f"invalid JSON: {e}")
+            if not isinstance(record, dict):
+                raise InvalidRecord(line_no, "each line must be a JSON object")
+            yield staging_row(line_no, record.get("customer_id"), record.get("items"),
+                              record.get("order_id"), record.get("created_at"))
+        except InvalidRecord as e:
+            yield e
+
+
+async def iter_csv_orders(lines):
+    """Rows sharing an order_id on consecutive lines are merged into one order"""
+    header = None
+    pending = None  # {"line", "order_id", "customer_id", "created_at", "items", "error"}
+
+    def finish(order):
+        if order["error"]:
+            return order["error"]
+        try:
+            return staging_row(order["line"], order["customer_id"], order["items"],
+                               order["order_id"], order["created_at"])
+        except InvalidRecord as e:
+            return e
+
+    async for line_no, raw in lines:
+        if isinstance(raw, InvalidRecord):
+            yield raw
+            continue
+        try:
+            text = _decode(line_no, raw)
+        except InvalidRecord as e:
+            yield e
+            continue
+        if not text.strip():
+            continue
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as e:
+            yield InvalidRecord(line_no, f"invalid CSV: {e}")
+            continue
+
+        if header is None:
+            header = [column.strip().lower() for column in values]
+            missing = [column for column in CSV_REQUIRED_COLUMNS if column not in header]
+            if missing:
+                # Nothing in the file can be read without these
+                raise InvalidRecord(line_no, f"CSV header is missing {', '.join(missing)}")
+            continue
+
+        row = dict(zip(header, (value.strip() for value in values)))
+        order_id = row.get("order_id") or None
+        item = {"item_id": row.get("item_id"), "warehouse_id": row.get("warehouse_id"),
+                "quantity": row.get("quantity")}
+
+        if pending and order_id and pending["order_id"] == order_id:
+            if not pending["error"] and row.get("customer_id") != pending["customer_id"]:
+                pending["error"] = InvalidRecord(line_no, f"order {order_id} has more than one customer_id")
+            pending["items"].append(item)
+            continue
+
+        if pending:
+            yield finish(pending)
+        pending = {"line": line_no, "order_id": order_id, "customer_id": row.get("customer_id"),
+                   "created_at": row.get("created_at"), "items": [item], "error": None}
+        if len(values) != len(header):
+            pending["error"] = InvalidRecord(line_no, f"expected {len(header)} columns, got {len(values)}")
+
+    if pending:
+        yield finish(pending)
+
+
+# -----------------------------------------------------
+# Importer
+# -----------------------------------------------------
+
+class OrderImporter:
+    def __init__(self, pool, chunk_size: int = 1000, max_line_bytes: int = 65536, max_errors: int = 100,
+                 history_cache=None, warehouse_stats=None, on_commit=None, import_id: str = None):
+        """
+        pool: db_pool.ConnectionPool - one connection is borrowed per chunk.
+        history_cache / warehouse_stats: invalidated / bumped after each chunk, like place_order.
+        on_commit: called (no arguments) after each chunk commits, e.g. outbox_relay.notify.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be >= 1")
+        self.pool = pool
+        self.chunk_size = chunk_size
+        self.max_line_bytes = max_line_bytes
+        self.max_errors = max_errors
+        self.history_cache = history_cache
+        self.warehouse_stats = warehouse_stats
+        self.on_commit = on_commit
+        self.import_id = import_id or uuid.uuid4().hex[:12]
+
+        self.format = None
+        self.state = "pending"
+        self._started = None
+        self._finished = None
+        self._accepted = 0
+        self._imported = 0
+        self._rejected = 0
+        self._chunks = 0
+        self._errors = []
+        self._last_error = None
+
+    async def run(self, chunks, fmt: str = "jsonl") -> dict:
+        """
+        Import an async iterable of byte chunks. Returns stats(); on a database
+        error the chunks committed so far stay imported and the error is re-raised.
+        """
+        if fmt not in IMPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(IMPORT_FORMATS)}")
+        self.format = fmt
+        self.state = "running"
+        self._started = time.monotonic()
+
+        lines = iter_lines(chunks, self.max_line_bytes)
+        orders = iter_csv_orders(lines) if fmt == "csv" else iter_jsonl_orders(lines)
+        rows = []
+        try:
+            async for record in orders:
+                if isinstance(record, InvalidRecord):
+                    self._reject(record)
+                    continue
+                rows.append(record)
+                if len(rows) >= self.chunk_size:
+                    await self._write_chunk(rows)
+                    rows = []
+            if rows:
+                await self._write_chunk(rows)
+        except InvalidRecord as e:
+            # Unreadable file (e.g. CSV header) - nothing after it can be imported
+            self._reject(e)
+            self.state = "failed"
+            self._last_error = str(e)
+        except Exception as e:
+            self.state = "failed"
+            self._last_error = str(e)
+            raise
+        else:
+            self.state = "done"
+        finally:
+            self._finished = time.monotonic()
+            stats = self.stats()
+            print(f"📥 Import {self.import_id} {self.state}: {stats['imported']} imported, "
+                  f"{stats['duplicates']} duplicate, {stats['rejected']} rejected "
+                  f"({stats['orders_per_second']} orders/s)")
+        return self.stats()
+
+    def _reject(self, error: InvalidRecord):
+        self._rejected += 1
+        if len(self._errors) < self.max_errors:
+            self._errors.append({"line": error.line, "error": str(error)})
+
+    async def _write_chunk(self, rows: list):
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                await conn.execute(CREATE_STAGING_SQL)
+                await conn.copy_records_to_table("order_import", records=rows, columns=STAGING_COLUMNS)
+                inserted = await conn.fetch(IMPORT_ORDERS_SQL)
+                if inserted:
+                    await conn.execute(NOTIFY_BATCH_SQL, CHANNEL, [
+                        event_payload(order_id, customer_id, warehouse_id, "PENDING")
+                        for order_id, customer_id, warehouse_id, _ in inserted
+                    ])
+
+        self._chunks += 1
+        self._accepted += len(rows)
+        self._imported += len(inserted)
+        if self.on_commit:
+            self.on_commit()
+        await self._after_commit(inserted)
+
+        print(f"📥 Import {self.import_id}: chunk {self._chunks} committed, "
+              f"{self._imported} imported / {self._rejected} rejected so far")
+
+    async def _after_commit(self, inserted: list):
+        if not inserted:
+            return
+        if self.history_cache:
+            await self.history_cache.invalidate(*{customer_id for _, customer_id, _, _ in inserted})
+        if self.warehouse_stats:
+            # One counter bump per (warehouse, hour) instead of one per order
+            hours = Counter(
+                (warehouse_id, created_at.replace(minute=0, second=0, microsecond=0))
+                for _, _, warehouse_id, created_at in inserted
+            )
+            for (warehouse_id, hour), count in hours.items():
+                await self.warehouse_stats.record(warehouse_id, "PENDING", hour, count=count)
+
+    def stats(self) -> dict:
+        end = self._finished or time.monotonic()
+        elapsed = end - self._started if self._started else 0.0
+        return {
+            "import_id": self.import_id,
+            "format": self.format,
+            "state": self.state,
+            "chunk_size": self.chunk_size,
+            "chunks": self._chunks,
+            "accepted": self._accepted,
+            "imported": self._imported,
+            "duplicates": self._accepted - self._imported,
+            "rejected": self._rejected,
+            "errors": list(self._errors),
+            "last_error": self._last_error,
+            "elapsed_seconds": round(elapsed, 3),
+            "orders_per_second": round(self._imported / elapsed) if elapsed else 0,
+        }
+
+
+# -----------------------------------------------------
+# CLI
+# -----------------------------------------------------
+
+async def read_file(path: str, block_size: int = 1 << 16):
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return
+            yield block
+
+
+async def _main(args):
+    pool = ConnectionPool(
+        1, 1,
+        wait_timeout=30,
+        host=os.environ.get("DB_HOST", "localhost"),
+        port=int(os.environ.get("DB_PORT", "5432")),
+        database=os.environ.get("DB_NAME", "postgres"),
+        user=os.environ.get("DB_USER", "postgres"),
+        password=os.environ.get("DB_PASS", "password"),
+        timeout=5
+    )
+    redis_client = aioredis.Redis(
+        host=os.environ.get("REDIS_HOST", "localhost"),
+        port=int(os.environ.get("REDIS_PORT", "6379")),
+        decode_responses=True,
+        socket_connect_timeout=2,
+        socket_timeout=2
+    )
+    try:
+        await redis_client.ping()
+        history_cache = HistoryCache(redis_client, ttl=int(os.environ.get("HISTORY_CACHE_TTL", "300")))
+        warehouse_stats = WarehouseStats(redis_client)
+    except redis.RedisError as e:
+        print(f"⚠️ Redis not available, history cache and order counters will not be updated: {e}")
+        history_cache = warehouse_stats = None
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+    importer = OrderImporter(pool, chunk_size=args.chunk_size,
+                             history_cache=history_cache, warehouse_stats=warehouse_stats)
+    try:
+        await pool.open()
+        stats = await importer.run(read_file(args.path), fmt)
+    finally:
+        await pool.closeall()
+        await redis_client.close()
+    print(json.dumps(stats, indent=2))
+    # The running order-service's outbox relay sends the imported orders to the queue
+    return 0 if stats["state"] == "done" else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a JSONL or CSV file of orders into Postgres")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Orders per COPY / commit")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,158 @@
+"""
+Bounded asyncpg connection pool for the order service.
+
+Every request used to open (and tear down) its own connection, so connection
+setup dominated request latency and a burst of traffic turned into a burst
+of backend processes on Postgres. This pool keeps a fixed upper bound of
+connections, pre-warms a minimum set at startup, health-checks connections
+that have been idle for a while and records how long callers wait for one.
+
+Handlers await a connection instead of blocking a threadpool thread, so
+thousands of in-flight requests can queue for max_size connections on one
+event loop.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the wait timeout."""
+
+
+class ConnectionPool:
+    def __init__(self, minconn: int, maxconn: int, wait_timeout: float = 5.0,
+                 health_check_after: float = 30.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size (need 0 <= minconn <= maxconn, maxconn >= 1)")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.wait_timeout = wait_timeout
+        self.health_check_after = health_check_after
+        self._connect_kwargs = connect_kwargs
+        self._pool = None
+        self._released_at = {}  # backend pid -> monotonic time it went idle
+
+        # Metrics
+        self._acquired = 0
+        self._waited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._health_failures = 0
+
+    async def _on_connect(self, conn):
+        self._created += 1
+
+    async def open(self) -> int:
+        """Create the pool with minconn connections open. Returns how many were opened."""
+        if self._pool is None:
+            self._pool = await asyncpg.create_pool(
+                min_size=self.minconn,
+                max_size=self.maxconn,
+                init=self._on_connect,
+                **self._connect_kwargs
+            )
+        return self._pool.get_size()
+
+    async def _is_healthy(self, conn) -> bool:
+        try:
+            await conn.fetchval("SELECT 1", timeout=self.wait_timeout)
+            return True
+        except Exception:
+            return False
+
+    async def getconn(self):
+        """Borrow a connection, waiting up to wait_timeout for one to free up."""
+        if self._pool is None:
+            await self.open()
+
+        start = time.monotonic()
+        deadline = start + self.wait_timeout
+        waited = self._pool.get_idle_size() == 0 and self._pool.get_size() >= self.maxconn
+
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                conn = await self._pool.acquire(timeout=remaining)
+            except asyncio.TimeoutError:
+                self._timeouts += 1
+                raise PoolTimeout(
+                    f"No database connection free after {self.wait_timeout:.1f}s (pool size {self.maxconn})"
+                )
+
+            released_at = self._released_at.pop(conn.get_server_pid(), None)
+            if released_at is not None and time.monotonic() - released_at > self.health_check_after \
+                    and not await self._is_healthy(conn):
+                # Stale connection (server restart, failover, idle timeout) - drop it;
+                # the pool opens a fresh one in its slot on the next acquire.
+                self._discarded += 1
+                self._health_failures += 1
+                conn.terminate()
+                await self._pool.release(conn)
+                continue
+
+            wait = time.monotonic() - start
+            self._acquired += 1
+            if waited:
+                self._waited += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            return conn
+
+    async def putconn(self, conn):
+        """
+        Return a borrowed connection. asyncpg rolls back any open transaction
+        and resets session state, and drops connections that were closed or
+        broken, so the next borrower always starts from a clean state.
+        """
+        if conn.is_closed():
+            self._discarded += 1
+        else:
+            self._released_at[conn.get_server_pid()] = time.monotonic()
+        await self._pool.release(conn)
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await self.getconn()
+        try:
+            yield conn
+        finally:
+            await self.putconn(conn)
+
+    async def closeall(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+        self._released_at.clear()
+
+    # -----------------------------------------------------
+    # Metrics
+    # -----------------------------------------------------
+
+    def stats(self) -> dict:
+        size = self._pool.get_size() if self._pool else 0
+        idle = self._pool.get_idle_size() if self._pool else 0
+        return {
+            "min_size": self.minconn,
+            "max_size": self.maxconn,
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "acquired": self._acquired,
+            "waited": self._waited,
+            "wait_avg_ms": round(self._wait_total / self._acquired * 1000, 3) if self._acquired else 0.0,
+            "wait_max_ms": round(self._wait_max * 1000, 3),
+            "timeouts": self._timeouts,
+            "created": self._created,
+            "discarded": self._discarded,
+            "health_check_failures": self._health_failures,
+        }
@@ -0,0 +1,112 @@
+"""
+Redis read-through cache for customer order history.
+
+Customers reopen the orders screen constantly; the first history page is kept
+in Redis as the DB-rendered JSON text so most visits never reach Postgres.
+
+Each customer has one hash (one field per page size) plus a generation
+counter. Writers (place_order here, process_order in the fulfillment worker)
+bump the generation and drop the hash. A reader only stores what it read
+from Postgres if the generation is unchanged since before its query, so a
+slow read can never overwrite a newer invalidation with a stale status.
+The key layout is shared with fulfillment-worker/main.py (invalidate_order_history).
+"""
+
+import redis
+
+HISTORY_KEY = "orders:history:{customer_id}"
+GENERATION_KEY = "orders:history:{customer_id}:gen"
+
+# Store only if nobody invalidated the customer since the read started
+FILL_SCRIPT = """
+local current = redis.call('GET', KEYS[2]) or '0'
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[2], ARGV[3], ARGV[2] .. ':cursor', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+
+class HistoryCache:
+    def __init__(self, redis_client, ttl: int = 300, generation_ttl: int = 86400):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.generation_ttl = generation_ttl
+        self._fill = redis_client.register_script(FILL_SCRIPT)
+
+        # Metrics (approximate - updated without a lock, only read for /metrics)
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.stale_fills_skipped = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    async def get(self, customer_id: str, limit: int):
+        """Returns (orders_json, next_cursor) or None on a miss (or if Redis is unavailable)"""
+        try:
+            orders_json, next_cursor = await self.redis.hmget(
+                HISTORY_KEY.format(customer_id=customer_id), str(limit), f"{limit}:cursor"
+            )
+        except redis.RedisError:
+            self.errors += 1
+            return None
+        if orders_json is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return orders_json, next_cursor or None
+
+    async def generation(self, customer_id: str):
+        """Read before querying Postgres; pass to fill(). None means don't fill."""
+        try:
+            return await self.redis.get(GENERATION_KEY.format(customer_id=customer_id)) or "0"
+        except redis.RedisError:
+            self.errors += 1
+            return None
+
+    async def fill(self, customer_id: str, limit: int, generation, orders_json: str, next_cursor):
+        if generation is None:
+            return
+        try:
+            stored = await self._fill(
+                keys=[HISTORY_KEY.format(customer_id=customer_id), GENERATION_KEY.format(customer_id=customer_id)],
+                args=[generation, str(limit), orders_json, next_cursor or "", self.ttl]
+            )
+        except redis.RedisError:
+            self.errors += 1
+            return
+        if stored:
+            self.fills += 1
+        else:
+            self.stale_fills_skipped += 1
+
+    async def invalidate(self, *customer_ids: str):
+        """Drop the cached history of one or more customers (one round trip)"""
+        if not customer_ids:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            for customer_id in customer_ids:
+                generation_key = GENERATION_KEY.format(customer_id=customer_id)
+                pipe.incr(generation_key)
+                pipe.expire(generation_key, self.generation_ttl)
+                pipe.delete(HISTORY_KEY.format(customer_id=customer_id))
+            await pipe.execute()
+            self.invalidations += len(customer_ids)
+        except redis.RedisError as e:
+            self.errors += 1
+            print(f"⚠️ Order history cache invalidation failed for {', '.join(customer_ids[:3])}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "fills": self.fills,
+            "stale_fills_skipped": self.stale_fills_skipped,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
@@ -0,0 +1,160 @@
+"""
+Idempotency-Key handling for POST /orders.
+
+Mobile clients retry on timeouts; without a key every retry creates a new
+order and a duplicate fulfillment. The first response for a key is stored in
+Redis (with a TTL) and replayed for retries without touching Postgres or the
+queue. Duplicates that arrive while the first request is still running are
+coalesced: inside one process they wait on the leader's future, across
+processes they wait for the leader's Redis marker to turn into a response.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+
+import redis
+
+PENDING = "pending"
+DONE = "done"
+
+
+class IdempotencyConflict(Exception):
+    """The original request for this key is still running (and did not finish in time)."""
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used with a different request body."""
+
+
+def request_fingerprint(payload: dict) -> str:
+    """Stable hash of a request body, used to catch keys reused for different requests"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, redis_client, ttl: int = 86400, lock_ttl: int = 30,
+                 wait_timeout: float = 10.0, poll_interval: float = 0.05, prefix: str = "idem:orders"):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+
+        self._inflight = {}  # redis key -> leader's future (one event loop, no lock needed)
+
+        # Metrics
+        self._executed = 0
+        self._replayed = 0
+        self._coalesced = 0
+        self._conflicts = 0
+        self._redis_errors = 0
+
+    def _redis_key(self, scope: str, key: str) -> str:
+        return f"{self.prefix}:{scope}:{key}"
+
+    def _count(self, name: str):
+        setattr(self, name, getattr(self, name) + 1)
+
+    async def execute(self, scope: str, key: str, fingerprint: str, handler):
+        """
+        Await handler() at most once per (scope, key) within the TTL.
+        Returns (result, replayed) where replayed is True if the result came
+        from an earlier (or concurrent) execution.
+        """
+        redis_key = self._redis_key(scope, key)
+
+        future = self._inflight.get(redis_key)
+        if future is not None:
+            # Same key already running in this process - share its outcome
+            self._count("_coalesced")
+            try:
+                result, stored_fingerprint = await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self._count("_conflicts")
+                raise IdempotencyConflict(key)
+            if stored_fingerprint != fingerprint:
+                raise IdempotencyKeyReused(key)
+            return result, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[redis_key] = future
+        try:
+            result, replayed = await self._execute_once(redis_key, key, fingerprint, handler)
+            future.set_result((result, fingerprint))
+            return result, replayed
+        except BaseException as e:
+            future.set_exception(e)
+            # Followers re-raise it; don't warn about an exception nobody retrieved
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(redis_key, None)
+
+    async def _execute_once(self, redis_key: str, key: str, fingerprint: str, handler):
+        deadline = time.monotonic() + self.wait_timeout
+        pending = json.dumps({"state": PENDING, "fingerprint": fingerprint})
+
+        while True:
+            try:
+                stored = await self.redis.get(redis_key)
+                if stored is None and await self.redis.set(redis_key, pending, nx=True, ex=self.lock_ttl):
+                    break  # we own this key
+                if stored is None:
+                    stored = await self.redis.get(redis_key)
+            except redis.RedisError as e:
+                # Fail open - a Redis outage must not block order placement
+                self._count("_redis_errors")
+                print(f"⚠️ Idempotency store unavailable, processing without dedupe: {e}")
+                self._count("_executed")
+                return await handler(), False
+
+            if stored is not None:
+                record = json.loads(stored)
+                if record.get("fingerprint") != fingerprint:
+                    raise IdempotencyKeyReused(key)
+                if record.get("state") == DONE:
+                    self._count("_replayed")
+                    return record["response"], True
+
+            # Another process is running the original request - wait for its response
+            if time.monotonic() >= deadline:
+                self._count("_conflicts")
+                raise IdempotencyConflict(key)
+            await asyncio.sleep(self.poll_interval)
+
+        try:
+            self._count("_executed")
+            result = await handler()
+        except BaseException:
+            # Let the client retry with the same key
+            try:
+                await self.redis.delete(redis_key)
+            except redis.RedisError:
+                pass
+            raise
+
+        try:
+            await self.redis.set(
+                redis_key,
+                json.dumps({"state": DONE, "fingerprint": fingerprint, "response": result}),
+                ex=self.ttl
+            )
+        except redis.RedisError as e:
+            self._count("_redis_errors")
+            print(f"⚠️ Could not store idempotent response for {key}: {e}")
+        return result, False
+
+    def stats(self) -> dict:
+        return {
+            "ttl_seconds": self.ttl,
+            "executed": self._executed,
+            "replayed": self._replayed,
+            "coalesced": self._coalesced,
+            "conflicts": self._conflicts,
+            "redis_errors": self._redis_errors,
+            "in_flight": len(self._inflight),
+        }
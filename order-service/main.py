@@ -139,15 +139,35 @@
 
 import os
 import json
+import asyncio
 import boto3
 import uuid
-import psycopg2
+import asyncpg
+import redis
+import redis.asyncio as aioredis
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 
+from batch_writer import OrderBatchWriter
+from bulk_import import IMPORT_FORMATS, OrderImporter
+from db_pool import ConnectionPool, PoolTimeout
+from history_cache import HistoryCache
+from idempotency import IdempotencyConflict, IdempotencyKeyReused, IdempotencyStore, request_fingerprint
+from order_stats import WarehouseStats
+from order_events import CHANNEL as ORDER_EVENTS_CHANNEL, OrderEventHub, event_payload, sse_stream
+from notifier import NotificationQueue
+from order_queue import MemoryQueue, RedisStreamQueue, SqsQueue, TableQueue
+from outbox import OutboxRelay, outbox_row
+from rate_limit import OrderRateLimiter, RateLimited
+from pagination import ORDER_STATUSES, InvalidCursor, encode_cursor, json_page_query
+
 app = FastAPI()
 
 app.add_middleware(
@@ -156,14 +176,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed", "Retry-After"],
 )
 
 # Config
-SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
+SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')  # a .fifo queue gets one message group per warehouse
 SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN', '')  # SNS topic for notifications
 REGION = os.environ.get("AWS_REGION", "us-east-1")
 ENV = os.getenv("ENV", "prod")
 
+# Order queue (see order_queue.py): sqs, redis (Redis Stream - local runs and CI), memory, or
+# table - no queue, the worker claims PENDING orders from the table. Must match the worker
+QUEUE_BACKEND = os.environ.get('QUEUE_BACKEND', 'redis' if ENV == 'local' else 'sqs')
+QUEUE_MAX_LENGTH = int(os.environ.get('QUEUE_MAX_LENGTH', '1000000'))  # redis / memory
+
 # Database Config
 DB_HOST = os.environ.get('DB_HOST', 'postgres')
 DB_PORT = int(os.environ.get('DB_PORT', '5432'))
@@ -171,29 +197,266 @@ DB_NAME = os.environ.get('DB_NAME', 'postgres')
 DB_USER = os.environ.get('DB_USER', 'postgres')
 DB_PASS = os.environ.get('DB_PASS', 'password')
 
+# Redis Config (idempotency keys, order history cache, warehouse order counters)
+REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', '6379'))
+HISTORY_CACHE_TTL = int(os.environ.get('HISTORY_CACHE_TTL', '300'))
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', '86400'))
+IDEMPOTENCY_LOCK_TTL = int(os.environ.get('IDEMPOTENCY_LOCK_TTL', '30'))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', '10'))
+
+# Admission Control Config - token buckets per customer and per warehouse (opt-in: rate 0 disables)
+RATE_LIMIT_CUSTOMER_RATE = float(os.environ.get('RATE_LIMIT_CUSTOMER_RATE', '0'))  # orders/second, e.g. 2
+RATE_LIMIT_CUSTOMER_BURST = int(os.environ.get('RATE_LIMIT_CUSTOMER_BURST', '10'))
+RATE_LIMIT_WAREHOUSE_RATE = float(os.environ.get('RATE_LIMIT_WAREHOUSE_RATE', '0'))  # e.g. 200
+RATE_LIMIT_WAREHOUSE_BURST = int(os.environ.get('RATE_LIMIT_WAREHOUSE_BURST', '400'))
+
+# Connection Pool Config
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '2'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))
+DB_POOL_HEALTH_CHECK_AFTER = float(os.environ.get('DB_POOL_HEALTH_CHECK_AFTER', '30'))
+
+# Group-commit Config (opt-in): orders arriving within the window share one INSERT + COMMIT
+ORDER_BATCH_ENABLED = os.environ.get('ORDER_BATCH_ENABLED', 'false').lower() == 'true'
+ORDER_BATCH_WINDOW_MS = float(os.environ.get('ORDER_BATCH_WINDOW_MS', '2'))
+ORDER_BATCH_MAX_SIZE = int(os.environ.get('ORDER_BATCH_MAX_SIZE', '100'))
+ORDER_BATCH_STATEMENT_TIMEOUT = float(os.environ.get('ORDER_BATCH_STATEMENT_TIMEOUT', '5'))
+
+# Bulk import Config - orders per COPY / commit; memory stays bounded by the chunk size
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '1000'))
+IMPORT_MAX_LINE_BYTES = int(os.environ.get('IMPORT_MAX_LINE_BYTES', '65536'))
+IMPORT_HISTORY = int(os.environ.get('IMPORT_HISTORY', '20'))  # finished imports kept for GET /orders/import/{id}
+
+# Blocking AWS SDK calls run on a bounded thread pool, never on the event loop
+BOTO_EXECUTOR_WORKERS = int(os.environ.get('BOTO_EXECUTOR_WORKERS', '8'))
+
+# Outbox Relay Config (SQS sends are split into send_message_batch calls of 10)
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '10'))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', '0.5'))
+
+# Notification Config - alerts per (warehouse, type) within the window are sent as one message
+NOTIFY_DEBOUNCE_SECONDS = float(os.environ.get('NOTIFY_DEBOUNCE_SECONDS', '5'))
+NOTIFY_MAX_PENDING = int(os.environ.get('NOTIFY_MAX_PENDING', '1000'))
+NOTIFY_LOG_FILE = os.environ.get('NOTIFY_LOG_FILE', 'notifications.log')  # local mode sink
+
+# Order status stream Config (one LISTEN connection per process, fanned out to SSE clients)
+ORDER_STREAM_QUEUE_SIZE = int(os.environ.get('ORDER_STREAM_QUEUE_SIZE', '100'))
+ORDER_STREAM_HEARTBEAT = float(os.environ.get('ORDER_STREAM_HEARTBEAT', '15'))
+
 if ENV != "local":
-    sqs = boto3.client("sqs", region_name=REGION)
     sns = boto3.client("sns", region_name=REGION)
 else:
-    sqs = None
     sns = None
 
-def get_db_connection():
-    """Get PostgreSQL database connection"""
+if QUEUE_BACKEND == "sqs":
+    order_queue = SqsQueue(boto3.client("sqs", region_name=REGION), SQS_QUEUE_URL)
+elif QUEUE_BACKEND == "redis":
+    # Blocking client: the relay publishes from its executor thread
+    order_queue = RedisStreamQueue(
+        redis.Redis(host=REDIS_HOST, port=REDIS_PORT, socket_connect_timeout=2, socket_timeout=5),
+        max_length=QUEUE_MAX_LENGTH
+    )
+elif QUEUE_BACKEND == "memory":
+    order_queue = MemoryQueue(max_length=QUEUE_MAX_LENGTH)
+elif QUEUE_BACKEND == "table":
+    order_queue = TableQueue()
+else:
+    raise RuntimeError(f"Unknown QUEUE_BACKEND: {QUEUE_BACKEND}")
+
+boto_executor = ThreadPoolExecutor(max_workers=BOTO_EXECUTOR_WORKERS, thread_name_prefix="boto3")
+
+# Redis (asyncio client) for idempotency keys, the order history cache, counters and
+# rate limits - connectivity is checked at startup; everything Redis-backed is None without it
+redis_client = aioredis.Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    decode_responses=True,
+    socket_connect_timeout=2,
+    socket_timeout=2
+)
+
+idempotency = IdempotencyStore(
+    redis_client,
+    ttl=IDEMPOTENCY_TTL,
+    lock_ttl=IDEMPOTENCY_LOCK_TTL,
+    wait_timeout=IDEMPOTENCY_WAIT_TIMEOUT
+)
+
+history_cache = HistoryCache(redis_client, ttl=HISTORY_CACHE_TTL)
+
+warehouse_stats = WarehouseStats(redis_client)
+
+rate_limiter = OrderRateLimiter(redis_client, {
+    "customer": (RATE_LIMIT_CUSTOMER_RATE, RATE_LIMIT_CUSTOMER_BURST),
+    "warehouse": (RATE_LIMIT_WAREHOUSE_RATE, RATE_LIMIT_WAREHOUSE_BURST),
+})
+
+db_pool = ConnectionPool(
+    DB_POOL_MIN,
+    DB_POOL_MAX,
+    wait_timeout=DB_POOL_TIMEOUT,
+    health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+    host=DB_HOST,
+    port=DB_PORT,
+    database=DB_NAME,
+    user=DB_USER,
+    password=DB_PASS,
+    timeout=5
+)
+
+order_writer = (
+    OrderBatchWriter(
+        db_pool,
+        window_ms=ORDER_BATCH_WINDOW_MS,
+        max_batch=ORDER_BATCH_MAX_SIZE,
+        statement_timeout=ORDER_BATCH_STATEMENT_TIMEOUT
+    )
+    if ORDER_BATCH_ENABLED else None
+)
+
+def publish_orders(entries):
+    """Send outbox entries to the order queue; returns the accepted outbox ids"""
+    sent = order_queue.send(entries)
+    print(f"📤 {len(sent)} order(s) sent to {order_queue.name}")
+    return sent
+
+outbox_relay = OutboxRelay(
+    db_pool,
+    publish_orders,
+    batch_size=OUTBOX_BATCH_SIZE,
+    poll_interval=OUTBOX_POLL_INTERVAL,
+    executor=boto_executor
+)
+
+def publish_to_sns(batch):
+    """Send queued notifications with one SNS publish_batch call; returns the ones that failed"""
+    response = sns.publish_batch(
+        TopicArn=SNS_TOPIC_ARN,
+        PublishBatchRequestEntries=[
+            {
+                "Id": str(index),
+                "Subject": notification.subject,
+                "Message": notification.body,
+                "MessageAttributes": {
+                    'warehouse_id': {'DataType': 'String', 'StringValue': notification.warehouse_id},
+                    'notification_type': {'DataType': 'String', 'StringValue': notification.notification_type}
+                }
+            }
+            for index, notification in enumerate(batch)
+        ]
+    )
+    for failed in response.get("Failed", []):
+        print(f"⚠️ SNS rejected notification {failed.get('Id')}: {failed.get('Message')}")
+    print(f"📢 {len(response.get('Successful', []))} notification(s) published to SNS")
+    return [batch[int(failed["Id"])] for failed in response.get("Failed", [])]
+
+def subscribe_to_sns(warehouse_id, email, notification_type):
+    # Email subscription with filter policy - SNS sends the confirmation mail
+    sns.subscribe(
+        TopicArn=SNS_TOPIC_ARN,
+        Protocol='email',
+        Endpoint=email,
+        Attributes={
+            'FilterPolicy': json.dumps({
+                'warehouse_id': [warehouse_id],
+                'notification_type': [notification_type, 'all']
+            })
+        }
+    )
+    print(f"📧 Subscribed {email} to {warehouse_id} notifications")
+
+def write_notification_log(record: dict):
+    with open(NOTIFY_LOG_FILE, "a") as sink:
+        sink.write(json.dumps(record) + "\n")
+
+def publish_to_file(batch):
+    """Local stand-in for SNS - one JSON line per (coalesced) notification"""
+    for notification in batch:
+        write_notification_log({
+            "at": datetime.utcnow().isoformat(),
+            "warehouse_id": notification.warehouse_id,
+            "notification_type": notification.notification_type,
+            "subject": notification.subject,
+            "message": notification.body,
+            "alerts": notification.count
+        })
+    return []
+
+def subscribe_to_file(warehouse_id, email, notification_type):
+    write_notification_log({
+        "at": datetime.utcnow().isoformat(),
+        "subscribe": email,
+        "warehouse_id": warehouse_id,
+        "notification_type": notification_type
+    })
+
+notifications = NotificationQueue(
+    publish_to_file if ENV == "local" else publish_to_sns,
+    subscribe_to_file if ENV == "local" else subscribe_to_sns,
+    debounce_seconds=NOTIFY_DEBOUNCE_SECONDS,
+    max_pending=NOTIFY_MAX_PENDING
+)
+
+order_events = OrderEventHub(
+    queue_size=ORDER_STREAM_QUEUE_SIZE,
+    host=DB_HOST,
+    port=DB_PORT,
+    database=DB_NAME,
+    user=DB_USER,
+    password=DB_PASS,
+    timeout=5
+)
+
+@app.on_event("startup")
+async def warm_db_pool():
+    """Open the minimum pool connections up front so the first requests don't pay for connect"""
+    global redis_client, idempotency, history_cache, warehouse_stats, rate_limiter
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASS,
-            connect_timeout=5
-        )
-        return conn
+        await redis_client.ping()
+        print(f"✅ Redis connected: {REDIS_HOST}:{REDIS_PORT}")
+    except Exception as e:
+        print(f"⚠️ Redis not available, Idempotency-Key support, history cache, stats and rate limits disabled: {e}")
+        redis_client = idempotency = history_cache = warehouse_stats = rate_limiter = None
+
+    try:
+        opened = await db_pool.open()
+        print(f"✅ DB pool ready ({opened} connections pre-warmed, max {DB_POOL_MAX})")
     except Exception as e:
+        # Don't block startup - the pool is created on first use once the DB is back
+        print(f"⚠️ DB pool pre-warm failed: {e}")
+    if order_writer:
+        order_writer.start()
+        print(f"✅ Group commit enabled (window {ORDER_BATCH_WINDOW_MS}ms, max batch {ORDER_BATCH_MAX_SIZE})")
+    outbox_relay.start()
+    order_events.start()
+    notifications.start()
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    if order_writer:
+        await order_writer.stop()
+    await outbox_relay.stop()
+    await order_events.stop()
+    # stop() joins the sender thread (up to 10s) - keep the event loop free meanwhile
+    await asyncio.to_thread(notifications.stop)
+    await db_pool.closeall()
+    boto_executor.shutdown(wait=False)
+
+@asynccontextmanager
+async def get_db_connection():
+    """Borrow a PostgreSQL connection from the pool; it is always returned, even on errors"""
+    try:
+        conn = await db_pool.getconn()
+    except (PoolTimeout, OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
         print(f"❌ DB Connection Error: {e}")
         raise HTTPException(status_code=503, detail="Database unavailable")
 
+    try:
+        yield conn
+    finally:
+        await db_pool.putconn(conn)
+
 
 class OrderItem(BaseModel):
     item_id: str
@@ -205,11 +468,82 @@ class OrderRequest(BaseModel):
     items: List[OrderItem]
 
 @app.get("/")
-def health_check():
+async def health_check():
     return {"status": "healthy", "service": "order-service"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime metrics (connection pool usage and wait times, group commit batching, outbox relay)"""
+    metrics = {
+        "db_pool": db_pool.stats(),
+        "outbox_relay": dict(outbox_relay.stats(), queue=order_queue.name),
+        "order_events": order_events.stats(),
+        "notifications": notifications.stats(),
+    }
+    if order_writer:
+        metrics["order_writer"] = order_writer.stats()
+    if idempotency:
+        metrics["idempotency"] = idempotency.stats()
+    if history_cache:
+        metrics["history_cache"] = history_cache.stats()
+    if rate_limiter:
+        metrics["rate_limiter"] = rate_limiter.stats()
+    return metrics
+
 @app.post("/orders")
-def place_order(order: OrderRequest):
+async def place_order(order: OrderRequest, response: Response, idempotency_key: Optional[str] = Header(None)):
+    """
+    Place an order. Clients that retry should send an Idempotency-Key header:
+    a retry with the same key gets the original response back (marked with
+    Idempotent-Replayed: true) instead of creating a second order.
+    Over the customer's or warehouse's order rate the request gets 429 + Retry-After;
+    replays of an Idempotency-Key never count against the rate.
+    """
+    if not idempotency_key or not idempotency:
+        return await admit_order(order)
+
+    try:
+        result, replayed = await idempotency.execute(
+            order.customer_id,
+            idempotency_key,
+            request_fingerprint(order.dict()),
+            lambda: admit_order(order)
+        )
+    except IdempotencyKeyReused:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different order")
+    except IdempotencyConflict:
+        raise HTTPException(status_code=409, detail="An order with this Idempotency-Key is still being processed")
+
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+async def admit_order(order: OrderRequest) -> dict:
+    """Create the order if its customer's and warehouse's buckets both have a token"""
+    # Admission control - reject floods before they take a DB connection
+    if rate_limiter:
+        try:
+            await rate_limiter.check(
+                customer=order.customer_id,
+                warehouse=order.items[0].warehouse_id if order.items else None
+            )
+        except RateLimited as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return await create_order(order)
+
+# Order row, outbox row and status NOTIFY in ONE statement - a single round trip
+# and an implicit transaction (no separate BEGIN / COMMIT)
+PLACE_ORDER_SQL = """
+    WITH new_order AS (
+        INSERT INTO orders (order_id, customer_id, warehouse_id, status, items, created_at)
+        VALUES ($1, $2, $3, $4, $5, $6)
+    ), outbox AS (
+        INSERT INTO order_outbox (order_id, payload) VALUES ($1, $7)
+    )
+    SELECT pg_notify($8, $9)
+"""
+
+async def create_order(order: OrderRequest) -> dict:
     order_id = str(uuid.uuid4())
     
     # Extract primary warehouse_id from the first item (all items should be from same warehouse in a single order)
@@ -222,86 +556,162 @@ def place_order(order: OrderRequest):
         "items": [item.dict() for item in order.items]
     }
 
+    order_row = (
+        order_id,
+        order.customer_id,
+        primary_warehouse_id,
+        'PENDING',
+        json.dumps(message_body['items']),
+        datetime.utcnow()
+    )
+
     try:
-        # 1. Store order in database with warehouse_id for seller filtering
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("""
-                INSERT INTO orders (order_id, customer_id, warehouse_id, status, items, created_at) 
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (
-                order_id,
-                order.customer_id,
-                primary_warehouse_id,
-                'PENDING',
-                json.dumps(message_body['items']),
-                datetime.utcnow()
-            ))
-            conn.commit()
-            print(f"✅ Order {order_id} saved to database (warehouse: {primary_warehouse_id})")
-        except Exception as db_error:
-            conn.rollback()
-            print(f"⚠️ DB Error (order may not be saved): {db_error}")
-            # Continue anyway - order can be processed from SQS
-        finally:
-            cursor.close()
-            conn.close()
-        
-        # 2. Send to SQS for processing
-        if ENV == "local":
-            print(f"📦 LOCAL ORDER: {order_id}")
-            print(f"   Customer: {order.customer_id}")
-            print(f"   Items: {message_body['items']}")
+        # 1. Store order AND its queue message in one transaction (transactional outbox),
+        #    so an order is never saved without being queued or queued without being saved
+        if order_writer:
+            # Group commit - returns once the batch holding this row is committed
+            await order_writer.write(order_row, outbox_row(message_body))
         else:
-            sqs.send_message(
-                QueueUrl=SQS_QUEUE_URL,
-                MessageBody=json.dumps(message_body)
-            )
-            print(f"📤 Order {order_id} sent to SQS")
-        
-        return {"status": "success", "order_id": order_id, "message": "Order placed successfully"}
+            async with get_db_connection() as conn:
+                await conn.execute(
+                    PLACE_ORDER_SQL,
+                    *order_row,
+                    outbox_row(message_body)[1],
+                    ORDER_EVENTS_CHANNEL,
+                    event_payload(*order_row[:4])
+                )
+        print(f"✅ Order {order_id} saved to database (warehouse: {primary_warehouse_id})")
     
+    except asyncio.TimeoutError:
+        # Group commit gave up on the row: still queued, or its batch hit the
+        # statement timeout and rolled back - either way nothing was written
+        print(f"❌ Order {order_id} not saved: group commit timed out")
+        raise HTTPException(status_code=503, detail="Order not saved, database busy - safe to retry")
     except HTTPException:
         raise
     except Exception as e:
         print(f"❌ Order Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    # 2. Outbox relay sends it to the order queue in the background - no queue call on the request path
+    outbox_relay.notify()
+
+    # 3. New order must show up on the customer's next history visit
+    if history_cache:
+        await history_cache.invalidate(order.customer_id)
+
+    # 4. Dashboard counters (this hour / today / all-time) for the warehouse
+    if warehouse_stats:
+        await warehouse_stats.record(primary_warehouse_id, 'PENDING', order_row[5])
+
+    return {"status": "success", "order_id": order_id, "message": "Order placed successfully"}
+
+# BULK ORDER IMPORT (partner / B2B replays)
+
+recent_imports = OrderedDict()  # import_id -> OrderImporter, newest last
+
+@app.post("/orders/import")
+async def import_orders(request: Request, format: Optional[str] = None, import_id: Optional[str] = None):
+    """
+    Stream a JSONL (default) or CSV body of orders into the orders table with
+    chunked COPY. Pass ?import_id= to follow progress on GET /orders/import/{import_id}
+    while the upload runs. See bulk_import.py for the record formats.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "jsonl"
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(IMPORT_FORMATS)}")
+    if import_id in recent_imports:
+        raise HTTPException(status_code=409, detail=f"Import {import_id} already exists")
+
+    importer = OrderImporter(
+        db_pool,
+        chunk_size=IMPORT_CHUNK_SIZE,
+        max_line_bytes=IMPORT_MAX_LINE_BYTES,
+        history_cache=history_cache,
+        warehouse_stats=warehouse_stats,
+        on_commit=outbox_relay.notify,
+        import_id=import_id
+    )
+    recent_imports[importer.import_id] = importer
+    while len(recent_imports) > IMPORT_HISTORY:
+        recent_imports.popitem(last=False)
+
+    try:
+        result = await importer.run(request.stream(), format)
+    except (PoolTimeout, OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+        print(f"❌ Import Error: {e}")
+        # Chunks committed before the error stay imported - the summary says how far it got
+        raise HTTPException(status_code=503, detail=importer.stats())
+    if result["state"] == "failed":
+        # Unreadable file (e.g. CSV header without the required columns)
+        raise HTTPException(status_code=400, detail=result)
+    return result
+
+@app.get("/orders/import/{import_id}")
+async def get_import_progress(import_id: str):
+    """Progress of a running (or recently finished) bulk import"""
+    importer = recent_imports.get(import_id)
+    if importer is None:
+        raise HTTPException(status_code=404, detail="Unknown import_id")
+    return importer.stats()
+
+def validate_status(status: Optional[str]) -> Optional[str]:
+    if status is None:
+        return None
+    status = status.upper()
+    if status not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(ORDER_STATUSES)}")
+    return status
+
+async def fetch_orders_page_json(fields: list, filter_column: str, filter_value: str,
+                           status: Optional[str], cursor: Optional[str], limit: int):
+    """
+    Run one keyset-paginated listing query with the JSON rendered by Postgres.
+    Returns (orders_json_text, count, next_cursor) - the text is sent to the
+    client as-is, items are never decoded in Python.
+    """
+    try:
+        sql, params = json_page_query(fields, filter_column, filter_value, status, cursor, limit)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async with get_db_connection() as conn:
+        orders_json, count, last_created_at, last_order_id, has_more = await conn.fetchrow(sql, *params)
+
+    next_cursor = encode_cursor(last_created_at, last_order_id) if has_more else None
+    return orders_json, count, next_cursor
+
 @app.get("/orders/{customer_id}")
-def get_order_history(customer_id: str):
-    """Get order history from database"""
+async def get_order_history(
+    customer_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """
+    Get order history from database, newest first.
+    Paginated by cursor: pass the X-Next-Cursor response header back as ?cursor=
+    to get the next page (the header is absent on the last page).
+    The first page is served from the Redis history cache when possible.
+    """
+    status = validate_status(status)
+    cacheable = history_cache is not None and cursor is None and status is None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT order_id, customer_id, status, items, created_at 
-            FROM orders 
-            WHERE customer_id = %s 
-            ORDER BY created_at DESC
-            LIMIT 50
-        """, (customer_id,))
-        
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        orders = []
-        for row in rows:
-            # Parse items JSON from database
-            items_data = row[3] if isinstance(row[3], list) else json.loads(row[3])
-            
-            orders.append({
-                "order_id": row[0],
-                "customer_id": row[1],
-                "status": row[2],
-                "items": items_data,
-                "created_at": row[4].isoformat() if row[4] else None
-            })
+        cached = await history_cache.get(customer_id, limit) if cacheable else None
+        if cached:
+            orders_json, next_cursor = cached
+        else:
+            generation = await history_cache.generation(customer_id) if cacheable else None
+            orders_json, _, next_cursor = await fetch_orders_page_json(
+                ["order_id", "customer_id", "status", "items", "created_at"],
+                "customer_id", customer_id, status, cursor, limit
+            )
+            if cacheable:
+                await history_cache.fill(customer_id, limit, generation, orders_json, next_cursor)
         
-        return orders
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return Response(content=orders_json, media_type="application/json", headers=headers)
     
     except HTTPException:
         raise
@@ -314,45 +724,64 @@ def get_order_history(customer_id: str):
 # SELLER/WAREHOUSE ORDER ENDPOINTS
 
 @app.get("/warehouse/{warehouse_id}/orders")
-def get_warehouse_orders(warehouse_id: str):
-    """Get orders for a specific warehouse (for sellers/managers)"""
+async def get_warehouse_orders(
+    warehouse_id: str,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """Get orders for a specific warehouse (for sellers/managers), newest first, cursor-paginated"""
+    status = validate_status(status)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT order_id, customer_id, warehouse_id, status, items, created_at 
-            FROM orders 
-            WHERE warehouse_id = %s 
-            ORDER BY created_at DESC
-            LIMIT 100
-        """, (warehouse_id,))
-        
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        orders = []
-        for row in rows:
-            # Parse items JSON from database
-            items_data = row[4] if isinstance(row[4], list) else json.loads(row[4])
-            
-            orders.append({
-                "order_id": row[0],
-                "customer_id": row[1],
-                "warehouse_id": row[2],
-                "status": row[3],
-                "items": items_data,
-                "created_at": row[5].isoformat() if row[5] else None
-            })
+        orders_json, count, next_cursor = await fetch_orders_page_json(
+            ["order_id", "customer_id", "warehouse_id", "status", "items", "created_at"],
+            "warehouse_id", warehouse_id, status, cursor, limit
+        )
         
-        return {"orders": orders, "count": len(orders), "warehouse_id": warehouse_id}
+        # Splice the DB-rendered array into the envelope without re-parsing it
+        body = (
+            f'{{"orders":{orders_json},"count":{count},'
+            f'"warehouse_id":{json.dumps(warehouse_id)},"next_cursor":{json.dumps(next_cursor)}}}'
+        )
+        return Response(content=body, media_type="application/json")
     
     except HTTPException:
         raise
     except Exception as e:
         print(f"❌ Warehouse Orders Error: {e}")
-        return {"orders": [], "count": 0, "warehouse_id": warehouse_id}
+        return {"orders": [], "count": 0, "warehouse_id": warehouse_id, "next_cursor": None}
+
+
+@app.get("/warehouse/{warehouse_id}/stats")
+async def get_warehouse_stats(warehouse_id: str):
+    """Order counts per status for this hour, today (UTC) and all-time - no orders table scan"""
+    if not warehouse_stats:
+        raise HTTPException(status_code=503, detail="Order stats unavailable (Redis not connected)")
+    try:
+        return await warehouse_stats.get(warehouse_id)
+    except redis.RedisError as e:
+        print(f"❌ Warehouse Stats Error: {e}")
+        raise HTTPException(status_code=503, detail="Order stats unavailable")
+
+
+# ORDER STATUS STREAMS (Server-Sent Events)
+
+def order_stream_response(kind: str, key: str) -> StreamingResponse:
+    return StreamingResponse(
+        sse_stream(order_events, kind, key, heartbeat=ORDER_STREAM_HEARTBEAT),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/orders/{customer_id}/stream")
+async def stream_customer_orders(customer_id: str):
+    """Push the customer's order status changes instead of polling /orders/{customer_id}"""
+    return order_stream_response("customer", customer_id)
+
+@app.get("/warehouse/{warehouse_id}/orders/stream")
+async def stream_warehouse_orders(warehouse_id: str):
+    """Push new orders and status changes for a warehouse (for sellers/managers)"""
+    return order_stream_response("warehouse", warehouse_id)
 
 
 # SNS NOTIFICATION ENDPOINTS
@@ -363,82 +792,37 @@ class SubscribeRequest(BaseModel):
     notification_type: Optional[str] = "all"  # 'orders', 'low_stock', 'all'
 
 @app.post("/subscribe")
-def subscribe_to_notifications(request: SubscribeRequest):
-    """Subscribe email to SNS notifications for a warehouse"""
+async def subscribe_to_notifications(request: SubscribeRequest):
+    """Subscribe email to SNS notifications for a warehouse (sent in the background)"""
+    if ENV != "local" and not SNS_TOPIC_ARN:
+        raise HTTPException(status_code=503, detail="SNS notifications not configured")
+
+    notifications.enqueue_subscription(request.warehouse_id, request.email, request.notification_type)
+
     if ENV == "local":
-        print(f"📧 LOCAL: Would subscribe {request.email} to {request.warehouse_id} notifications")
         return {
             "success": True,
             "message": f"Subscribed {request.email} to notifications (local mode)",
             "warehouse_id": request.warehouse_id
         }
-    
-    if not SNS_TOPIC_ARN:
-        raise HTTPException(status_code=503, detail="SNS notifications not configured")
-    
-    try:
-        # Subscribe email to SNS topic with filter policy
-        response = sns.subscribe(
-            TopicArn=SNS_TOPIC_ARN,
-            Protocol='email',
-            Endpoint=request.email,
-            Attributes={
-                'FilterPolicy': json.dumps({
-                    'warehouse_id': [request.warehouse_id],
-                    'notification_type': [request.notification_type, 'all']
-                })
-            }
-        )
-        
-        subscription_arn = response.get('SubscriptionArn', 'pending confirmation')
-        
-        return {
-            "success": True,
-            "message": f"Subscription pending - check {request.email} for confirmation",
-            "subscription_arn": subscription_arn,
-            "warehouse_id": request.warehouse_id
-        }
-    except Exception as e:
-        print(f"❌ SNS Subscribe Error: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to subscribe: {str(e)}")
+    return {
+        "success": True,
+        "message": f"Subscription pending - check {request.email} for confirmation",
+        "warehouse_id": request.warehouse_id
+    }
 
 
 @app.post("/notify")
-def send_notification(data: dict):
-    """Send notification via SNS (internal use)"""
-    if ENV == "local":
-        print(f"📢 LOCAL NOTIFICATION: {data}")
-        return {"success": True, "message": "Notification logged (local mode)"}
-    
-    if not SNS_TOPIC_ARN:
+async def send_notification(data: dict):
+    """Queue a notification (internal use) - duplicates per warehouse/type are coalesced"""
+    if ENV != "local" and not SNS_TOPIC_ARN:
         return {"success": False, "message": "SNS not configured"}
-    
-    try:
-        warehouse_id = data.get('warehouse_id', 'unknown')
-        notification_type = data.get('type', 'order')
-        message = data.get('message', 'New notification from Rapid Delivery')
-        
-        response = sns.publish(
-            TopicArn=SNS_TOPIC_ARN,
-            Message=message,
-            Subject=f"Rapid Delivery - {notification_type.title()} Alert",
-            MessageAttributes={
-                'warehouse_id': {
-                    'DataType': 'String',
-                    'StringValue': warehouse_id
-                },
-                'notification_type': {
-                    'DataType': 'String',
-                    'StringValue': notification_type
-                }
-            }
-        )
-        
-        return {
-            "success": True,
-            "message_id": response.get('MessageId'),
-            "warehouse_id": warehouse_id
-        }
-    except Exception as e:
-        print(f"❌ SNS Publish Error: {e}")
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+
+    warehouse_id = data.get('warehouse_id', 'unknown')
+    notification_type = data.get('type', 'order')
+    message = data.get('message', 'New notification from Rapid Delivery')
+
+    result = notifications.enqueue(warehouse_id, notification_type, message)
+    if not result["queued"]:
+        return {"success": False, "message": "Notification queue full", "warehouse_id": warehouse_id}
+    return {"success": True, "warehouse_id": warehouse_id, **result}
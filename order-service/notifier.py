@@ -0,0 +1,224 @@
+"""
+Asynchronous, batched notification pipeline (SNS in production).
+
+/notify and /subscribe used to call SNS inside the request, and a burst of
+low-stock alerts for one warehouse became a burst of individual publishes
+(and emails). Requests now only enqueue; a background sender thread:
+
+  - coalesces alerts per (warehouse_id, type) within a debounce window, so N
+    alerts in the window become one message listing them
+  - publishes due messages in batches (SNS PublishBatch takes up to 10)
+  - runs subscription requests off the request path
+  - retries failed publishes a few times before dropping them
+
+Memory is bounded: at most `max_pending` distinct (warehouse, type) keys and
+`max_messages` texts per key are held; further alerts only bump a counter.
+At most `max_pending` subscription requests wait too; past that the oldest
+one is dropped, logged and counted.
+"""
+
+import collections
+import threading
+import time
+
+MAX_BATCH = 10
+
+
+class Notification:
+    def __init__(self, warehouse_id: str, notification_type: str, first_at: float):
+        self.warehouse_id = warehouse_id
+        self.notification_type = notification_type
+        self.first_at = first_at
+        self.messages = []
+        self.count = 0
+        self.attempts = 0
+
+    def add(self, message: str, max_messages: int):
+        self.count += 1
+        if message not in self.messages and len(self.messages) < max_messages:
+            self.messages.append(message)
+
+    @property
+    def subject(self) -> str:
+        return f"Rapid Delivery - {self.notification_type.title()} Alert"
+
+    @property
+    def body(self) -> str:
+        if self.count == 1:
+            return self.messages[0]
+        hidden = self.count - len(self.messages)
+        lines = [f"{self.count} {self.notification_type} alerts for {self.warehouse_id}:"]
+        lines.extend(f"- {message}" for message in self.messages)
+        if hidden:
+            lines.append(f"... and {hidden} more")
+        return "\n".join(lines)
+
+
+class NotificationQueue:
+    def __init__(self, publish_batch, subscribe, debounce_seconds: float = 5.0,
+                 batch_size: int = MAX_BATCH, max_pending: int = 1000, max_messages: int = 20,
+                 max_attempts: int = 3, poll_interval: float = 0.25):
+        """
+        publish_batch(notifications) -> list of notifications that failed
+        subscribe(warehouse_id, email, notification_type) -> None (raises on failure)
+        """
+        self.publish_batch = publish_batch
+        self.subscribe = subscribe
+        self.debounce = debounce_seconds
+        self.batch_size = min(batch_size, MAX_BATCH)
+        self.max_pending = max_pending
+        self.max_messages = max_messages
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._pending = collections.OrderedDict()  # (warehouse_id, type) -> Notification
+        self._subscriptions = collections.deque(maxlen=max_pending)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Metrics
+        self._enqueued = 0
+        self._coalesced = 0
+        self._rejected = 0
+        self._published = 0
+        self._batches = 0
+        self._failed = 0
+        self._dropped = 0
+        self._subscribed = 0
+        self._subscribe_errors = 0
+        self._subscriptions_dropped = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="notification-sender", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Send everything still pending (ignoring the debounce window) and stop."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def enqueue(self, warehouse_id: str, notification_type: str, message: str) -> dict:
+        key = (warehouse_id, notification_type)
+        with self._lock:
+            notification = self._pending.get(key)
+            if notification is None:
+                if len(self._pending) >= self.max_pending:
+                    self._rejected += 1
+                    return {"queued": False, "coalesced": False}
+                notification = Notification(warehouse_id, notification_type, time.monotonic())
+                self._pending[key] = notification
+                coalesced = False
+            else:
+                self._coalesced += 1
+                coalesced = True
+            notification.add(message, self.max_messages)
+            self._enqueued += 1
+        return {"queued": True, "coalesced": coalesced}
+
+    def enqueue_subscription(self, warehouse_id: str, email: str, notification_type: str):
+        dropped = None
+        with self._lock:
+            if len(self._subscriptions) == self._subscriptions.maxlen:
+                # deque(maxlen) evicts the oldest on append
+                dropped = self._subscriptions[0]
+                self._subscriptions_dropped += 1
+            self._subscriptions.append((warehouse_id, email, notification_type))
+        self._wake.set()
+        if dropped:
+            print(f"⚠️ Subscription queue full, dropped {dropped[1]} ({dropped[0]})")
+
+    # -----------------------------------------------------
+    # Sender thread
+    # -----------------------------------------------------
+
+    def _run(self):
+        while True:
+            stopping = self._stop.is_set()
+            self._send_subscriptions()
+            while self._send_due(flush_all=stopping):
+                pass
+            if stopping:
+                return
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _take_due(self, flush_all: bool) -> list:
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            # Insertion order == first-alert order, so due keys are at the front
+            for key, notification in list(self._pending.items()):
+                if len(due) >= self.batch_size:
+                    break
+                if not flush_all and now - notification.first_at < self.debounce:
+                    break
+                due.append(self._pending.pop(key))
+        return due
+
+    def _send_due(self, flush_all: bool) -> bool:
+        """Publish one batch of due notifications; returns True if a batch was sent"""
+        due = self._take_due(flush_all)
+        if not due:
+            return False
+        try:
+            failed = self.publish_batch(due)
+        except Exception as e:
+            print(f"❌ Notification batch failed: {e}")
+            failed = due
+
+        with self._lock:
+            self._batches += 1
+            self._published += len(due) - len(failed)
+            for notification in failed:
+                notification.attempts += 1
+                key = (notification.warehouse_id, notification.notification_type)
+                if notification.attempts >= self.max_attempts or key in self._pending:
+                    # Out of retries (or a newer alert for the key is already waiting)
+                    self._dropped += 1
+                    continue
+                self._failed += 1
+                self._pending[key] = notification
+                self._pending.move_to_end(key, last=False)
+        # Failed entries go back to the front; wait a tick instead of spinning on them
+        return not failed
+
+    def _send_subscriptions(self):
+        while True:
+            with self._lock:
+                if not self._subscriptions:
+                    return
+                warehouse_id, email, notification_type = self._subscriptions.popleft()
+            try:
+                self.subscribe(warehouse_id, email, notification_type)
+                with self._lock:
+                    self._subscribed += 1
+            except Exception as e:
+                with self._lock:
+                    self._subscribe_errors += 1
+                print(f"❌ SNS Subscribe Error for {email} ({warehouse_id}): {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "debounce_seconds": self.debounce,
+                "pending": len(self._pending),
+                "pending_subscriptions": len(self._subscriptions),
+                "enqueued": self._enqueued,
+                "coalesced": self._coalesced,
+                "rejected": self._rejected,
+                "published": self._published,
+                "batches": self._batches,
+                "retried": self._failed,
+                "dropped": self._dropped,
+                "subscribed": self._subscribed,
+                "subscribe_errors": self._subscribe_errors,
+                "subscriptions_dropped": self._subscriptions_dropped,
+            }
@@ -0,0 +1,191 @@
+"""
+Order status push stream over Postgres LISTEN/NOTIFY.
+
+Status changes (order-service on insert, the fulfillment worker on
+PROCESSING / COMPLETED / FAILED) are announced with pg_notify inside the same
+transaction, so a notification is only delivered once the change is committed.
+
+Each order-service process holds ONE dedicated LISTEN connection; its
+notification callback fans every event out to the SSE subscribers of that
+order's customer and warehouse on the event loop. Thousands of open streams cost one database
+connection instead of thousands of polling queries.
+
+Subscribers have a bounded queue. A client that falls behind (or any client
+after the LISTEN connection drops and reconnects) gets a single "resync"
+event instead of the missed updates and should refetch its order list.
+"""
+
+import asyncio
+import json
+
+import asyncpg
+
+CHANNEL = "order_status"
+
+# Used inside the writer's transaction; Postgres delivers it on COMMIT
+NOTIFY_SQL = "SELECT pg_notify($1, $2)"
+
+RESYNC = ("resync", "{}")
+
+
+def event_payload(order_id: str, customer_id: str, warehouse_id: str, status: str) -> str:
+    # NOTIFY payloads are limited to 8000 bytes - keep them to the routing fields
+    return json.dumps({
+        "order_id": order_id,
+        "customer_id": customer_id,
+        "warehouse_id": warehouse_id,
+        "status": status,
+    }, separators=(",", ":"))
+
+
+class Subscription:
+    """One SSE client's bounded event queue"""
+
+    def __init__(self, kind: str, key: str, queue_size: int):
+        self.kind = kind
+        self.key = key
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflows = 0
+
+    def push(self, event: tuple):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up - drop the backlog and tell the client to refetch
+            self.overflows += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class OrderEventHub:
+    def __init__(self, channel: str = CHANNEL, queue_size: int = 100, check_interval: float = 5.0,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0, **connect_kwargs):
+        self.channel = channel
+        self.queue_size = queue_size
+        self.check_interval = check_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connect_kwargs = connect_kwargs
+
+        self._subscribers = {}  # (kind, key) -> set of Subscription
+        self._task = None
+        self._conn = None
+
+        # Metrics
+        self._received = 0
+        self._delivered = 0
+        self._reconnects = 0
+        self._overflows = 0
+        self._connected = False
+
+    def start(self):
+        """Start the listener task (call from the running event loop)."""
+        if self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def subscribe(self, kind: str, key: str) -> Subscription:
+        subscription = Subscription(kind, key, self.queue_size)
+        self._subscribers.setdefault((kind, key), set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get((subscription.kind, subscription.key))
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            self._overflows += subscription.overflows
+            if not subscribers:
+                del self._subscribers[(subscription.kind, subscription.key)]
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self._received += 1
+        self._dispatch(payload)
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        first = True
+        while True:
+            try:
+                self._conn = await asyncpg.connect(**self.connect_kwargs)
+                await self._conn.add_listener(self.channel, self._on_notify)
+                self._connected = True
+                delay = self.reconnect_delay
+                print(f"✅ Listening for order status events on '{self.channel}'")
+                if not first:
+                    # Anything sent while we were disconnected is lost
+                    self._reconnects += 1
+                    self._broadcast(RESYNC)
+                first = False
+                # Notifications arrive via the callback; just make sure the connection is still alive
+                while True:
+                    await asyncio.sleep(self.check_interval)
+                    await self._conn.fetchval("SELECT 1", timeout=self.check_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Order event listener error: {e} - reconnecting in {delay:.0f}s")
+            finally:
+                self._connected = False
+                if self._conn is not None:
+                    self._conn.terminate()
+                    self._conn = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _dispatch(self, payload: str):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            print(f"⚠️ Ignoring malformed order event: {payload!r}")
+            return
+
+        targets = []
+        for key in (("customer", event.get("customer_id")), ("warehouse", event.get("warehouse_id"))):
+            targets.extend(self._subscribers.get(key, ()))
+        for subscription in targets:
+            subscription.push(("status", payload))
+        self._delivered += len(targets)
+
+    def _broadcast(self, event: tuple):
+        for subscription in [s for subscribers in self._subscribers.values() for s in subscribers]:
+            subscription.push(event)
+
+    def stats(self) -> dict:
+        subscribers = [s for group in self._subscribers.values() for s in group]
+        return {
+            "connected": self._connected,
+            "subscribers": len(subscribers),
+            "streams": len(set((s.kind, s.key) for s in subscribers)),
+            "received": self._received,
+            "delivered": self._delivered,
+            "overflows": self._overflows + sum(s.overflows for s in subscribers),
+            "reconnects": self._reconnects,
+        }
+
+
+async def sse_stream(hub: OrderEventHub, kind: str, key: str, heartbeat: float = 15.0):
+    """Server-Sent Events body for one subscriber; unsubscribes when the client goes away"""
+    subscription = hub.subscribe(kind, key)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                name, data = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies / load balancers from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {name}\ndata: {data}\n\n"
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,108 @@
+"""
+Order queue publishers for the outbox relay.
+
+Every backend has the same blocking call, run on the relay's executor:
+
+  send(entries)   entries are (outbox_id, message_body_json); returns the
+                  outbox ids the queue accepted
+
+Backends (QUEUE_BACKEND):
+
+  sqs     Amazon SQS (production), send_message_batch of up to 10. FIFO queues
+          get one message group per warehouse.
+  redis   a Redis Stream (XADD, one pipelined round trip per batch) that the
+          fulfillment worker reads through a consumer group - local runs and CI
+  memory  keeps the last `max_length` messages in process, for tests
+  table   no queue: the order row itself is the message, workers claim PENDING
+          orders from the table
+
+The message format must match fulfillment-worker/order_queue.py.
+"""
+
+import json
+import threading
+from collections import deque
+
+STREAM_KEY = "orders:queue"
+STREAM_BODY_FIELD = "body"
+
+
+class SqsQueue:
+    name = "sqs"
+    MAX_BATCH = 10
+
+    def __init__(self, client, queue_url: str):
+        self.client = client
+        self.queue_url = queue_url
+        self.fifo = bool(queue_url) and queue_url.endswith(".fifo")
+
+    def entry(self, outbox_id, body: str) -> dict:
+        entry = {"Id": str(outbox_id), "MessageBody": body}
+        if self.fifo:
+            # One message group per warehouse: SQS delivers a warehouse's orders in order,
+            # one batch at a time, while different warehouses are consumed in parallel
+            message = json.loads(body)
+            entry["MessageGroupId"] = message.get("warehouse_id") or "none"
+            entry["MessageDeduplicationId"] = message["order_id"]
+        return entry
+
+    def send(self, entries: list) -> list:
+        sent = []
+        for start in range(0, len(entries), self.MAX_BATCH):
+            response = self.client.send_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[self.entry(outbox_id, body) for outbox_id, body in entries[start:start + self.MAX_BATCH]]
+            )
+            for failed in response.get("Failed", []):
+                print(f"⚠️ SQS rejected outbox entry {failed.get('Id')}: {failed.get('Message')}")
+            sent.extend(int(entry["Id"]) for entry in response.get("Successful", []))
+        return sent
+
+
+class RedisStreamQueue:
+    name = "redis"
+
+    def __init__(self, redis_client, key: str = STREAM_KEY, max_length: int = 1_000_000):
+        self.redis = redis_client  # a blocking client - send runs on the relay's executor
+        self.key = key
+        self.max_length = max_length  # approximate cap, so a stopped worker can't fill Redis
+
+    def send(self, entries: list) -> list:
+        pipe = self.redis.pipeline(transaction=False)
+        for _, body in entries:
+            pipe.xadd(self.key, {STREAM_BODY_FIELD: body}, maxlen=self.max_length, approximate=True)
+        results = pipe.execute(raise_on_error=False)
+        sent = []
+        for (outbox_id, _), result in zip(entries, results):
+            if isinstance(result, Exception):
+                print(f"⚠️ Redis rejected outbox entry {outbox_id}: {result}")
+            else:
+                sent.append(outbox_id)
+        return sent
+
+
+class MemoryQueue:
+    name = "memory"
+
+    def __init__(self, max_length: int = 10000):
+        self.messages = deque(maxlen=max_length)
+        self._lock = threading.Lock()
+
+    def send(self, entries: list) -> list:
+        with self._lock:
+            self.messages.extend(body for _, body in entries)
+        return [outbox_id for outbox_id, _ in entries]
+
+
+class TableQueue:
+    """No queue - the worker claims PENDING orders straight from the orders table"""
+
+    name = "table"
+
+    def send(self, entries: list) -> list:
+        for _, body in entries:
+            message = json.loads(body)
+            print(f"📦 LOCAL ORDER: {message['order_id']}")
+            print(f"   Customer: {message['customer_id']}")
+            print(f"   Items: {message['items']}")
+        return [outbox_id for outbox_id, _ in entries]
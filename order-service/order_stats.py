@@ -0,0 +1,81 @@
+"""
+Per-warehouse order counters for the seller dashboard.
+
+Every status change bumps a counter in three Redis hashes per warehouse:
+the current UTC hour, the current UTC day and all-time (one field per status,
+e.g. PENDING = orders placed, COMPLETED = orders completed). place_order
+records PENDING here; the fulfillment worker records PROCESSING / COMPLETED /
+FAILED (fulfillment-worker/main.py record_order_status, same key layout).
+A dead letter replayed back to PENDING is counted as REPLAYED, not as a new
+PENDING order: it stays in FAILED (it did fail), and open_orders adds it back.
+
+Reading the dashboard is one pipelined HGETALL of three small hashes, no
+matter how many orders the warehouse has - the orders table is never scanned.
+Counters are bumped after the commit, so a crash in between can under-count
+by that one order; they are dashboard figures, not accounting.
+"""
+
+from datetime import datetime
+
+import redis
+
+from pagination import ORDER_STATUSES
+
+STATS_KEY = "orders:stats:{warehouse_id}:{bucket}"
+
+# FAILED -> PENDING transitions (dead-letter replays), counted next to the statuses
+REPLAYED = "REPLAYED"
+
+# Hour buckets are kept two days, day buckets ~five weeks; all-time never expires
+HOUR_TTL = 2 * 86400
+DAY_TTL = 35 * 86400
+
+
+def bucket_keys(warehouse_id: str, at: datetime) -> dict:
+    """{'hour' | 'today' | 'all_time': (redis_key, ttl or None)} for a UTC timestamp"""
+    return {
+        "hour": (STATS_KEY.format(warehouse_id=warehouse_id, bucket=at.strftime("h:%Y%m%d%H")), HOUR_TTL),
+        "today": (STATS_KEY.format(warehouse_id=warehouse_id, bucket=at.strftime("d:%Y%m%d")), DAY_TTL),
+        "all_time": (STATS_KEY.format(warehouse_id=warehouse_id, bucket="all"), None),
+    }
+
+
+class WarehouseStats:
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.errors = 0
+
+    async def record(self, warehouse_id: str, status: str, at: datetime = None, count: int = 1):
+        """Count `count` orders entering `status` (call after the change is committed)"""
+        if not warehouse_id:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key, ttl in bucket_keys(warehouse_id, at or datetime.utcnow()).values():
+                pipe.hincrby(key, status, count)
+                if ttl:
+                    pipe.expire(key, ttl)
+            await pipe.execute()
+        except redis.RedisError as e:
+            self.errors += 1
+            print(f"⚠️ Order stats update failed for {warehouse_id}: {e}")
+
+    async def get(self, warehouse_id: str, now: datetime = None) -> dict:
+        """Counters for this hour, today and all-time; raises RedisError if Redis is down"""
+        now = now or datetime.utcnow()
+        buckets = bucket_keys(warehouse_id, now)
+        pipe = self.redis.pipeline(transaction=False)
+        for key, _ in buckets.values():
+            pipe.hgetall(key)
+        results = await pipe.execute()
+
+        stats = {"warehouse_id": warehouse_id, "as_of": now.isoformat()}
+        for name, counts in zip(buckets, results):
+            stats[name] = {status: int(counts.get(status, 0)) for status in ORDER_STATUSES + (REPLAYED,)}
+        # Placed or replayed but not finished yet (PENDING or PROCESSING right now). Every
+        # order is counted as it enters and leaves; the clamp only covers a counter bump
+        # lost to a crash right after a commit
+        all_time = stats["all_time"]
+        stats["open_orders"] = max(0, all_time["PENDING"] + all_time[REPLAYED]
+                                   - all_time["COMPLETED"] - all_time["FAILED"])
+        return stats
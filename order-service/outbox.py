@@ -0,0 +1,139 @@
+"""
+Transactional outbox for order -> queue publishing.
+
+place_order writes the order row and an order_outbox row in the same
+transaction, so an order is either saved *and* queued or neither. The request
+path never talks to the queue; OutboxRelay drains the outbox in the background
+in batches (SQS send_message_batch takes at most 10 entries) and deletes rows
+once the queue has accepted them. Rows are claimed with FOR UPDATE SKIP LOCKED
+so several order-service replicas can relay concurrently without sending the
+same message twice.
+"""
+
+import asyncio
+import json
+
+INSERT_OUTBOX_SQL = """
+    INSERT INTO order_outbox (order_id, payload)
+    VALUES ($1, $2)
+"""
+
+CLAIM_OUTBOX_SQL = """
+    SELECT id, payload
+    FROM order_outbox
+    ORDER BY id
+    LIMIT $1
+    FOR UPDATE SKIP LOCKED
+"""
+
+DELETE_OUTBOX_SQL = "DELETE FROM order_outbox WHERE id = ANY($1::bigint[])"
+
+
+def outbox_row(message_body: dict) -> tuple:
+    """Build the order_outbox row for a queue message"""
+    return (message_body["order_id"], json.dumps(message_body))
+
+
+class OutboxRelay:
+    """
+    Background task that publishes outbox rows.
+
+    `publish` receives a list of (outbox_id, message_body_json) and returns the
+    ids the queue accepted; anything not returned stays in the outbox and is
+    retried on the next pass. It is a blocking call (boto3 / redis), so it runs on
+    `executor` instead of the event loop.
+    """
+
+    def __init__(self, pool, publish, batch_size: int = 10, poll_interval: float = 0.5, executor=None):
+        self.pool = pool
+        self.publish = publish
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.executor = executor
+
+        self._wakeup = None  # created in start(), on the serving event loop
+        self._task = None
+        self._running = False
+
+        # Metrics
+        self._published = 0
+        self._batches = 0
+        self._failures = 0
+        self._last_error = None
+
+    def start(self):
+        """Start the relay task (call from the running event loop)."""
+        if self._task is not None:
+            return
+        self._running = True
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        if self._task is None:
+            return
+        self._running = False
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
+
+    def notify(self):
+        """Wake the relay right away (called after an order commits)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while self._running:
+            # Clear before draining so a notify() that lands mid-batch isn't lost
+            self._wakeup.clear()
+            try:
+                sent = await self.relay_once()
+            except Exception as e:
+                self._failures += 1
+                self._last_error = str(e)
+                print(f"⚠️ Outbox relay error: {e}")
+                # Back off without listening for wakeups so a dead queue isn't hammered
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            # A full batch means there is probably more waiting - go straight round
+            if sent < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def relay_once(self) -> int:
+        """Claim, publish and delete one batch. Returns how many were published."""
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(CLAIM_OUTBOX_SQL, self.batch_size)
+                if not rows:
+                    return 0
+
+                entries = [
+                    (outbox_id, payload if isinstance(payload, str) else json.dumps(payload))
+                    for outbox_id, payload in rows
+                ]
+                published = await asyncio.get_running_loop().run_in_executor(self.executor, self.publish, entries)
+
+                if published:
+                    await conn.execute(DELETE_OUTBOX_SQL, list(published))
+
+        self._batches += 1
+        self._published += len(published)
+        if len(published) < len(entries):
+            self._failures += 1
+        return len(published)
+
+    def stats(self) -> dict:
+        return {
+            "batch_size": self.batch_size,
+            "published": self._published,
+            "batches": self._batches,
+            "failures": self._failures,
+            "last_error": self._last_error,
+        }
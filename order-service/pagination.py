@@ -0,0 +1,120 @@
+"""
+Keyset (cursor) pagination for order listings.
+
+Pages are ordered by (created_at, order_id) descending and the cursor is the
+last row of the previous page, so page N costs the same as page 1: Postgres
+seeks straight to the cursor position in the composite
+(customer_id|warehouse_id, created_at DESC, order_id DESC) indexes instead of
+scanning and discarding OFFSET rows.
+
+json_page_query wraps the same page in json_agg so Postgres renders the final
+JSON array itself; the service passes that text straight to the client
+instead of decoding JSONB items and re-serializing every row in Python.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+ORDER_STATUSES = ("PENDING", "PROCESSING", "COMPLETED", "FAILED")
+
+# Only these columns may be used as the listing filter (they are interpolated into SQL)
+FILTER_COLUMNS = ("customer_id", "warehouse_id")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, order_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), order_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(order_id)
+    except Exception:
+        raise InvalidCursor(cursor)
+
+
+def page_query(columns: str, filter_column: str, filter_value: str,
+               status: str = None, cursor: str = None, limit: int = 50, first_param: int = 1) -> tuple:
+    """
+    Build (sql, params) for one page, with asyncpg-style $n placeholders
+    numbered from `first_param`. One extra row is fetched so the caller can
+    tell whether another page exists without a COUNT(*).
+    """
+    if filter_column not in FILTER_COLUMNS:
+        raise ValueError(f"Unsupported filter column: {filter_column}")
+
+    params = []
+
+    def param(value) -> str:
+        params.append(value)
+        return f"${first_param + len(params) - 1}"
+
+    conditions = [f"{filter_column} = {param(filter_value)}"]
+
+    if status:
+        conditions.append(f"status = {param(status)}")
+
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        # Row comparison matches the index order, so this is a single index seek
+        conditions.append(f"(created_at, order_id) < ({param(created_at)}, {param(order_id)})")
+
+    sql = f"""
+        SELECT {columns}
+        FROM orders
+        WHERE {' AND '.join(conditions)}
+        ORDER BY created_at DESC, order_id DESC
+        LIMIT {param(limit + 1)}
+    """
+    return sql, params
+
+
+def json_page_query(fields: list, filter_column: str, filter_value: str,
+                    status: str = None, cursor: str = None, limit: int = 50) -> tuple:
+    """
+    Build (sql, params) returning a single row:
+    (orders_json_text, count, last_created_at, last_order_id, has_more).
+    `fields` are orders columns, rendered as JSON object keys in that order.
+    """
+    # $1 is the page size; the page query's own parameters follow it
+    page_sql, params = page_query(", ".join(fields), filter_column, filter_value, status, cursor, limit, first_param=2)
+    json_object = ", ".join(f"'{field}', {field}" for field in fields)
+
+    # row_number runs over the LIMITed page only (at most limit + 1 rows);
+    # the look-ahead row just sets has_more and is left out of the array.
+    sql = f"""
+        SELECT
+            COALESCE(
+                json_agg(json_build_object({json_object}) ORDER BY created_at DESC, order_id DESC)
+                    FILTER (WHERE rn <= $1),
+                '[]'
+            )::text,
+            count(*) FILTER (WHERE rn <= $1),
+            max(created_at) FILTER (WHERE rn = $1),
+            max(order_id) FILTER (WHERE rn = $1),
+            COALESCE(bool_or(rn > $1), false)
+        FROM (
+            SELECT page.*, row_number() OVER (ORDER BY created_at DESC, order_id DESC) AS rn
+            FROM ({page_sql}) page
+        ) numbered
+    """
+    return sql, [limit] + params
+
+
+def split_page(rows: list, limit: int, created_at_index: int = -1, order_id_index: int = 0) -> tuple:
+    """
+    Trim the look-ahead row; returns (rows, next_cursor or None).
+    By default order_id is expected first and created_at last in each row.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[created_at_index], last[order_id_index])
@@ -0,0 +1,23 @@
+"""
+Fixtures for the order-service tests: the Redis-backed modules (idempotency,
+rate limiter, history cache) run against an in-process Redis (fakeredis, with
+lupa for the Lua scripts). No PostgreSQL or running service is needed.
+
+  pip install -r requirements.txt -r requirements-test.txt
+  python -m pytest order-service/tests
+"""
+
+import os
+import sys
+
+import fakeredis
+import pytest
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, SERVICE_DIR)  # the tests import the service's modules directly
+
+
+@pytest.fixture
+def redis_client():
+    """An empty asyncio Redis client, as main.py creates it (decode_responses=True)"""
+    return fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
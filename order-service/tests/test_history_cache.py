@@ -0,0 +1,78 @@
+"""
+Order history cache (history_cache.py): read-through fill, invalidation, and
+the generation check that keeps a slow read from caching a stale page.
+"""
+
+import asyncio
+
+import pytest
+
+from history_cache import HistoryCache
+
+
+@pytest.fixture
+def cache(redis_client):
+    return HistoryCache(redis_client, ttl=300)
+
+
+def test_miss_then_fill_then_hit(cache):
+    async def scenario():
+        miss = await cache.get("c1", 20)
+        generation = await cache.generation("c1")
+        await cache.fill("c1", 20, generation, '[{"order_id": "o1"}]', "cursor-1")
+        return miss, await cache.get("c1", 20), await cache.get("c1", 50)
+
+    miss, hit, other_page_size = asyncio.run(scenario())
+    assert miss is None
+    assert hit == ('[{"order_id": "o1"}]', "cursor-1")
+    assert other_page_size is None
+    assert (cache.hits, cache.misses, cache.fills) == (1, 2, 1)
+
+
+def test_last_page_has_no_cursor(cache):
+    async def scenario():
+        await cache.fill("c1", 20, await cache.generation("c1"), "[]", None)
+        return await cache.get("c1", 20)
+
+    assert asyncio.run(scenario()) == ("[]", None)
+
+
+def test_invalidate_drops_every_page_size(cache):
+    async def scenario():
+        for limit in (20, 50):
+            await cache.fill("c1", limit, await cache.generation("c1"), "[]", None)
+        await cache.fill("c2", 20, await cache.generation("c2"), "[]", None)
+        await cache.invalidate("c1")
+        return await cache.get("c1", 20), await cache.get("c1", 50), await cache.get("c2", 20)
+
+    assert asyncio.run(scenario()) == (None, None, ("[]", None))
+
+
+def test_read_overtaken_by_an_invalidation_is_not_cached(cache, redis_client):
+    async def scenario():
+        # Reader takes the generation, then queries Postgres (slow) ...
+        generation = await cache.generation("c1")
+        # ... meanwhile the worker completes an order and invalidates
+        await cache.invalidate("c1")
+        # The reader's page still says PENDING - it must not be stored
+        await cache.fill("c1", 20, generation, '[{"status": "PENDING"}]', None)
+        stale = await cache.get("c1", 20)
+
+        # The next reader sees the new generation and may fill
+        await cache.fill("c1", 20, await cache.generation("c1"), '[{"status": "COMPLETED"}]', None)
+        return stale, await cache.get("c1", 20), await redis_client.ttl("orders:history:c1")
+
+    stale, fresh, ttl = asyncio.run(scenario())
+    assert stale is None
+    assert fresh == ('[{"status": "COMPLETED"}]', None)
+    assert 0 < ttl <= 300
+    assert cache.stale_fills_skipped == 1
+
+
+def test_no_generation_means_no_fill(cache):
+    async def scenario():
+        await cache.fill("c1", 20, None, "[]", None)
+        return await cache.get("c1", 20)
+
+    assert asyncio.run(scenario()) is None
+    assert cache.fills == 0
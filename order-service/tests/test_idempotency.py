@@ -0,0 +1,146 @@
+"""
+Idempotency-Key handling (idempotency.py): replays, keys reused for another
+order, duplicates arriving while the original request runs, and failures
+releasing the key for a retry.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from idempotency import DONE, IdempotencyConflict, IdempotencyKeyReused, IdempotencyStore, request_fingerprint
+
+ORDER = {"customer_id": "c1", "items": [{"item_id": "apple", "warehouse_id": "wh_1", "quantity": 2}]}
+
+
+class Handler:
+    """Stands in for create_order: counts calls, can be slowed down or made to fail"""
+
+    def __init__(self, delay: float = 0, error: Exception = None):
+        self.calls = 0
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"status": "success", "order_id": f"order-{self.calls}"}
+
+
+@pytest.fixture
+def store(redis_client):
+    return IdempotencyStore(redis_client, wait_timeout=0.5, poll_interval=0.01)
+
+
+def test_fingerprint_ignores_key_order():
+    assert request_fingerprint({"a": 1, "b": [1, 2]}) == request_fingerprint({"b": [1, 2], "a": 1})
+    assert request_fingerprint({"a": 1}) != request_fingerprint({"a": 2})
+
+
+def test_retry_replays_the_first_response(store):
+    handler = Handler()
+    fingerprint = request_fingerprint(ORDER)
+
+    async def scenario():
+        first = await store.execute("c1", "key-1", fingerprint, handler)
+        retry = await store.execute("c1", "key-1", fingerprint, handler)
+        return first, retry
+
+    first, retry = asyncio.run(scenario())
+    assert first == ({"status": "success", "order_id": "order-1"}, False)
+    assert retry == ({"status": "success", "order_id": "order-1"}, True)
+    assert handler.calls == 1
+    assert store.stats()["replayed"] == 1
+
+
+def test_same_key_is_scoped_per_customer(store):
+    handler = Handler()
+    fingerprint = request_fingerprint(ORDER)
+
+    async def scenario():
+        await store.execute("c1", "key-1", fingerprint, handler)
+        return await store.execute("c2", "key-1", fingerprint, handler)
+
+    assert asyncio.run(scenario()) == ({"status": "success", "order_id": "order-2"}, False)
+    assert handler.calls == 2
+
+
+def test_key_reused_for_another_order_is_rejected(store):
+    handler = Handler()
+
+    async def scenario():
+        await store.execute("c1", "key-1", request_fingerprint(ORDER), handler)
+        other = dict(ORDER, items=[{"item_id": "milk", "warehouse_id": "wh_1", "quantity": 1}])
+        await store.execute("c1", "key-1", request_fingerprint(other), handler)
+
+    with pytest.raises(IdempotencyKeyReused):
+        asyncio.run(scenario())
+    assert handler.calls == 1
+
+
+def test_concurrent_duplicates_share_one_execution(store):
+    handler = Handler(delay=0.05)
+    fingerprint = request_fingerprint(ORDER)
+
+    async def scenario():
+        return await asyncio.gather(*[store.execute("c1", "key-1", fingerprint, handler) for _ in range(5)])
+
+    results = asyncio.run(scenario())
+    assert handler.calls == 1
+    assert {result["order_id"] for result, _ in results} == {"order-1"}
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+    assert store.stats()["coalesced"] == 4
+
+
+def test_request_still_running_elsewhere_is_a_conflict(store, redis_client):
+    handler = Handler()
+    fingerprint = request_fingerprint(ORDER)
+
+    async def scenario():
+        # Another replica holds the key and never finishes within wait_timeout
+        await redis_client.set("idem:orders:c1:key-1", json.dumps({"state": "pending", "fingerprint": fingerprint}))
+        await store.execute("c1", "key-1", fingerprint, handler)
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(scenario())
+    assert handler.calls == 0
+    assert store.stats()["conflicts"] == 1
+
+
+def test_waits_for_the_response_of_another_replica(store, redis_client):
+    handler = Handler()
+    fingerprint = request_fingerprint(ORDER)
+    key = "idem:orders:c1:key-1"
+
+    async def other_replica_finishes():
+        await asyncio.sleep(0.05)
+        await redis_client.set(key, json.dumps(
+            {"state": DONE, "fingerprint": fingerprint, "response": {"order_id": "theirs"}}))
+
+    async def scenario():
+        await redis_client.set(key, json.dumps({"state": "pending", "fingerprint": fingerprint}))
+        finisher = asyncio.create_task(other_replica_finishes())
+        result = await store.execute("c1", "key-1", fingerprint, handler)
+        await finisher
+        return result
+
+    assert asyncio.run(scenario()) == ({"order_id": "theirs"}, True)
+    assert handler.calls == 0
+
+
+def test_failed_request_releases_the_key(store, redis_client):
+    fingerprint = request_fingerprint(ORDER)
+    failing = Handler(error=RuntimeError("database down"))
+    working = Handler()
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await store.execute("c1", "key-1", fingerprint, failing)
+        assert await redis_client.get("idem:orders:c1:key-1") is None
+        return await store.execute("c1", "key-1", fingerprint, working)
+
+    assert asyncio.run(scenario()) == ({"status": "success", "order_id": "order-1"}, False)
+    assert failing.calls == working.calls == 1
@@ -0,0 +1,50 @@
+"""
+Warehouse order counters (order_stats.py): the hour / day / all-time hashes
+and open_orders across placements, completions, failures and replays.
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from order_stats import REPLAYED, WarehouseStats
+
+NOW = datetime(2026, 10, 19, 14, 30)
+
+
+@pytest.fixture
+def stats(redis_client):
+    return WarehouseStats(redis_client)
+
+
+def record(stats, *changes):
+    async def scenario():
+        for status, count in changes:
+            await stats.record("wh_1", status, NOW, count=count)
+        return await stats.get("wh_1", NOW)
+    return asyncio.run(scenario())
+
+
+def test_counts_land_in_every_bucket(stats):
+    result = record(stats, ("PENDING", 3), ("COMPLETED", 1))
+    for bucket in ("hour", "today", "all_time"):
+        assert result[bucket] == {"PENDING": 3, "PROCESSING": 0, "COMPLETED": 1, "FAILED": 0, REPLAYED: 0}
+    assert result["open_orders"] == 2
+
+
+def test_replayed_order_is_open_again_and_still_counted_as_failed(stats):
+    result = record(stats, ("PENDING", 3), ("COMPLETED", 1), ("FAILED", 2), (REPLAYED, 1))
+    assert result["all_time"]["FAILED"] == 2
+    assert result["open_orders"] == 1
+
+    # The replayed order then completes: nothing is open any more
+    result = record(stats, ("COMPLETED", 1))
+    assert result["open_orders"] == 0
+
+
+def test_other_hour_starts_from_zero(stats):
+    record(stats, ("PENDING", 2))
+    later = asyncio.run(stats.get("wh_1", datetime(2026, 10, 19, 15, 5)))
+    assert later["hour"]["PENDING"] == 0
+    assert later["today"]["PENDING"] == later["all_time"]["PENDING"] == 2
@@ -0,0 +1,68 @@
+"""
+Order admission control (rate_limit.py): the token-bucket Lua script, its
+all-or-nothing consumption across buckets, Retry-After and refill.
+"""
+
+import asyncio
+
+import pytest
+
+from rate_limit import OrderRateLimiter, RateLimited
+
+
+def admit(limiter, times: int, **keys) -> list:
+    """Try `times` orders in a row; True for each admitted one"""
+    async def scenario():
+        admitted = []
+        for _ in range(times):
+            try:
+                await limiter.check(**keys)
+                admitted.append(True)
+            except RateLimited:
+                admitted.append(False)
+        return admitted
+    return asyncio.run(scenario())
+
+
+def test_burst_is_admitted_then_limited(redis_client):
+    limiter = OrderRateLimiter(redis_client, {"customer": (1, 3)})
+    assert admit(limiter, 5, customer="c1") == [True, True, True, False, False]
+    assert limiter.stats()["admitted"] == 3
+    assert limiter.stats()["rejected"] == {"customer": 2}
+
+
+def test_rejection_names_the_bucket_and_when_to_retry(redis_client):
+    limiter = OrderRateLimiter(redis_client, {"customer": (0.5, 1)})
+    admit(limiter, 1, customer="c1")
+    with pytest.raises(RateLimited) as rejected:
+        asyncio.run(limiter.check(customer="c1"))
+    assert (rejected.value.scope, rejected.value.key) == ("customer", "c1")
+    assert rejected.value.retry_after == 2  # one token takes 1 / 0.5 = 2 seconds
+
+
+def test_buckets_are_per_key(redis_client):
+    limiter = OrderRateLimiter(redis_client, {"customer": (1, 1)})
+    assert admit(limiter, 2, customer="c1") == [True, False]
+    assert admit(limiter, 1, customer="c2") == [True]
+
+
+def test_empty_bucket_takes_no_token_from_the_others(redis_client):
+    limiter = OrderRateLimiter(redis_client, {"customer": (1, 5), "warehouse": (1, 1)})
+    assert admit(limiter, 1, customer="c1", warehouse="wh_1") == [True]
+    # The warehouse is empty: c2's own bucket must stay full
+    assert admit(limiter, 3, customer="c2", warehouse="wh_1") == [False, False, False]
+    assert limiter.stats()["rejected"] == {"customer": 0, "warehouse": 3}
+    assert admit(limiter, 5, customer="c2") == [True] * 5
+
+
+def test_bucket_refills_at_its_rate(redis_client):
+    limiter = OrderRateLimiter(redis_client, {"customer": (20, 1)})
+    assert admit(limiter, 2, customer="c1") == [True, False]
+    asyncio.run(asyncio.sleep(0.1))  # 20/s - one token back after 50ms
+    assert admit(limiter, 1, customer="c1") == [True]
+
+
+def test_zero_rate_disables_the_scope(redis_client):
+    limiter = OrderRateLimiter(redis_client, {"customer": (0, 10), "warehouse": (1, 1)})
+    assert limiter.stats()["limits"] == {"warehouse": {"rate_per_second": 1, "burst": 1}}
+    assert admit(limiter, 3, customer="c1") == [True, True, True]
@@ -91,6 +91,8 @@ def setup_db():
     
     cur = conn.cursor()
     # Drop and recreate tables to ensure correct schema
+    cur.execute("DROP TABLE IF EXISTS order_outbox CASCADE;")
+    cur.execute("DROP TABLE IF EXISTS order_dead_letters CASCADE;")
     cur.execute("DROP TABLE IF EXISTS orders CASCADE;")
     cur.execute("DROP TABLE IF EXISTS inventory CASCADE;")
     
@@ -107,11 +109,44 @@ def setup_db():
         CREATE TABLE orders (
             order_id VARCHAR(100) PRIMARY KEY,
             customer_id VARCHAR(50),
+            warehouse_id VARCHAR(50),
             status VARCHAR(20),
             items JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            next_attempt_at TIMESTAMP  -- set while the worker has the order parked for a retry
+        );
+    """)
+    
+    # Keyset pagination indexes - (filter, created_at, order_id) matches the listing ORDER BY
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer_created ON orders (customer_id, created_at DESC, order_id DESC) INCLUDE (status);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_warehouse_created ON orders (warehouse_id, created_at DESC, order_id DESC) INCLUDE (status);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_warehouse_status_created ON orders (warehouse_id, status, created_at DESC, order_id DESC);")
+    # Local-mode worker claims the oldest PENDING orders (FOR UPDATE SKIP LOCKED)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_pending ON orders (created_at) WHERE status = 'PENDING';")
+    
+    # Transactional outbox - order-service relays these rows to SQS
+    cur.execute("""
+        CREATE TABLE order_outbox (
+            id BIGSERIAL PRIMARY KEY,
+            order_id VARCHAR(100) NOT NULL,
+            payload JSONB NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
     """)
+
+    # Orders the fulfillment worker gave up on (permanent error / retries exhausted);
+    # replay them with: python main.py dead-letters --replay <id>... (fulfillment-worker)
+    cur.execute("""
+        CREATE TABLE order_dead_letters (
+            id BIGSERIAL PRIMARY KEY,
+            order_id VARCHAR(100),
+            payload TEXT NOT NULL,
+            error TEXT,
+            attempts INT NOT NULL DEFAULT 1,
+            failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            replayed_at TIMESTAMP
+        );
+    """)
     
     # Clear Redis
     r.flushall()
@@ -27,9 +27,11 @@ resource "aws_iam_role_policy" "sqs_policy" {
           "sqs:SendMessage",
           "sqs:ReceiveMessage",
           "sqs:DeleteMessage",
+          "sqs:ChangeMessageVisibility",
           "sqs:GetQueueAttributes"
         ]
-        Resource = aws_sqs_queue.order_queue.arn #"*"
+        # The FIFO queue, plus the standard one while it drains (queues.tf)
+        Resource = concat([aws_sqs_queue.order_fifo_queue.arn], aws_sqs_queue.order_queue[*].arn)
       }
     ]
   })
@@ -110,7 +112,7 @@ resource "aws_instance" "api_server" {
     AVAIL_IMAGE_URL       = aws_ecr_repository.availability_repo.repository_url
     ORDER_IMAGE_URL       = aws_ecr_repository.order_repo.repository_url
     FULFILLMENT_IMAGE_URL = aws_ecr_repository.fulfillment_repo.repository_url
-    SQS_QUEUE_URL         = aws_sqs_queue.order_queue.url
+    SQS_QUEUE_URL         = aws_sqs_queue.order_fifo_queue.url
     SNS_TOPIC_ARN         = aws_sns_topic.rapid_notifications.arn
     OPENSEARCH_ENDPOINT   = aws_opensearch_domain.search.endpoint
     REDIS_ENDPOINT        = aws_elasticache_cluster.redis.cache_nodes[0].address
@@ -88,7 +88,12 @@ output "opensearch_url" {
 
 output "sqs_queue_url" {
   description = "SQS Queue URL (publicly accessible via AWS API)"
-  value       = aws_sqs_queue.order_queue.url
+  value       = aws_sqs_queue.order_fifo_queue.url
+}
+
+output "legacy_sqs_queue_urls" {
+  description = "Standard order queue and DLQ still being drained (empty once legacy_order_queue = false)"
+  value       = concat(aws_sqs_queue.order_queue[*].url, aws_sqs_queue.order_dlq[*].url)
 }
 
 output "sns_topic_arn" {
@@ -123,7 +128,7 @@ output "connection_info" {
   📊 AWS SERVICES:
      RDS:        ${aws_db_instance.postgres.endpoint}
      OpenSearch: https://${aws_opensearch_domain.search.endpoint}
-     SQS:        ${aws_sqs_queue.order_queue.url}
+     SQS:        ${aws_sqs_queue.order_fifo_queue.url}
      SNS:        ${aws_sns_topic.rapid_notifications.arn}
      Redis:      ${aws_elasticache_cluster.redis.cache_nodes[0].address} (VPC-only)
   
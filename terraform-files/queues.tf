@@ -1,21 +1,63 @@
+# Orders moved from the standard queue to a FIFO queue (per-warehouse order). SQS
+# cannot turn a queue into a FIFO one in place, so the FIFO queues are created next
+# to the standard ones, which are drained and only then removed - see
+# "Order queue FIFO cutover" in DEPLOYMENT.md.
+
 # 1. Dead Letter Queue (Stores failed messages so they aren't lost)
-resource "aws_sqs_queue" "order_dlq" {
-  name = "order-fulfillment-dlq"
+resource "aws_sqs_queue" "order_fifo_dlq" {
+  name       = "order-fulfillment-dlq.fifo" # A FIFO queue's DLQ must be FIFO too
+  fifo_queue = true
 }
 
 # 2. Main Order Queue
-resource "aws_sqs_queue" "order_queue" {
-  name                       = "order-fulfillment-queue"
+resource "aws_sqs_queue" "order_fifo_queue" {
+  name                       = "order-fulfillment-queue.fifo"
   visibility_timeout_seconds = 30    # Time the worker has to process before retry
   message_retention_seconds  = 86400 # 1 day
 
+  # FIFO, one message group per warehouse (order-service sets MessageGroupId):
+  # a warehouse's orders are delivered in order, warehouses in parallel
+  fifo_queue            = true
+  deduplication_scope   = "messageGroup"
+  fifo_throughput_limit = "perMessageGroupId"
+
   # Link to DLQ
   redrive_policy = jsonencode({
-    deadLetterTargetArn = aws_sqs_queue.order_dlq.arn
+    deadLetterTargetArn = aws_sqs_queue.order_fifo_dlq.arn
     maxReceiveCount     = 3 # Retry 3 times, then move to DLQ
   })
 }
 
+# 3. The standard queue and its DLQ from before the cutover - unchanged until
+# legacy_order_queue = false, once both are drained
+resource "aws_sqs_queue" "order_dlq" {
+  count = var.legacy_order_queue ? 1 : 0
+  name  = "order-fulfillment-dlq"
+}
+
+resource "aws_sqs_queue" "order_queue" {
+  count                      = var.legacy_order_queue ? 1 : 0
+  name                       = "order-fulfillment-queue"
+  visibility_timeout_seconds = 30
+  message_retention_seconds  = 86400
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.order_dlq[0].arn
+    maxReceiveCount     = 3
+  })
+}
+
+# Same queues as before `count` was added - keep them instead of replacing them
+moved {
+  from = aws_sqs_queue.order_dlq
+  to   = aws_sqs_queue.order_dlq[0]
+}
+
+moved {
+  from = aws_sqs_queue.order_queue
+  to   = aws_sqs_queue.order_queue[0]
+}
+
 # =====================================================
 # SNS TOPIC FOR NOTIFICATIONS (FREE TIER: 1M requests/month)
 # =====================================================
@@ -239,6 +239,13 @@ spec:
             secretKeyRef:
               name: db-credentials
               key: password
+        - name: REDIS_HOST
+          valueFrom:
+            configMapKeyRef:
+              name: app-config
+              key: redis-endpoint
+        - name: REDIS_PORT
+          value: "6379"
         resources:
           requests:
             memory: "150Mi"
@@ -286,9 +293,16 @@ spec:
     metadata:
       labels:
         app: fulfillment
+      # Queue lag / busy slots for the autoscaler (WORKER_METRICS_PORT)
+      annotations:
+        prometheus.io/scrape: "true"
+        prometheus.io/port: "9100"
+        prometheus.io/path: /metrics
     spec:
       imagePullSecrets:
       - name: ecr-secret
+      # SIGTERM -> the worker stops receiving and finishes in-flight orders (WORKER_DRAIN_TIMEOUT)
+      terminationGracePeriodSeconds: 60
       # Schedule on worker node when available, fallback to master
       affinity:
         nodeAffinity:
@@ -303,11 +317,16 @@ spec:
       containers:
       - name: fulfillment
         image: ${FULFILLMENT_IMAGE_URL}:latest
+        ports:
+        - name: metrics
+          containerPort: 9100
         env:
         - name: AWS_REGION
           value: "${AWS_REGION}"
         - name: SQS_QUEUE_URL
           value: "${SQS_QUEUE_URL}"
+        - name: WORKER_DRAIN_TIMEOUT
+          value: "50"
         - name: DB_HOST
           value: "${DB_ENDPOINT}"
         - name: DB_NAME
@@ -20,4 +20,10 @@ variable "aws-region" {
   type        = string
   default     = "us-east-1"
 
-}
\ No newline at end of file
+}
+
+variable "legacy_order_queue" {
+  description = "Keep the standard order queue and its DLQ from before the FIFO cutover; set to false once they are drained (DEPLOYMENT.md)"
+  type        = bool
+  default     = true
+}
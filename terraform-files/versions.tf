@@ -9,4 +9,5 @@ terraform {
       version = "2.19.0"
     }
   }
+  required_version = ">= 1.1.0" # moved blocks (queues.tf)
 }
\ No newline at end of file
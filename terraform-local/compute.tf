@@ -23,7 +23,7 @@ resource "aws_instance" "api_server" {
     AVAIL_IMAGE_URL       = aws_ecr_repository.availability_repo.repository_url
     ORDER_IMAGE_URL       = aws_ecr_repository.order_repo.repository_url
     FULFILLMENT_IMAGE_URL = aws_ecr_repository.fulfillment_repo.repository_url
-    SQS_QUEUE_URL         = aws_sqs_queue.order_queue.url
+    SQS_QUEUE_URL         = aws_sqs_queue.order_fifo_queue.url
     SNS_TOPIC_ARN         = aws_sns_topic.rapid_notifications.arn
     DB_PASSWORD           = var.db_password
     ACCOUNT_ID            = data.aws_caller_identity.current.account_id
@@ -32,9 +32,11 @@ resource "aws_iam_role_policy" "sqs_policy" {
         "sqs:SendMessage",
         "sqs:ReceiveMessage",
         "sqs:DeleteMessage",
+        "sqs:ChangeMessageVisibility",
         "sqs:GetQueueAttributes"
       ]
-      Resource = aws_sqs_queue.order_queue.arn
+      # The FIFO queue, plus the standard one while it drains (queues.tf)
+      Resource = concat([aws_sqs_queue.order_fifo_queue.arn], aws_sqs_queue.order_queue[*].arn)
     }]
   })
 }
@@ -44,7 +44,12 @@ output "local_opensearch" {
 # ===================================================================
 output "sqs_queue_url" {
   description = "SQS Queue URL"
-  value       = aws_sqs_queue.order_queue.url
+  value       = aws_sqs_queue.order_fifo_queue.url
+}
+
+output "legacy_sqs_queue_urls" {
+  description = "Standard order queue and DLQ still being drained (empty once legacy_order_queue = false)"
+  value       = concat(aws_sqs_queue.order_queue[*].url, aws_sqs_queue.order_dlq[*].url)
 }
 
 output "sns_topic_arn" {
@@ -101,7 +106,7 @@ output "connection_info" {
      OpenSearch:  http://${aws_instance.api_server.private_ip}:9200 (inside EC2)
   
     AWS SERVICES (Free Tier):
-     SQS: ${aws_sqs_queue.order_queue.url}
+     SQS: ${aws_sqs_queue.order_fifo_queue.url}
      SNS: ${aws_sns_topic.rapid_notifications.arn}
   
     SSH ACCESS:
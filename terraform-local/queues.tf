@@ -2,23 +2,61 @@
 # SQS and SNS - Remain on AWS (FREE TIER: 1M requests/month)
 # =============================================================================
 
+# Orders moved from the standard queue to a FIFO queue; the FIFO queues are created
+# next to the standard ones, which are drained and then removed (DEPLOYMENT.md,
+# "Order queue FIFO cutover")
+
 # Dead Letter Queue
-resource "aws_sqs_queue" "order_dlq" {
-  name = "order-fulfillment-dlq-local"
+resource "aws_sqs_queue" "order_fifo_dlq" {
+  name       = "order-fulfillment-dlq-local.fifo"
+  fifo_queue = true
 }
 
 # Main Order Queue
+resource "aws_sqs_queue" "order_fifo_queue" {
+  name                       = "order-fulfillment-queue-local.fifo"
+  visibility_timeout_seconds = 30
+  message_retention_seconds  = 86400 # 1 day
+
+  # One message group per warehouse (MessageGroupId set by order-service)
+  fifo_queue            = true
+  deduplication_scope   = "messageGroup"
+  fifo_throughput_limit = "perMessageGroupId"
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.order_fifo_dlq.arn
+    maxReceiveCount     = 3
+  })
+}
+
+# The standard queue and DLQ from before the cutover, until legacy_order_queue = false
+resource "aws_sqs_queue" "order_dlq" {
+  count = var.legacy_order_queue ? 1 : 0
+  name  = "order-fulfillment-dlq-local"
+}
+
 resource "aws_sqs_queue" "order_queue" {
+  count                      = var.legacy_order_queue ? 1 : 0
   name                       = "order-fulfillment-queue-local"
   visibility_timeout_seconds = 30
-  message_retention_seconds  = 86400 # 1 day
+  message_retention_seconds  = 86400
 
   redrive_policy = jsonencode({
-    deadLetterTargetArn = aws_sqs_queue.order_dlq.arn
+    deadLetterTargetArn = aws_sqs_queue.order_dlq[0].arn
     maxReceiveCount     = 3
   })
 }
 
+moved {
+  from = aws_sqs_queue.order_dlq
+  to   = aws_sqs_queue.order_dlq[0]
+}
+
+moved {
+  from = aws_sqs_queue.order_queue
+  to   = aws_sqs_queue.order_queue[0]
+}
+
 # SNS Topic for notifications
 resource "aws_sns_topic" "rapid_notifications" {
   name = "rapid-delivery-notifications-local"
@@ -120,6 +120,8 @@ spec:
         - {name: DB_NAME, value: "postgres"}
         - {name: DB_USER, value: "postgres"}
         - {name: DB_PASS, valueFrom: {secretKeyRef: {name: db-credentials, key: password}}}
+        - {name: REDIS_HOST, valueFrom: {configMapKeyRef: {name: app-config, key: redis-endpoint}}}
+        - {name: REDIS_PORT, value: "6379"}
         resources: {requests: {memory: "150Mi", cpu: "100m"}, limits: {memory: "300Mi", cpu: "500m"}}
 ---
 apiVersion: v1
@@ -134,15 +136,21 @@ spec:
   replicas: 1
   selector: {matchLabels: {app: fulfillment}}
   template:
-    metadata: {labels: {app: fulfillment}}
+    metadata:
+      labels: {app: fulfillment}
+      # Queue lag / busy slots for the autoscaler (WORKER_METRICS_PORT)
+      annotations: {prometheus.io/scrape: "true", prometheus.io/port: "9100", prometheus.io/path: /metrics}
     spec:
       imagePullSecrets: [{name: ecr-secret}]
+      terminationGracePeriodSeconds: 60  # SIGTERM -> finish in-flight orders (WORKER_DRAIN_TIMEOUT)
       containers:
       - name: fulfillment
         image: FULFILLMENT_IMAGE_PLACEHOLDER:latest
+        ports: [{name: metrics, containerPort: 9100}]
         env:
         - {name: AWS_REGION, value: "AWS_REGION_PLACEHOLDER"}
         - {name: SQS_QUEUE_URL, value: "SQS_QUEUE_PLACEHOLDER"}
+        - {name: WORKER_DRAIN_TIMEOUT, value: "50"}
         - {name: DB_HOST, valueFrom: {configMapKeyRef: {name: app-config, key: db-endpoint}}}
         - {name: DB_NAME, value: "postgres"}
         - {name: DB_USER, value: "postgres"}
@@ -37,3 +37,9 @@ variable "worker_instance_type" {
   type        = string
   default     = "t3.micro" # Can use micro since no DBs here
 }
+
+variable "legacy_order_queue" {
+  description = "Keep the standard order queue and its DLQ from before the FIFO cutover; set to false once they are drained (DEPLOYMENT.md)"
+  type        = bool
+  default     = true
+}
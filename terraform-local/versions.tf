@@ -5,5 +5,5 @@ terraform {
       version = "~> 4.65.0"
     }
   }
-  required_version = ">= 1.0.0"
+  required_version = ">= 1.1.0" # moved blocks (queues.tf)
 }